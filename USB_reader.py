@@ -5,6 +5,13 @@ import ctypes
 import time
 import tkinter as tk
 from tkinter import ttk, messagebox, simpledialog
+import perf
+import dirlist
+import drive_search
+import drive_index
+import file_query
+import folder_size
+import disk_usage
 
 class USB_reader(tk.Tk):
     def __init__(self):
@@ -34,10 +41,35 @@ class USB_reader(tk.Tk):
         search_entry.pack(side=tk.LEFT, padx=5)
         search_btn = tk.Button(toolbar, text="Search", command=self.search, bg="#393e46", fg="#03fff6")
         search_btn.pack(side=tk.LEFT, padx=5)
+        self.stop_btn = tk.Button(toolbar, text="Stop", command=self.stop_search, state=tk.DISABLED,
+                                  bg="#393e46", fg="#03fff6")
+        self.stop_btn.pack(side=tk.LEFT, padx=5)
+        tk.Label(toolbar, text="Max:", bg="#00CFC8", fg="#393e46").pack(side=tk.LEFT)
+        self.search_cap = tk.IntVar(value=10000)
+        tk.Spinbox(toolbar, from_=100, to=1000000, increment=1000, width=8, textvariable=self.search_cap,
+                   bg="#393e46", fg="#03fff6").pack(side=tk.LEFT, padx=5)
+        # search a drive's name index when it's fresh, crawl (and build/refresh it meanwhile) when not
+        self.use_index = tk.BooleanVar(value=True)
+        tk.Checkbutton(toolbar, text="Index", variable=self.use_index, bg="#00CFC8", fg="#393e46",
+                       activebackground="#00CFC8").pack(side=tk.LEFT, padx=5)
+        self.indexes = {}  # drive root -> DriveIndex, None where one couldn't be made
+        self.index_errors = {}  # drive root -> why there's no index
+        self.crawl = None
+        self.query_note = ""  # why the search text was taken literally, if it was
+        self.crawl_index = None
+        self._search_job = None
 
         up_btn = tk.Button(toolbar, text="Up", command=self.go_up, bg="#393e46", fg="#03fff6")
         up_btn.pack(side=tk.LEFT, padx=5)
 
+        # narrows the open folder's rows, runs on the listing so it's instant even for huge folders
+        tk.Label(toolbar, text="Filter:", bg="#00CFC8", fg="#393e46").pack(side=tk.LEFT, padx=5)
+        self.filter_var = tk.StringVar()
+        filter_entry = tk.Entry(toolbar, textvariable=self.filter_var, bg="#393e46", fg="#03fff6")
+        filter_entry.pack(side=tk.LEFT, padx=5)
+        filter_entry.bind("<KeyRelease>", self.schedule_filter)
+        self._filter_job = None
+
         paned = tk.PanedWindow(self, orient=tk.HORIZONTAL, bg="#393e46")
         paned.pack(fill=tk.BOTH, expand=True)
 
@@ -48,12 +80,17 @@ class USB_reader(tk.Tk):
         paned.add(sidebar_frame)
 
         self.tree = ttk.Treeview(explorer_frame, columns=("fullpath",), displaycolumns=())
-        self.tree.heading("#0", text="Name", anchor='w')
+        self.tree.heading("#0", text="Name", anchor='w',
+                          command=lambda: self.lister.sort(not self.lister.reverse))
         self.tree.column("#0", anchor='w')
         self.tree.pack(fill=tk.BOTH, expand=True)
+        self.lister = dirlist.TreeFiller(self.tree, self.insert_entry, on_error=self.list_error,
+                                         perf_name="USB.populate_tree", page_size=dirlist.PAGE_SIZE,
+                                         watch=True, on_change=self.changed_on_disk)
 
         self.tree.bind("<<TreeviewOpen>>", self.on_open)
         self.tree.bind("<Button-3>", self.show_context_menu)
+        self.bind_all("<F12>", lambda e: perf.toggle_overlay(self))
 
         self.context_menu = tk.Menu(self, tearoff=0)
         self.context_menu.add_command(label="Create Folder", command=self.create_folder)
@@ -61,11 +98,38 @@ class USB_reader(tk.Tk):
         self.context_menu.add_command(label="Rename", command=self.rename_item)
         self.context_menu.add_command(label="Delete", command=self.delete_item)
         self.context_menu.add_command(label="attributes", command=self.show_metadata)
+        self.context_menu.add_command(label="Disk usage", command=self.show_usage)
 
         tk.Label(sidebar_frame, text="Search Results", bg="#393e46", fg="#03fff6").pack(anchor="nw", padx=5, pady=5)
         self.search_results = tk.Listbox(sidebar_frame, bg="#393e46", fg="#03fff6",
                                          selectbackground="#00CFC8", selectforeground="#393e46")
         self.search_results.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+        self.search_status = tk.Label(sidebar_frame, text="", anchor="w", bg="#393e46", fg="#03fff6")
+        self.search_status.pack(fill=tk.X, padx=5)
+
+        # what's taking the space under a folder, filled in while it's walked
+        usage_bar = tk.Frame(sidebar_frame, bg="#393e46")
+        usage_bar.pack(fill=tk.X, padx=5, pady=(10, 0))
+        tk.Label(usage_bar, text="Disk Usage", bg="#393e46", fg="#03fff6").pack(side=tk.LEFT)
+        self.usage_stop_btn = tk.Button(usage_bar, text="Stop", command=self.stop_usage, state=tk.DISABLED,
+                                        bg="#393e46", fg="#03fff6")
+        self.usage_stop_btn.pack(side=tk.RIGHT)
+        self.usage_tree = ttk.Treeview(sidebar_frame, columns=("size", "files"), height=12)
+        self.usage_tree.heading("#0", text="Item", anchor="w")
+        self.usage_tree.heading("size", text="Size", anchor="e")
+        self.usage_tree.heading("files", text="Files", anchor="e")
+        self.usage_tree.column("#0", width=220, anchor="w")
+        self.usage_tree.column("size", width=80, anchor="e")
+        self.usage_tree.column("files", width=60, anchor="e")
+        self.usage_tree.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+        self.usage_sections = {}
+        for key, title in (("files", "Largest files"), ("folders", "Largest folders"),
+                           ("extensions", "By type"), ("depths", "By depth")):
+            self.usage_sections[key] = self.usage_tree.insert("", "end", text=title, open=key != "depths")
+        self.usage_status = tk.Label(sidebar_frame, text="", anchor="w", bg="#393e46", fg="#03fff6")
+        self.usage_status.pack(fill=tk.X, padx=5)
+        self.usage = None
+        self._usage_job = None
 
         self.init_tree()
 
@@ -92,22 +156,36 @@ class USB_reader(tk.Tk):
     def on_open(self, event):
         node = self.tree.focus()
         path = self.get_full_path(node)
-        children = self.tree.get_children(node)
-        if children:
-            first_child = children[0]
-            if self.tree.item(first_child, "text") == "dummy":
-                self.tree.delete(first_child)
+        # the dummy child stays until the listing replaces it, so the node doesn't collapse
         self.populate_tree(node, path)
 
     def populate_tree(self, parent, path):
-        try:
-            for item in os.listdir(path):
-                abspath = os.path.join(path, item)
-                node = self.tree.insert(parent, "end", text=item, values=(abspath,))
-                if os.path.isdir(abspath):
-                    self.tree.insert(node, "end", text="dummy")
-        except Exception as e:
-            print(f"Error reading {path}: {e}")
+        # a folder that's already shown only gets the rows that changed
+        self.lister.refresh(parent, path)
+
+    def insert_entry(self, parent, entry, index="end"):
+        name, abspath, is_dir = entry
+        node = self.tree.insert(parent, index, text=name, values=(abspath,))
+        if is_dir:
+            self.tree.insert(node, "end", text="dummy")
+        return node
+
+    def list_error(self, path, error):
+        print(f"Error reading {path}: {error}")
+
+    def schedule_filter(self, event=None):
+        if self._filter_job is not None:
+            self.after_cancel(self._filter_job)
+        self._filter_job = self.after(150, self.apply_filter)
+
+    def apply_filter(self):
+        self._filter_job = None
+        node = self.tree.focus()
+        # a file filters the folder it's in
+        while node and self.lister.listing(node) is None:
+            node = self.tree.parent(node)
+        if node:
+            self.lister.filter(node, self.filter_var.get())
 
     def get_full_path(self, node):
         return self.tree.set(node, "fullpath")
@@ -126,8 +204,8 @@ class USB_reader(tk.Tk):
             new_path = os.path.join(parent_path, folder_name)
             try:
                 os.mkdir(new_path)
-                new_node = self.tree.insert(node, "end", text=folder_name, values=(new_path,))
-                self.tree.insert(new_node, "end", text="dummy")
+                self.changed_folder(node, parent_path)
+                self.populate_tree(node, parent_path)
             except Exception as e:
                 messagebox.showerror("Error", str(e))
 
@@ -140,7 +218,8 @@ class USB_reader(tk.Tk):
             try:
                 with open(new_path, 'w') as f:
                     f.write("")
-                self.tree.insert(node, "end", text=file_name, values=(new_path,))
+                self.changed_folder(node, parent_path)
+                self.populate_tree(node, parent_path)
             except Exception as e:
                 messagebox.showerror("Error", str(e))
 
@@ -152,7 +231,13 @@ class USB_reader(tk.Tk):
             new_path = os.path.join(os.path.dirname(old_path), new_name)
             try:
                 os.rename(old_path, new_path)
+                self.changed_folder(node, os.path.dirname(old_path))
                 self.tree.item(node, text=new_name, values=(new_path,))
+                # the rows below still carry the old path
+                self.lister.forget(node)
+                parent = self.tree.parent(node)
+                if parent:
+                    self.populate_tree(parent, os.path.dirname(new_path))
             except Exception as e:
                 messagebox.showerror("Error", str(e))
 
@@ -166,6 +251,7 @@ class USB_reader(tk.Tk):
                     shutil.rmtree(path)
                 else:
                     os.remove(path)
+                self.changed_folder(node, os.path.dirname(path))
                 self.tree.delete(node)
             except Exception as e:
                 messagebox.showerror("Error", str(e))
@@ -177,23 +263,6 @@ class USB_reader(tk.Tk):
             size /= 1024
         return f"{size:.2f} PB"
 
-    def get_folder_size(self, folder):
-        """Recursively calculates folder size using os.scandir with error handling."""
-        total_size = 0
-        try:
-            with os.scandir(folder) as it:
-                for entry in it:
-                    try:
-                        if entry.is_file(follow_symlinks=False):
-                            total_size += entry.stat(follow_symlinks=False).st_size
-                        elif entry.is_dir(follow_symlinks=False):
-                            total_size += self.get_folder_size(entry.path)
-                    except Exception:
-                        continue
-        except Exception:
-            pass
-        return total_size
-
     def show_metadata(self):
         node = self.tree.focus()
         path = self.get_full_path(node)
@@ -203,15 +272,17 @@ class USB_reader(tk.Tk):
             messagebox.showerror("Error", "The selected path does not exist or is invalid.")
             return
 
+        if os.path.isdir(path):
+            # sized on a thread pool, the dialog fills in as it goes
+            FolderInfo(self, path)
+            return
+
         try:
-            # Use os.path.isfile and os.path.isdir to decide how to calculate size.
             if os.path.isfile(path):
                 try:
                     size = os.path.getsize(path)
                 except Exception:
                     size = 0
-            elif os.path.isdir(path):
-                size = self.get_folder_size(path)
             else:
                 size = 0
 
@@ -230,28 +301,168 @@ class USB_reader(tk.Tk):
             messagebox.showerror("Error", str(e))
 
     def search(self):
-        search_term = self.search_var.get().lower()
+        self.stop_search()
+        # the old crawl's poll loop goes with it, or its leftovers would land in the new list
+        if self._search_job is not None:
+            self.after_cancel(self._search_job)
+            self._search_job = None
+        self.crawl = None
+        self.crawl_index = None
+        self.stop_btn.config(state=tk.DISABLED)
+        search_text = self.search_var.get()
         self.search_results.delete(0, tk.END)
-        if not search_term:
+        self.search_status.config(text="")
+        if not search_text.strip():
             return
+        try:
+            query = file_query.parse(search_text, strict=True)
+            self.query_note = ""
+        except file_query.QueryError as e:
+            # searched for as typed, the status line says why
+            query = file_query.Name(search_text.strip())
+            self.query_note = f", searched as plain text ({e})"
 
         node = self.tree.focus()
         if not node:
             messagebox.showinfo("Info", "Please select a directory to search within.")
             return
 
+        try:
+            cap = max(1, self.search_cap.get())
+        except tk.TclError:
+            cap = None
         start_path = self.get_full_path(node)
-        matches = []
-        for root, dirs, files in os.walk(start_path):
-            for name in dirs + files:
-                if search_term in name.lower():
-                    matches.append(os.path.join(root, name))
-        if matches:
-            for match in matches:
-                self.search_results.insert(tk.END, match)
+        index = self.drive_index(node) if self.use_index.get() else None
+        # the index knows names only, anything fancier is a crawl; whether the index
+        # still matches the drive takes a stat per folder, so the worker decides
+        search_term = file_query.plain_name(query)
+        if index is not None and search_term is not None:
+            crawl = drive_search.IndexedCrawl(start_path, query, index, search_term, cap)
         else:
+            crawl = drive_search.Crawl(start_path, query, cap)
+        # walks on a worker thread, poll_search moves what it found into the list
+        self.crawl = crawl.start()
+        self.crawl_index = index
+        self.stop_btn.config(state=tk.NORMAL)
+        self._search_job = self.after(100, self.poll_search, self.crawl)
+
+    def drive_root(self, node):
+        # the top level nodes are the drives
+        while self.tree.parent(node):
+            node = self.tree.parent(node)
+        return self.get_full_path(node)
+
+    def drive_index(self, node):
+        root = self.drive_root(node)
+        if root not in self.indexes:
+            try:
+                self.indexes[root] = drive_index.DriveIndex(root)
+            except (OSError, drive_index.sqlite3.Error) as e:
+                self.index_errors[root] = str(e)  # poll_search says so when the crawl is done
+                self.indexes[root] = None
+        return self.indexes[root]
+
+    def changed_on_disk(self, folder):
+        # the watcher saw folder change, whoever did it
+        for root, index in self.indexes.items():
+            if index is not None and (folder == root or folder.startswith(os.path.join(root, ""))):
+                index.mark_stale(folder)
+
+    def changed_folder(self, node, folder):
+        # something was made, renamed or deleted in folder, the drive's index can't answer for it yet
+        index = self.indexes.get(self.drive_root(node)) if node else None
+        if index is not None:
+            index.mark_stale(folder)
+
+    def poll_search(self, crawl):
+        if self.crawl is not crawl:
+            return  # a newer search took over
+        finished = crawl.done.is_set()
+        new = crawl.take()
+        if new:
+            self.search_results.insert(tk.END, *new)
+        if not finished:
+            self.search_status.config(text=f"{crawl.found:,} found, {crawl.folders:,} folders - {crawl.current}")
+            self._search_job = self.after(100, self.poll_search, crawl)
+            return
+        self._search_job = None
+        self.stop_btn.config(state=tk.DISABLED)
+        perf.record("USB.search", crawl.elapsed)
+        if crawl.from_index:
+            age = time.time() - crawl.index.refreshed_at()
+            self.search_status.config(text=f"{crawl.found:,} found in the index (updated {age:.0f} s ago)"
+                                           f"{self.query_note}")
+            if not crawl.found:
+                self.search_results.insert(tk.END, "No matching files or folders found.")
+            crawl.index.start_refresh()
+            return
+        if crawl.truncated:
+            note = f"stopped at {crawl.found:,}, raise Max for more"
+        elif crawl.cancelled.is_set():
+            note = "stopped"
+        else:
+            note = "done"
+        if self.crawl_index is not None:
+            # after the crawl, not alongside it: on a slow stick they'd only slow each other down
+            self.crawl_index.start_refresh()
+            note += ", indexing the drive for next time"
+        elif self.use_index.get():
+            for root, error in self.index_errors.items():
+                if crawl.root == root or crawl.root.startswith(os.path.join(root, "")):
+                    note += f", no index for this drive: {error}"
+        self.search_status.config(text=f"{crawl.found:,} found in {crawl.folders:,} folders, {note}{self.query_note}")
+        if not crawl.found:
             self.search_results.insert(tk.END, "No matching files or folders found.")
 
+    def show_usage(self):
+        path = self.get_full_path(self.tree.focus())
+        if not os.path.isdir(path):
+            messagebox.showerror("Error", "Pick a folder or drive for disk usage.")
+            return
+        self.stop_usage()
+        if self._usage_job is not None:
+            self.after_cancel(self._usage_job)
+        self.usage = disk_usage.Usage(path).start()
+        self.usage_stop_btn.config(state=tk.NORMAL)
+        self.poll_usage()
+
+    def poll_usage(self):
+        usage = self.usage
+        finished = usage.done.is_set()
+        snapshot = usage.snapshot()
+        human = self.human_readable_size
+        rows = {
+            "files": [(os.path.relpath(path, usage.root), human(size), "") for size, path in snapshot["files"]],
+            "folders": [(os.path.relpath(path, usage.root), human(size), "") for size, path in snapshot["folders"]],
+            "extensions": [(ext, human(size), f"{files:,}") for size, files, ext in snapshot["extensions"]],
+            "depths": [(f"depth {depth}", human(size), f"{files:,}")
+                       for depth, (size, files) in enumerate(snapshot["depths"])],
+        }
+        for key, section in self.usage_sections.items():
+            self.usage_tree.delete(*self.usage_tree.get_children(section))
+            for text, size, files in rows[key]:
+                self.usage_tree.insert(section, "end", text=text, values=(size, files))
+        counted = f"{human(usage.size)} in {usage.files:,} files, {usage.folders:,} folders"
+        if not finished:
+            self.usage_status.config(text=f"{counted} - {usage.current}")
+            self._usage_job = self.after(250, self.poll_usage)
+            return
+        self._usage_job = None
+        self.usage_stop_btn.config(state=tk.DISABLED)
+        perf.record("USB.disk_usage", usage.elapsed)
+        note = "stopped" if usage.cancelled.is_set() else f"done in {usage.elapsed:.1f} s"
+        self.usage_status.config(text=f"{counted}, {note}")
+
+    def stop_usage(self):
+        if self.usage is not None and not self.usage.done.is_set():
+            # poll_usage notices the walk ended and tidies up
+            self.usage.cancel()
+
+    def stop_search(self):
+        if self.crawl is not None and not self.crawl.done.is_set():
+            # poll_search notices the walk ended and tidies up
+            self.crawl.cancel()
+
     def go_up(self):
         node = self.tree.focus()
         parent = self.tree.parent(node)
@@ -261,6 +472,80 @@ class USB_reader(tk.Tk):
         else:
             messagebox.showinfo("Info", "No parent directory.")
 
+
+class FolderInfo(tk.Toplevel):
+    """Attributes of a folder, its size counting up while the folder is sized."""
+
+    def __init__(self, master, path):
+        super().__init__(master)
+        self.title("Metadata")
+        self.configure(bg="#393e46")
+        self.resizable(False, False)
+        self.transient(master)
+        self.master_reader = master
+        self.path = path
+        try:
+            stat_info = os.stat(path)
+            dates = (f"Last Modified: {time.ctime(stat_info.st_mtime)}\n"
+                     f"Created: {time.ctime(stat_info.st_ctime)}")
+        except OSError as e:
+            dates = str(e)
+        tk.Label(self, text=f"Path: {path}", anchor="w", justify=tk.LEFT,
+                 bg="#393e46", fg="#03fff6").pack(fill=tk.X, padx=10, pady=(10, 0))
+        self.size_label = tk.Label(self, text="", anchor="w", justify=tk.LEFT, bg="#393e46", fg="#03fff6")
+        self.size_label.pack(fill=tk.X, padx=10)
+        tk.Label(self, text=dates, anchor="w", justify=tk.LEFT,
+                 bg="#393e46", fg="#03fff6").pack(fill=tk.X, padx=10)
+        self.status = tk.Label(self, text="", anchor="w", bg="#393e46", fg="gray")
+        self.status.pack(fill=tk.X, padx=10, pady=(5, 0))
+        buttons = tk.Frame(self, bg="#393e46")
+        buttons.pack(fill=tk.X, padx=10, pady=10)
+        tk.Button(buttons, text="Close", command=self.destroy, bg="#393e46", fg="#03fff6").pack(side=tk.RIGHT)
+        # the cache trusts a folder's mtime, which a file rewritten in place doesn't change
+        tk.Button(buttons, text="Recount", command=lambda: self.count(recount=True),
+                  bg="#393e46", fg="#03fff6").pack(side=tk.RIGHT, padx=5)
+        self.sizing = None
+        self._job = None
+        self.count()
+
+    def count(self, recount=False):
+        if self.sizing is not None:
+            self.sizing.cancel()
+        if self._job is not None:
+            self.after_cancel(self._job)
+        self.started = time.perf_counter()
+        self.sizing = folder_size.Sizing(self.path, recount=recount).start()
+        self.poll()
+
+    def poll(self):
+        sizing = self.sizing
+        finished = sizing.done.is_set()
+        human = self.master_reader.human_readable_size
+        self.size_label.config(text=f"Size: {human(sizing.size)}{'' if finished else '...'}\n"
+                                    f"Files: {sizing.files:,}  Folders: {sizing.folders:,}")
+        if not finished:
+            self.status.config(text="counting...")
+            self._job = self.after(100, self.poll)
+            return
+        self._job = None
+        elapsed = time.perf_counter() - self.started
+        perf.record("USB.folder_size", elapsed)
+        note = f"counted in {elapsed:.1f} s"
+        if sizing.cached:
+            note += f", {sizing.cached:,} folders unchanged since last time"
+        if sizing.errors:
+            note += f", {sizing.errors:,} unreadable"
+        self.status.config(text=note)
+
+    def destroy(self):
+        if self.sizing is not None:
+            self.sizing.cancel()
+        if self._job is not None:
+            self.after_cancel(self._job)
+            self._job = None
+        super().destroy()
+
+
 if __name__ == "__main__":
     app = USB_reader()
     app.mainloop()
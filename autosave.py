@@ -0,0 +1,168 @@
+# background autosave for notes.
+#
+# Every edit is appended as a small JSON line to the note's journal, which lives
+# in the cache dir rather than next to the note so the explorers watching the
+# note's folder don't see it come and go. Every so often the editor hands over a
+# full snapshot which gets written atomically over the note, after which the
+# journal starts over. The Tk thread only ever queues things, all file work
+# happens on the writer thread.
+#
+# The first journal line records the size and mtime of the note it applies to.
+# If the note doesn't match any more (we crashed after writing a snapshot but
+# before clearing the journal) the journal is already part of the note and is
+# thrown away instead of replayed.
+import hashlib
+import json
+import os
+import queue
+import threading
+import time
+
+import mkformat
+import note_search
+import perf
+
+
+# path -> writer thread of a saver closed without waiting, a new saver for the
+# same note lets it finish before touching the files
+_closing = {}
+_closing_lock = threading.Lock()
+
+
+def finish_closing():
+    """Wait for savers closed without waiting to write what they had, e.g. on app exit."""
+    with _closing_lock:
+        threads = list(_closing.values())
+        _closing.clear()
+    for thread in threads:
+        thread.join()
+
+
+def journal_path(path):
+    key = hashlib.sha1(os.path.abspath(path).encode("utf-8")).hexdigest()[:16]
+    return os.path.join(note_search.cache_dir(), "journals", f"{key}.journal")
+
+
+def _old_journal_path(path):
+    # where journals used to go, still read so a crash before the move isn't lost
+    return path + ".journal"
+
+
+def _note_stamp(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def read_journal(path):
+    """Changes left behind for the note at path by a session that didn't finish, oldest first."""
+    for journal in (journal_path(path), _old_journal_path(path)):
+        try:
+            with open(journal, "r") as f:
+                lines = f.readlines()
+            break
+        except OSError:
+            continue
+    else:
+        return []
+    if not lines:
+        return []
+    try:
+        header = json.loads(lines[0])
+    except ValueError:
+        return []
+    if header.get("base") != _note_stamp(path):
+        return []
+    changes = []
+    for line in lines[1:]:
+        try:
+            changes.append(json.loads(line))
+        except ValueError:
+            break  # torn last write, everything before it is good
+    return changes
+
+
+class Autosaver:
+    """Journals edits to one note and writes snapshots of it, off the Tk thread."""
+
+    def __init__(self, path):
+        self.path = path
+        self.journal_path = journal_path(path)
+        self.changes = 0  # recorded since the last snapshot
+        self.error = None  # last write failure, for the editor to report
+        self._queue = queue.Queue()
+        with _closing_lock:
+            self._previous = _closing.pop(path, None)
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def record(self, change):
+        """Queue one change, e.g. {"op": "insert", "at": "3.4", "text": "a"}."""
+        self._queue.put(("change", change))
+        self.changes += 1
+
+    def snapshot(self, data):
+        """Queue a full save of data (the dict mkformat.dump takes); the journal restarts after it."""
+        self._queue.put(("snapshot", data))
+        self.changes = 0
+
+    def close(self, wait=True):
+        """Stop after what's queued is written. wait=False leaves that to the writer thread."""
+        self._queue.put(("close", None))
+        if wait:
+            self._thread.join()
+        else:
+            with _closing_lock:
+                _closing[self.path] = self._thread
+
+    def _run(self):
+        if self._previous is not None:
+            self._previous.join()
+            self._previous = None
+        journal = None
+        while True:
+            batch = [self._queue.get()]
+            while True:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            for kind, payload in batch:
+                try:
+                    if kind == "change":
+                        if journal is None:
+                            journal = self._open_journal()
+                        journal.write(json.dumps(payload) + "\n")
+                    elif kind == "snapshot":
+                        if journal is not None:
+                            journal.close()
+                            journal = None
+                        start = time.perf_counter()
+                        mkformat.dump(payload, self.path)
+                        perf.record("save_to_file", time.perf_counter() - start)
+                        for journal_file in (self.journal_path, _old_journal_path(self.path)):
+                            if os.path.exists(journal_file):
+                                os.remove(journal_file)
+                    elif kind == "close":
+                        if journal is not None:
+                            journal.close()
+                        return
+                except Exception as e:
+                    self.error = e
+            if journal is not None:
+                try:
+                    journal.flush()
+                    os.fsync(journal.fileno())
+                except Exception as e:
+                    self.error = e
+
+    def _open_journal(self):
+        # carry on with a journal that still belongs to the note, start a new one otherwise
+        if os.path.exists(self.journal_path) and read_journal(self.path):
+            return open(self.journal_path, "a")
+        os.makedirs(os.path.dirname(self.journal_path), exist_ok=True)
+        journal = open(self.journal_path, "w")
+        journal.write(json.dumps({"base": _note_stamp(self.path)}) + "\n")
+        return journal
@@ -0,0 +1,192 @@
+# python -m benchmarks.bench_dirlist [entries]
+# folder listing: listdir + isdir vs scandir, Listing memory, paged fill, sort and filter
+import os
+import queue
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import dirlist
+import dirwatch
+from benchmarks import workloads
+from benchmarks.suite import ModelTree
+
+
+def legacy(path):
+    return [(name, os.path.join(path, name), os.path.isdir(os.path.join(path, name))) for name in os.listdir(path)]
+
+
+def best_of(func, *args, repeat=5):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def allocated(func, *args):
+    tracemalloc.start()
+    result = func(*args)
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, size
+
+
+def fill(tree, lister, parent, path):
+    lister.fill(parent, path)
+    while lister.busy(parent):
+        tree.update()
+        time.sleep(0.001)
+
+
+def rows(tree, parent):
+    return [tree.item(row, "text") for row in tree.get_children(parent)]
+
+
+def check_refresh(folder):
+    # local changes land as single row edits, untouched rows keep their node
+    os.mkdir(os.path.join(folder, "sub"))
+    for name in ("b.txt", "d.txt"):
+        open(os.path.join(folder, name), "w").close()
+    tree = ModelTree()
+
+    def insert(parent, entry, index="end"):
+        return tree.insert(parent, index, text=entry[0])
+    lister = dirlist.TreeFiller(tree, insert, page_size=2)
+    root = tree.insert("", "end", text=folder)
+    fill(tree, lister, root, folder)
+    assert rows(tree, root) == ["sub", "b.txt", "... 1 more"]
+    nodes = dict(zip(rows(tree, root), tree.get_children(root)))
+    os.rename(os.path.join(folder, "b.txt"), os.path.join(folder, "e.txt"))
+    open(os.path.join(folder, "a.txt"), "w").close()
+    lister.refresh(root, folder)
+    while lister.busy(root):
+        tree.update()
+    assert rows(tree, root) == ["sub", "a.txt", "... 2 more"], rows(tree, root)
+    assert tree.get_children(root)[0] == nodes["sub"]
+    lister.load_more(root)
+    while lister.busy(root):
+        tree.update()
+    os.remove(os.path.join(folder, "d.txt"))
+    lister.refresh(root, folder)
+    while lister.busy(root):
+        tree.update()
+    assert rows(tree, root) == ["sub", "a.txt", "e.txt"], rows(tree, root)
+
+
+def check_rename(folder):
+    # what rename_item does to an open folder: the rows below it come back with the new path
+    os.makedirs(os.path.join(folder, "a", "sub"))
+    open(os.path.join(folder, "a", "sub", "x.txt"), "w").close()
+    tree = ModelTree()
+
+    def insert(parent, entry, index="end"):
+        node = tree.insert(parent, index, text=entry[0], values=(entry[1],))
+        if entry[2]:
+            tree.insert(node, "end")
+        return node
+    lister = dirlist.TreeFiller(tree, insert)
+    root = tree.insert("", "end", text=folder, values=(folder,))
+    fill(tree, lister, root, folder)
+    a = tree.get_children(root)[0]
+    fill(tree, lister, a, os.path.join(folder, "a"))
+    sub = tree.get_children(a)[0]
+    fill(tree, lister, sub, os.path.join(folder, "a", "sub"))
+    new_path = os.path.join(folder, "b")
+    os.rename(os.path.join(folder, "a"), new_path)
+    tree.item(a, text="b", values=(new_path,))
+    lister.forget(a)
+    lister.refresh(root, folder)
+    while lister.busy(root):
+        tree.update()
+    assert tree.get_children(root) == (a,) and lister.listing(sub) is None
+    lister.refresh(a, new_path)  # reopened
+    while lister.busy(a):
+        tree.update()
+    sub = tree.get_children(a)[0]
+    assert tree.set(sub, "fullpath") == os.path.join(new_path, "sub")
+    fill(tree, lister, sub, tree.set(sub, "fullpath"))
+    assert tree.set(tree.get_children(sub)[0], "fullpath") == os.path.join(new_path, "sub", "x.txt")
+
+
+def check_watchers(folder):
+    for watcher_class in (dirwatch.InotifyWatcher, dirwatch.PollingWatcher):
+        changes = queue.Queue()
+        watcher = watcher_class(changes.put) if watcher_class is dirwatch.InotifyWatcher \
+            else watcher_class(changes.put, interval=0.05)
+        watcher.add(folder)
+        time.sleep(0.01)
+        start = time.perf_counter()
+        with open(os.path.join(folder, f"new-{watcher_class.__name__}"), "w"):
+            pass
+        assert changes.get(timeout=5) == folder
+        print(f"{watcher_class.__name__} noticed in {(time.perf_counter() - start) * 1000:.1f} ms")
+        watcher.close()
+
+
+def main(entries=50_000):
+    path = workloads.ensure_tree("wide", entries)
+    old, new = best_of(legacy, path), best_of(dirlist.scan, path)
+    print(f"{entries} entries: listdir + isdir {old * 1000:.1f} ms, scandir {new * 1000:.1f} ms")
+    tuples, tuple_bytes = allocated(legacy, path)
+    listing, listing_bytes = allocated(dirlist.scan, path)
+    print(f"memory: tuples {tuple_bytes / 1e6:.1f} MB, Listing {listing_bytes / 1e6:.1f} MB")
+    assert sorted(tuples) == sorted(listing.entry(i) for i in range(len(listing)))
+
+    tree = ModelTree()
+    lister = dirlist.TreeFiller(tree, lambda parent, entry: tree.insert(parent, "end", text=entry[0]),
+                                page_size=dirlist.PAGE_SIZE)
+    root = tree.insert("", "end", text=path)
+    start = time.perf_counter()
+    fill(tree, lister, root, path)
+    print(f"first page {(time.perf_counter() - start) * 1000:.1f} ms")
+    assert len(tree.get_children(root)) == dirlist.PAGE_SIZE + 1
+    names = [listing.entry(i)[0] for i in range(len(listing))]
+    while True:
+        more = [row for row, parent in lister.more_rows.items() if parent == root]
+        if not more:
+            break
+        lister.load_more(root)
+        while lister.busy(root):
+            tree.update()
+    assert rows(tree, root) == names
+
+    # folders stay first whichever way the names go
+    lister.sort(True)
+    while lister.busy(root):
+        tree.update()
+    shown = rows(tree, root)[:dirlist.PAGE_SIZE]
+    folders = [name for name in names if os.path.isdir(os.path.join(path, name))]
+    assert shown[:len(folders)] == sorted(folders, key=str.casefold, reverse=True)[:dirlist.PAGE_SIZE]
+
+    lister.filter(root, "REPORT_1")
+    while lister.busy(root):
+        tree.update()
+    expected = [name for name in names if "report_1" in name.lower()]
+    got = rows(tree, root)
+    assert all("report_1" in name.lower() for name in got if not name.startswith("..."))
+    assert len(got) == min(len(expected), dirlist.PAGE_SIZE) + (len(expected) > dirlist.PAGE_SIZE)
+    lister.filter(root, "")
+    while lister.busy(root):
+        tree.update()
+    assert len(tree.get_children(root)) == dirlist.PAGE_SIZE + 1
+
+    dirlist.cache.forget(path)
+    cold = best_of(dirlist.cache.get, path, repeat=1)
+    warm = best_of(dirlist.cache.get, path)
+    print(f"cache: cold {cold * 1000:.1f} ms, unchanged folder {warm * 1000:.2f} ms")
+    with tempfile.TemporaryDirectory() as tmp:
+        check_refresh(tmp)
+    with tempfile.TemporaryDirectory() as tmp:
+        check_rename(tmp)
+    if sys.platform.startswith("linux"):
+        with tempfile.TemporaryDirectory() as tmp:
+            check_watchers(tmp)
+    print("ok")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 50_000)
@@ -0,0 +1,78 @@
+# python -m benchmarks.bench_disk_usage [entries]
+# disk usage pass: answers vs a brute force os.walk, time, and peak memory against tree size
+import heapq
+import os
+import sys
+import time
+import tracemalloc
+
+import disk_usage
+from benchmarks import workloads
+from benchmarks.bench_folder_size import walk_size
+
+
+def brute_force(root, top):
+    files = []
+    extensions = {}
+    depths = {}
+    folders = []
+    for folder, dirs, names in os.walk(root):
+        depth = 0 if folder == root else os.path.relpath(folder, root).count(os.sep) + 1
+        if folder != root:
+            folders.append((walk_size(folder), folder))
+        for name in names:
+            path = os.path.join(folder, name)
+            size = os.lstat(path).st_size
+            files.append((size, path))
+            totals = extensions.setdefault(disk_usage.extension(name), [0, 0])
+            totals[0] += size
+            totals[1] += 1
+            level = depths.setdefault(depth, [0, 0])
+            level[0] += size
+            level[1] += 1
+    return {
+        "files": heapq.nlargest(top, files),
+        "folders": heapq.nlargest(top, folders),
+        "extensions": sorted(((size, count, ext) for ext, (size, count) in extensions.items()), reverse=True)[:top],
+        "depths": [tuple(depths.get(depth, (0, 0))) for depth in range(max(depths) + 1)],
+    }
+
+
+def peak(root):
+    tracemalloc.start()
+    disk_usage.Usage(root).run_all()
+    _, high = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return high
+
+
+def main(entries=100_000):
+    root = workloads.ensure_tree("deep", entries)
+    usage = disk_usage.Usage(root)
+    start = time.perf_counter()
+    got = usage.run_all()
+    took = time.perf_counter() - start
+    want = brute_force(root, disk_usage.TOP)
+    # sizes only for the heaps: equal sized entries can tie in any order
+    for key in ("files", "folders"):
+        assert [size for size, _ in got[key]] == [size for size, _ in want[key]], key
+        assert all(os.path.exists(path) for _, path in got[key]), key
+    assert got["extensions"] == want["extensions"]
+    assert got["depths"] == want["depths"], (got["depths"], want["depths"])
+    assert usage.size == walk_size(root) == sum(size for size, _ in got["depths"])
+    print(f"{entries} entries: {usage.files} files, {usage.folders} folders in {took * 1000:.0f} ms")
+
+    # memory follows the depth and width of the tree, not how many files it has
+    small = peak(workloads.ensure_tree("deep", entries // 10))
+    large = peak(root)
+    print(f"peak memory: {small / 1024:.0f} KiB at {entries // 10} entries, {large / 1024:.0f} KiB at {entries}")
+    assert large < small * 2, (small, large)
+
+    stopped = disk_usage.Usage(root).start()
+    stopped.cancel()
+    assert stopped.done.wait(10)
+    print("ok")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000)
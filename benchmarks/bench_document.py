@@ -0,0 +1,59 @@
+# python -m benchmarks.bench_document [lines]
+# the headless Document against a plain str: times edits and line lookups (tests/test_document.py checks them)
+import random
+import sys
+import time
+
+from document import Document
+from benchmarks.bench_highlight import make_note
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    func(*args)
+    return time.perf_counter() - start
+
+
+def typing(buffer, at, insert, delete, count):
+    for i in range(count):
+        buffer = insert(buffer, at + i, "x")
+    for i in range(count):
+        buffer = delete(buffer, at, at + 1)
+    return buffer
+
+
+def main(lines=200000):
+    text = make_note(lines)
+    doc = Document(text)
+    middle = len(text) // 2
+    count = 500
+    rope = timed(typing, doc, middle,
+                 lambda d, at, s: (d.insert(at, s), d)[1],
+                 lambda d, a, b: (d.delete(a, b), d)[1], count)
+    flat = timed(typing, text, middle,
+                 lambda t, at, s: t[:at] + s + t[at:],
+                 lambda t, a, b: t[:a] + t[b:], count)
+    print(f"{lines} lines, {len(text)} chars")
+    print(f"{2 * count} single char edits   rope {rope * 1000:8.1f} ms   str {flat * 1000:8.1f} ms")
+
+    probes = [random.Random(2).randint(1, lines) for _ in range(2000)]
+    rope = timed(lambda: [doc.lines_text(line, line) for line in probes])
+    flat = timed(lambda: [text.split("\n")[line - 1] for line in probes[:10]]) * 200
+    print(f"2000 line lookups           rope {rope * 1000:8.1f} ms   str {flat * 1000:8.1f} ms (split, extrapolated)")
+
+    # number the lines so the cache can't lean on the sample repeating itself
+    numbered = Document("\n".join(f"{line} #{i}" for i, line in enumerate(text.split("\n", 2000)[:2000])))
+    cold = timed(numbered.inline_tokens, 1, 2000)
+    warm = timed(numbered.inline_tokens, 1, 2000)
+    print(f"tokens for 2000 lines       cold {cold * 1000:8.1f} ms   cached {warm * 1000:8.1f} ms")
+
+    # what the editor sends per keystroke: the whole current line, here a 1 MB one
+    line = "x" * 1_000_000
+    long_line = Document(line)
+    typed = timed(lambda: [long_line.replace_lines(1, 1, line[:500_000] + "y" * i + line[500_000:])
+                           for i in range(1, 101)])
+    print(f"100 keys on a 1 MB line     {typed * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200000)
@@ -0,0 +1,98 @@
+# python -m benchmarks.bench_drive_index [entries]
+# drive name index: full build, no-op and incremental refresh, query latency vs a live crawl
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import drive_index
+import drive_search
+from benchmarks import workloads
+
+
+def timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def crawl(root, term):
+    return sorted(drive_search.Crawl(root, drive_search.substring(term)).run_all())
+
+
+def age_tree(root, seconds=3600):
+    # generated trees are brand new, which the index (rightly) won't trust yet
+    past = time.time() - seconds
+    for folder, _, _ in os.walk(root):
+        os.utime(folder, (past, past))
+
+
+def main(entries=100_000):
+    root = workloads.ensure_tree("deep", entries)
+    age_tree(root)
+    with tempfile.TemporaryDirectory() as tmp:
+        index = drive_index.DriveIndex(root, os.path.join(tmp, "big.sqlite"))
+        assert not index.fresh()
+        listed, build = timed(index.refresh)
+        again, noop = timed(index.refresh)
+        assert index.fresh() and again == 0, again
+        _, check = timed(index.fresh)
+        print(f"{entries} entries: build {build:.2f} s ({listed} folders), no-op refresh {noop * 1000:.0f} ms, "
+              f"freshness check {check * 1000:.0f} ms")
+        for term in ("report", "ph", "invoice_1", "no such name", "DRAFT_9"):
+            expected, live = timed(crawl, root, term)
+            found, query = timed(index.search, term)
+            assert sorted(found) == expected, (term, len(found), len(expected))
+            print(f"  {term!r:<16}{len(found):>6} hits  index {query * 1000:7.2f} ms   crawl {live * 1000:7.1f} ms")
+        sub = os.path.join(root, sorted(name for name in os.listdir(root) if "_dir" in name)[0])
+        assert sorted(index.search("report", under=sub)) == crawl(sub, "report")
+        assert len(index.search("report", limit=10)) == 10
+
+        # changes land with the next refresh, and only changed folders are listed again
+        small = os.path.join(tmp, "small")
+        workloads.make_deep_tree(small, 5000)
+        age_tree(small)
+        index = drive_index.DriveIndex(small, os.path.join(tmp, "small.sqlite"))
+        index.refresh()
+        # a folder the reader changed itself isn't answered from the index until a refresh
+        some = sorted(entry.path for entry in os.scandir(small) if entry.is_dir())
+        index.mark_stale(some[0])
+        assert index.fresh(under=some[1]) and not index.fresh(under=some[0])
+        assert not index.fresh(under=small) and not index.fresh(under=os.path.join(some[0], "x"))
+        index.refresh()
+        assert index.fresh(under=some[0]) and index.fresh()
+        # another program changing the stick: the folder's mtime no longer matches
+        stranger = os.path.join(some[1], "copied_in_elsewhere.txt")
+        open(stranger, "w").close()
+        assert not index.fresh() and not index.fresh(under=some[1]) and index.fresh(under=some[0])
+        searched = drive_search.IndexedCrawl(small, drive_search.substring("copied_in"), index, "copied_in")
+        assert searched.run_all() == [stranger] and not searched.from_index
+        age_tree(small)
+        index.refresh()
+        searched = drive_search.IndexedCrawl(small, drive_search.substring("copied_in"), index, "copied_in")
+        assert searched.run_all() == [stranger] and searched.from_index
+        os.remove(stranger)
+        assert not index.fresh(under=some[1])
+        age_tree(small)
+        index.refresh()
+        walked = [(folder, dirs, files) for folder, dirs, files in os.walk(small)]
+        gone = walked[1][0]  # a whole subtree
+        kept = [item for item in walked if not item[0].startswith(gone)]
+        with_files = [folder for folder, _, files in kept if files]
+        leaves = [folder for folder, dirs, _ in kept if not dirs]
+        open(os.path.join(with_files[0], "zebra_new.txt"), "w").close()
+        os.remove(os.path.join(with_files[-1], next(files for folder, _, files in kept if folder == with_files[-1])[0]))
+        shutil.rmtree(gone)
+        os.rename(leaves[-1], leaves[-1] + "_moved")
+        listed, incremental = timed(index.refresh)
+        print(f"incremental refresh after 4 changes: {listed} folders listed, {incremental * 1000:.0f} ms")
+        # the folders changed in plus the renamed one under its new name
+        assert listed <= 5, listed
+        for term in ("zebra", "report", "_moved", "dir"):
+            assert sorted(index.search(term)) == crawl(small, term), term
+    print("ok")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000)
@@ -0,0 +1,54 @@
+# python -m benchmarks.bench_drive_search [entries]
+# USB_reader search: the old os.walk loop vs the streaming crawl, first result latency, cap and stop
+import os
+import sys
+import time
+
+import drive_search
+from benchmarks import workloads
+
+
+def walk_search(start_path, term):
+    # USB_reader.search before it moved to a worker thread
+    matches = []
+    for root, dirs, files in os.walk(start_path):
+        for name in dirs + files:
+            if term in name.lower():
+                matches.append(os.path.join(root, name))
+    return matches
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def main(entries=100_000):
+    root = workloads.ensure_tree("deep", entries)
+    term = "report"
+    expected, walk = timed(walk_search, root, term)
+    found, crawl = timed(drive_search.Crawl(root, drive_search.substring(term)).run_all)
+    assert sorted(found) == sorted(expected), (len(found), len(expected))
+    print(f"{len(found)} matches: os.walk {walk * 1000:.0f} ms, crawl {crawl * 1000:.0f} ms")
+
+    # what the window waits for before the list starts filling
+    crawl = drive_search.Crawl(root, drive_search.substring(term)).start()
+    start = time.perf_counter()
+    while not crawl.found:
+        time.sleep(0.0005)
+    first = time.perf_counter() - start
+    crawl.done.wait()
+    print(f"first match after {first * 1000:.1f} ms (everything took {crawl.elapsed * 1000:.0f} ms)")
+
+    capped = drive_search.Crawl(root, drive_search.substring(term), cap=100)
+    assert len(capped.run_all()) == 100 and capped.truncated
+
+    stopped = drive_search.Crawl(root, drive_search.substring(term)).start()
+    stopped.cancel()
+    assert stopped.done.wait(1) and stopped.folders < 10 and not stopped.truncated
+    print("ok")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000)
@@ -0,0 +1,115 @@
+# python -m benchmarks.bench_find [lines]
+# find/replace engine: checks replace-all against re.sub and its style rules, then times it
+import random
+import re
+import sys
+import time
+
+import find_replace
+from document import Document, HeadingIndex
+from benchmarks.bench_highlight import make_note
+
+
+def expected_styles(text, styled, replacements):
+    # per-char model: touching matches form a run, whose new text keeps the style
+    # when the chars on both sides of the run had it
+    runs = []
+    for start, end, new in replacements:
+        if runs and runs[-1][1] == start:
+            runs[-1] = (runs[-1][0], end, runs[-1][2] + new)
+        else:
+            runs.append((start, end, new))
+    new_styled = []
+    pos = 0
+    for start, end, new in runs:
+        new_styled.extend(styled[pos:start])
+        before = start > 0 and styled[start - 1]
+        after = end < len(text) and styled[end]
+        new_styled.extend([before and after] * len(new))
+        pos = end
+    new_styled.extend(styled[pos:])
+    return new_styled
+
+
+def spans_to_flags(length, spans):
+    flags = [False] * length
+    for start, end in spans:
+        flags[start:end] = [True] * (end - start)
+    return flags
+
+
+def check_replace(rounds=300, seed=3):
+    rng = random.Random(seed)
+    for _ in range(rounds):
+        text = "".join(rng.choice("ab \nxy#") for _ in range(rng.randint(0, 60)))
+        pattern = re.compile(rng.choice(["a", "ab", "a*", r"\bx", "y\n", "b+"]))
+        repl = rng.choice(["", "Q", "QQQ", "\n"])
+        replacements = find_replace.find_replacements(pattern, text, repl)
+        expected = pattern.sub(repl, text)
+        assert find_replace.replace_text(text, replacements) == expected
+
+        spans = []
+        pos = 0
+        while pos < len(text):
+            start = pos + rng.randint(0, 5)
+            end = min(len(text), start + rng.randint(1, 8))
+            if start < end:
+                spans.append((start, end))
+            pos = end + 1
+        # both ways replace_ranges can go: one rope rebuild, or an edit per range
+        for rebuild in (True, False):
+            doc = Document(text)
+            doc.rebuilds = lambda count: rebuild
+            for start, end in spans:
+                doc.styles.add(("text_color", "red"), start, end)
+            doc.replace_ranges(replacements)
+            assert doc.text() == expected
+            headings = HeadingIndex(expected)
+            assert (doc.headings.lines, doc.headings.levels, doc.headings.titles) == \
+                (headings.lines, headings.levels, headings.titles)
+            want = expected_styles(text, spans_to_flags(len(text), spans), replacements)
+            got = spans_to_flags(len(expected), doc.styles.spans.get(("text_color", "red"), []))
+            assert got == want, (text, pattern.pattern, repl, spans)
+
+        matches = find_replace.find_all(pattern, text)
+        assert list(matches.ranges()) == [m.span() for m in pattern.finditer(text)]
+        for offset in range(len(text) + 1):
+            i = matches.after(offset)
+            if i is not None:
+                assert matches.starts[i] >= offset or i == 0
+                assert i == 0 or matches.starts[i - 1] < offset
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def main(lines=200000):
+    check_replace()
+    text = make_note(lines)
+    pattern = find_replace.compile_pattern("e")
+    matches, find = timed(find_replace.find_all, pattern, text)
+    indices, flatten = timed(lambda: find_replace.LineIndex(text).flatten(matches.ranges()))
+    replacements, collect = timed(find_replace.find_replacements, pattern, text, "E")
+    _, script = timed(find_replace.tk_script_args, text, replacements)
+    doc = Document(text)
+    _, rebuild = timed(doc.replace_ranges, replacements)
+    assert doc.text() == pattern.sub("E", text)
+    # undoing or redoing a small replace-all edits the rope instead of rebuilding it
+    few = Document(text)
+    _, edit = timed(few.replace_ranges, replacements[:20])
+    assert not few.rebuilds(20) and few.text() == find_replace.replace_text(text, replacements[:20])
+
+    print(f"{lines} lines, {len(matches)} matches, checks ok")
+    print(f"find_all              {find * 1000:9.1f} ms")
+    print(f"tag indices           {flatten * 1000:9.1f} ms")
+    print(f"replacements          {collect * 1000:9.1f} ms")
+    print(f"tk replace script     {script * 1000:9.1f} ms")
+    print(f"document replace all  {rebuild * 1000:9.1f} ms")
+    print(f"document 20 ranges    {edit * 1000:9.1f} ms")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200000)
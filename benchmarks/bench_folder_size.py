@@ -0,0 +1,87 @@
+# python -m benchmarks.bench_folder_size [entries]
+# folder sizing for USB_reader's attributes dialog: the old recursive walk vs the pool, cold and cached
+import os
+import sys
+import tempfile
+
+import folder_size
+from benchmarks import workloads
+from benchmarks.bench_drive_index import age_tree, timed
+
+
+def walk_size(folder):
+    # what USB_reader.get_folder_size used to do
+    total = 0
+    try:
+        with os.scandir(folder) as it:
+            for entry in it:
+                try:
+                    if entry.is_file(follow_symlinks=False):
+                        total += entry.stat(follow_symlinks=False).st_size
+                    elif entry.is_dir(follow_symlinks=False):
+                        total += walk_size(entry.path)
+                except OSError:
+                    continue
+    except OSError:
+        pass
+    return total
+
+
+def size(folder, **kwargs):
+    return folder_size.Sizing(folder, **kwargs).run()
+
+
+def main(entries=100_000):
+    root = workloads.ensure_tree("deep", entries)
+    age_tree(root)
+    folder_size.cache.clear()
+    expected, old = timed(walk_size, root)
+    sizing = folder_size.Sizing(root)
+    _, cold = timed(sizing.run)
+    assert sizing.size == expected and sizing.cached == 0, (sizing.size, expected)
+    warm_sizing = folder_size.Sizing(root)
+    _, warm = timed(warm_sizing.run)
+    assert warm_sizing.size == expected and warm_sizing.cached == warm_sizing.folders == sizing.folders
+    print(f"{entries} entries, {sizing.folders} folders: recursive {old * 1000:.0f} ms, "
+          f"pool cold {cold * 1000:.0f} ms, cached {warm * 1000:.0f} ms")
+
+    # a parent sized after one of its children only lists what it has outside that child
+    folder_size.cache.clear()
+    child = os.path.join(root, sorted(name for name in os.listdir(root) if "_dir" in name)[0])
+    assert size(child) == walk_size(child)
+    parent = folder_size.Sizing(root)
+    parent.run()
+    assert parent.size == expected
+    child_folders = sum(1 for _ in os.walk(child))
+    assert parent.cached == child_folders, (parent.cached, child_folders)
+    print(f"parent after child: {parent.cached} of {parent.folders} folders from the cache")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        small = os.path.join(tmp, "small")
+        workloads.make_deep_tree(small, 5000)
+        age_tree(small)
+        size(small)
+        walked = [(folder, files) for folder, _, files in os.walk(small)]
+        with_files = [folder for folder, files in walked if files]
+        # adding a file bumps its folder's mtime, only that folder is listed again
+        with open(os.path.join(with_files[-1], "added.bin"), "wb") as f:
+            f.write(b"x" * 12345)
+        again = folder_size.Sizing(small)
+        again.run()
+        assert again.size == walk_size(small) and again.cached == again.folders - 1, (again.cached, again.folders)
+        # growing a file in place doesn't; a recount sees it
+        age_tree(small)
+        size(small)
+        with open(os.path.join(with_files[0], sorted(os.listdir(with_files[0]))[-1]), "ab") as f:
+            f.write(b"y" * 1000)
+        assert size(small) == walk_size(small) - 1000
+        assert size(small, recount=True) == walk_size(small)
+        # cancelling stops early and still finishes
+        stopped = folder_size.Sizing(root, recount=True).start()
+        stopped.cancel()
+        assert stopped.done.wait(10)
+    print("ok")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000)
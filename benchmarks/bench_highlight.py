@@ -0,0 +1,158 @@
+# python -m benchmarks.bench_highlight [lines]
+# old highlight_syntax (ten regex scans + "1.0+Nc" indices) vs the tokenizer and line index
+import re
+import sys
+import time
+
+from highlighter import LineIndex, MARKDOWN_PATTERNS, MARKDOWN_TAGS, tokenize
+
+SAMPLE_LINES = [
+    "## Section heading",
+    "- **Bold Text** and *italic* with `code`",
+    "plain prose line that goes on for a while without any markup in it at all",
+    "> a quoted line with ~~deleted~~ words",
+    "[Link](https://www.example.com) and [Email](mailto:example@example.com)",
+    "```",
+    "code inside a block",
+    "```",
+]
+
+
+def make_note(lines):
+    return "\n".join(SAMPLE_LINES[i % len(SAMPLE_LINES)] for i in range(lines)) + "\n"
+
+
+# markup inside other markup keeps both tags, as it did with one regex pass per tag
+NESTED = [
+    ("**[Link](https://example.com)**", {"bold", "link"}),
+    ("`a **b** c`", {"inline_code", "bold"}),
+    ("~~**x**~~", {"strikethrough", "bold"}),
+    ("**bold *it* more**", {"bold", "italic"}),
+    ("- **b** > not a quote", {"bullet", "bold"}),
+]
+
+
+def check_nesting():
+    for text, tags in NESTED:
+        found = {tag for tag, ranges in tokenize(text).items() if ranges}
+        assert found == tags, (text, found)
+    # the stars of **bold** aren't italic on their own
+    assert tokenize("**bold**")["italic"] == []
+    assert tokenize("**bold *it* more**")["italic"] == [(7, 11)]
+
+
+def legacy_offsets(text):
+    return {tag: [match.span() for match in re.finditer(pattern, text, re.MULTILINE)]
+            for tag, pattern in MARKDOWN_PATTERNS.items()}
+
+
+def legacy_indices(offsets):
+    return {tag: [(f"1.0+{start}c", f"1.0+{end}c") for start, end in found] for tag, found in offsets.items()}
+
+
+def line_indices(text, offsets):
+    lines = LineIndex(text)
+    return {tag: lines.flatten(found) for tag, found in offsets.items()}
+
+
+def legacy_ranges(text):
+    ranges = {}
+    for tag, pattern in MARKDOWN_PATTERNS.items():
+        found = ranges.setdefault(tag, [])
+        for match in re.finditer(pattern, text, re.MULTILINE):
+            found.append((f"1.0+{match.start()}c", f"1.0+{match.end()}c"))
+    return ranges
+
+
+def single_pass_ranges(text):
+    tokens = tokenize(text)
+    lines = LineIndex(text)
+    return {tag: lines.flatten(tokens[tag]) for tag in MARKDOWN_TAGS}
+
+
+def best_of(func, *args, repeat=3):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def tk_apply(widget, ranges):
+    for tag in MARKDOWN_TAGS:
+        widget.tag_remove(tag, "1.0", "end")
+    for tag, found in ranges.items():
+        if found and isinstance(found[0], tuple):
+            for start, end in found:
+                widget.tag_add(tag, start, end)
+        elif found:
+            widget.tag_add(tag, *found)
+
+
+class TclSink:
+    """Takes tk_apply's calls like a Text widget would, without a display.
+
+    tag add/remove go to a Tcl proc that does nothing, so what's timed is
+    building the arguments and getting them from Python into Tcl, everything
+    but Tk's own work on the tags (which only makes "1.0+Nc" dearer still).
+    """
+
+    def __init__(self):
+        import tkinter
+        self.tcl = tkinter.Tcl()
+        self.tcl.eval("proc tag args {}")
+
+    def tag_add(self, tag, *indices):
+        self.tcl.call("tag", "add", tag, *indices)
+
+    def tag_remove(self, tag, start, end):
+        self.tcl.call("tag", "remove", tag, start, end)
+
+
+def main(lines=20000):
+    check_nesting()
+    text = make_note(lines)
+    print(f"{lines} lines, {len(text)} chars")
+    old = best_of(legacy_offsets, text)
+    new = best_of(tokenize, text)
+    print(f"tokenize  legacy {old * 1000:8.1f} ms   tokenizer   {new * 1000:8.1f} ms   x{old / new:.1f}")
+    # "1.0+Nc" strings are cheap here and dear in Tk (it counts characters from the
+    # top for each one), "line.col" costs a line table and a bisect here and nothing there
+    offsets = tokenize(text)
+    old = best_of(legacy_indices, offsets)
+    new = best_of(line_indices, text, offsets)
+    print(f"indices   legacy {old * 1000:8.1f} ms   line index  {new * 1000:8.1f} ms   x{old / new:.1f}")
+    # Python only, text in, tag_add arguments out
+    old = best_of(legacy_ranges, text)
+    new = best_of(single_pass_ranges, text)
+    print(f"both      legacy {old * 1000:8.1f} ms   new         {new * 1000:8.1f} ms   x{old / new:.1f}")
+    # and handed to Tcl: the old code made a tag_add call per token, the new one one per tag
+    try:
+        sink = TclSink()
+    except Exception as e:
+        print(f"skipping Tcl timings: {e}")
+    else:
+        old = best_of(lambda: tk_apply(sink, legacy_ranges(text)))
+        new = best_of(lambda: tk_apply(sink, single_pass_ranges(text)))
+        print(f"to Tcl    legacy {old * 1000:8.1f} ms   new         {new * 1000:8.1f} ms   x{old / new:.1f}")
+
+    # which is why the end to end number needs Tk, and so a display (xvfb-run works)
+    try:
+        import tkinter as tk
+        root = tk.Tk()
+    except Exception as e:
+        print(f"skipping Tk timings: {e}")
+        return
+    root.withdraw()
+    widget = tk.Text(root)
+    widget.insert("1.0", text)
+    old = best_of(lambda: tk_apply(widget, legacy_ranges(widget.get("1.0", "end"))), repeat=1)
+    new = best_of(lambda: tk_apply(widget, single_pass_ranges(widget.get("1.0", "end"))), repeat=1)
+    print(f"highlight legacy {old * 1000:8.1f} ms   line index  {new * 1000:8.1f} ms   x{old / new:.1f}")
+    root.destroy()
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20000)
@@ -0,0 +1,110 @@
+# python -m benchmarks.bench_history [edits]
+# undo history on a plain str: undo/redo round trips, typing coalescing, the memory budget
+import random
+import sys
+import time
+
+from history import History, unpack
+
+
+def apply(text, op, undo):
+    kind, at, piece = op[0], op[1], unpack(op[2])
+    if (kind == "insert") == undo:
+        assert text[at:at + len(piece)] == piece
+        return text[:at] + text[at + len(piece):]
+    return text[:at] + piece + text[at:]
+
+
+def random_edits(history, text, edits, rng):
+    recording = 0
+    for _ in range(edits):
+        if rng.random() < 0.7 or not text:
+            at = rng.randint(0, len(text))
+            piece = rng.choice(["x", "y", " ", "\n", "pasted text\n" * rng.randint(1, 50)])
+            op = ("insert", at, piece)
+        else:
+            at = rng.randint(0, len(text) - 1)
+            op = ("delete", at, text[at:at + rng.randint(1, 3)], [])
+        if rng.random() < 0.05:
+            history.separator()
+        start = time.perf_counter()
+        history.record(op)
+        recording += time.perf_counter() - start
+        text = apply(text, op, undo=False)
+    return text, recording
+
+
+def check_round_trip(edits=2000, seed=5):
+    rng = random.Random(seed)
+    history = History(max_bytes=1 << 40)
+    start = "hello\nworld\n"
+    end, _ = random_edits(history, start, edits, rng)
+    text = end
+    while True:
+        group = history.undo()
+        if group is None:
+            break
+        for op in reversed(group.ops):
+            text = apply(text, op, undo=True)
+    assert text == start, "undo didn't get back to the start"
+    while True:
+        group = history.redo()
+        if group is None:
+            break
+        for op in group.ops:
+            text = apply(text, op, undo=False)
+    assert text == end, "redo didn't get back to the end"
+
+
+def check_typing():
+    history = History()
+    for i, ch in enumerate("hello"):
+        history.record(("insert", i, ch))
+    for i in range(4, 1, -1):
+        history.record(("delete", i, "hello"[i], []))  # backspace
+    history.record(("insert", 2, "\n"))
+    assert [len(group.ops) for group in history.undo_stack] == [1, 1, 1]
+    assert history.undo_stack[0].ops[0] == ("insert", 0, "hello")
+    assert history.undo_stack[1].ops[0] == ("delete", 2, "llo", [])
+    history.begin()
+    history.record(("insert", 0, "**"))
+    history.record(("insert", 5, "**"))
+    history.end()
+    assert len(history.undo_stack) == 4 and len(history.undo_stack[-1].ops) == 2
+
+
+def check_budget():
+    # both stacks count against max_bytes, redo included
+    history = History(max_bytes=4096)
+    for i in range(10):
+        history.separator()
+        history.record(("insert", 0, "x" * 1000))
+    assert history.size <= 4096
+    while history.undo() is not None:
+        pass
+    assert not history.undo_stack and history.size <= 4096
+    assert history.size == sum(group.size for group in history.redo_stack)
+    # one step bigger than the budget stays, as the next redo
+    history.clear()
+    history.record(("insert", 0, "y" * 10000))
+    history.undo()
+    assert len(history.redo_stack) == 1
+
+
+def main(edits=20000):
+    check_round_trip()
+    check_typing()
+    check_budget()
+    budget = 2 * 1024 * 1024
+    history = History(max_bytes=budget)
+    rng = random.Random(9)
+    _, elapsed = random_edits(history, "", edits, rng)
+    assert history.size <= budget or len(history.undo_stack) == 1
+    print("undo/redo round trip ok, typing coalesces")
+    print(f"{edits} edits recorded in {elapsed * 1000:.1f} ms")
+    print(f"{len(history.undo_stack)} undo steps kept in {history.size / 1024:.0f} KB "
+          f"(budget {budget // 1024} KB, {history.evicted} evicted)")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20000)
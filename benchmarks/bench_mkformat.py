@@ -0,0 +1,67 @@
+# python -m benchmarks.bench_mkformat [lines]
+# .mk v1 (one JSON blob) vs v2 (chunked container): size, save/open/first screen
+# (tests/test_mkformat.py checks the round trips)
+import json
+import os
+import sys
+import tempfile
+import time
+
+import mkformat
+from benchmarks.bench_highlight import make_note
+
+
+def make_data(lines):
+    content = make_note(lines)
+    ranges = [(f"{line}.0", f"{line}.3") for line in range(1, lines, 3)]
+    return {
+        "global": {"font_size": 12, "global_text_color": "black", "global_bg_color": "white"},
+        "content": content,
+        "persistent_tags": [
+            {"tag": "custom_text_color_0", "ranges": ranges, "config": {"foreground": "#ff0000"}},
+            {"tag": "sel_font_1", "ranges": ranges[::7], "config": {"font": "Courier 16"}},
+        ],
+    }
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def save_v1(data, path):
+    with open(path, "w") as f:
+        json.dump(data, f)
+
+
+def first_screen(path):
+    # what the editor waits for before it can show anything
+    for kind, value in mkformat.iter_note(path):
+        if kind == "text":
+            return value
+
+
+def main(lines=200000):
+    data = make_data(lines)
+    with tempfile.TemporaryDirectory() as tmp:
+        v1 = os.path.join(tmp, "note_v1.mk")
+        v2 = os.path.join(tmp, "note_v2.mk")
+        _, save1 = timed(save_v1, data, v1)
+        _, save2 = timed(mkformat.dump, data, v2)
+
+        _, load1 = timed(mkformat.load, v1)
+        _, load2 = timed(mkformat.load, v2)
+        _, first1 = timed(first_screen, v1)
+        _, first2 = timed(first_screen, v2)
+
+        ranges = sum(len(tag["ranges"]) for tag in data["persistent_tags"])
+        print(f"{lines} lines, {len(data['content'])} chars, {ranges} styled ranges")
+        print(f"size          v1 {os.path.getsize(v1) / 1024:9.0f} KB   v2 {os.path.getsize(v2) / 1024:9.0f} KB")
+        print(f"save          v1 {save1 * 1000:9.1f} ms   v2 {save2 * 1000:9.1f} ms")
+        print(f"open (full)   v1 {load1 * 1000:9.1f} ms   v2 {load2 * 1000:9.1f} ms")
+        print(f"first screen  v1 {first1 * 1000:9.1f} ms   v2 {first2 * 1000:9.1f} ms")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200000)
@@ -0,0 +1,49 @@
+# python -m benchmarks.bench_perf [calls]
+# cost of @perf.timed with timing off and on (tests/test_perf.py checks the numbers it keeps)
+import sys
+import time
+
+import perf
+
+
+def plain(x):
+    return x
+
+
+@perf.timed("bench.function")
+def function(x):
+    return x
+
+
+class Widget:
+    def plain(self, x):
+        return x
+
+    @perf.timed("bench.method")
+    def timed(self, x):
+        return x
+
+
+def per_call(func, calls):
+    start = time.perf_counter()
+    for i in range(calls):
+        func(i)
+    return (time.perf_counter() - start) / calls * 1e9
+
+
+def main():
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    widget = Widget()
+    perf.enable(False)
+    rows = [("plain", per_call(plain, calls), per_call(widget.plain, calls))]
+    rows.append(("timing off", per_call(function, calls), per_call(widget.timed, calls)))
+    perf.enable()
+    rows.append(("timing on", per_call(function, calls), per_call(widget.timed, calls)))
+    perf.enable(False)
+    print(f"{'':<12}{'function':>10}{'method':>10}")
+    for label, func, method in rows:
+        print(f"{label:<12}{func:>7.0f} ns{method:>7.0f} ns")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+# python -m benchmarks.bench_query [entries]
+# USB_reader search queries: the crawl with pruning and cached stats vs the same filter over os.walk
+import fnmatch
+import os
+import sys
+import time
+
+import drive_search
+import file_query
+from benchmarks import workloads
+
+MB = 1024 * 1024
+
+
+def walk_filter(root, keep):
+    # the straightforward version: os.walk everything, stat what needs a stat
+    found = []
+    for folder, dirs, files in os.walk(root):
+        relative = os.path.relpath(folder, root).replace(os.sep, "/")
+        relative = "" if relative == "." else relative
+        for name in dirs + files:
+            if keep(name, folder, relative, name in dirs):
+                found.append(os.path.join(folder, name))
+    return found
+
+
+def size(folder, name):
+    return os.stat(os.path.join(folder, name)).st_size
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def check_parser():
+    now = 1_700_000_000
+    # no syntax: one substring, whatever punctuation is in it
+    for plain in ("my report", "photo (1)", "notes: draft", "x-ray -2", '"quoted"', "colour:red", "and or not"):
+        node = file_query.parse(plain)
+        assert type(node) is file_query.Name and node.text == plain.lower(), plain
+    node = file_query.parse("ext:jpg,PNG size:>1M -path:thumbs/** (draft OR re:^img_\\d)", now)
+    assert isinstance(node, file_query.And) and [type(p).__name__ for p in node.parts][-1] == "Size"
+    size = file_query.parse("size:1k..2k")
+    assert (size.low, size.high) == (1024, 2049)
+    recent = file_query.parse("mtime:7d", now)
+    assert (recent.low, recent.high) == (now - 7 * 86400, None)
+    assert (file_query.parse("mtime:>7d", now).low, file_query.parse("mtime:>7d", now).high) == (now - 7 * 86400, None)
+    old = file_query.parse("mtime:<30d", now)  # older than 30 days
+    assert (old.low, old.high) == (None, now - 30 * 86400)
+    assert file_query.plain_name(file_query.parse("Report")) == "report"
+    assert file_query.plain_name(file_query.parse("type:dir")) is None
+    for bad in ("size:big", "(ext:jpg", "re:(", "ext:jpg OR", "mtime:yesterday"):
+        # a substring unless asked to say what's wrong
+        assert type(file_query.parse(bad)) is file_query.Name, bad
+        try:
+            file_query.parse(bad, strict=True)
+        except file_query.QueryError:
+            continue
+        raise AssertionError(f"{bad!r} parsed")
+
+
+def main(entries=100_000):
+    check_parser()
+    root = workloads.ensure_tree("deep", entries)
+    top = sorted(name for name in os.listdir(root) if os.path.isdir(os.path.join(root, name)))
+    cases = [
+        ("report", lambda name, folder, rel, is_dir: "report" in name.lower()),
+        ("ext:jpg,png size:>1M",
+         lambda name, folder, rel, is_dir: not is_dir and name.lower().endswith((".jpg", ".png"))
+            and size(folder, name) > MB),
+        ("type:dir draft*", lambda name, folder, rel, is_dir: is_dir and name.lower().startswith("draft")),
+        ("re:_\\d{2}\\.pdf$ OR ext:zip",
+         lambda name, folder, rel, is_dir: name.lower().endswith(".zip") or
+            fnmatch.fnmatch(name.lower(), "*_[0-9][0-9].pdf")),
+        (f"path:{top[0]}/** ext:mp3",
+         lambda name, folder, rel, is_dir: (rel + "/").lower().startswith(top[0].lower() + "/")
+            and name.lower().endswith(".mp3")),
+        (f"-path:{top[0]}/* -path:{top[1]}/* size:1k..100k",
+         lambda name, folder, rel, is_dir: not (rel + "/").startswith((top[0] + "/", top[1] + "/"))
+            and not is_dir and 1024 <= size(folder, name) <= 100 * 1024),
+    ]
+    for text, keep in cases:
+        expected, walk = timed(walk_filter, root, keep)
+        crawl = drive_search.Crawl(root, file_query.parse(text))
+        found, took = timed(crawl.run_all)
+        assert sorted(found) == sorted(expected), (text, len(found), len(expected))
+        print(f"{text!r:<44}{len(found):>6} hits  os.walk {walk * 1000:6.0f} ms  "
+              f"query {took * 1000:6.0f} ms  ({crawl.folders} folders, {crawl.pruned} pruned)")
+    print("ok")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000)
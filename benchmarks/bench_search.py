@@ -0,0 +1,71 @@
+# python -m benchmarks.bench_search [notes]
+# workspace note search: full index build, incremental refresh, query latency
+import os
+import random
+import sys
+import tempfile
+import time
+
+import mkformat
+import note_search
+from benchmarks.bench_highlight import make_note
+
+WORDS = ["alpha", "bravo", "charlie", "delta", "echo", "foxtrot", "golf", "hotel", "india", "juliet"]
+
+
+def write_notes(folder, count):
+    rng = random.Random(7)
+    paths = []
+    for i in range(count):
+        sub = os.path.join(folder, f"topic{i % 20}")
+        os.makedirs(sub, exist_ok=True)
+        path = os.path.join(sub, f"note{i}.mk")
+        content = make_note(40) + "\n" + " ".join(rng.choice(WORDS) for _ in range(50)) + f"\nmarker{i}\n"
+        mkformat.dump({"global": {}, "content": content, "persistent_tags": []}, path)
+        paths.append(path)
+    return paths
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def main(count=3000):
+    with tempfile.TemporaryDirectory() as tmp:
+        root = os.path.join(tmp, "notes")
+        paths = write_notes(root, count)
+        index = note_search.NoteIndex(root, os.path.join(tmp, "index.sqlite"))
+
+        built, build = timed(index.refresh)
+        assert built == count, built
+        unchanged, noop = timed(index.refresh)
+        assert unchanged == 0, unchanged
+
+        mkformat.dump({"global": {}, "content": "zebra crossing", "persistent_tags": []}, paths[5])
+        os.remove(paths[6])
+        changed, incremental = timed(index.refresh)
+        assert changed == 1, changed
+
+        hits, exact = timed(index.search, f"marker{count - 1}")
+        assert [path for path, _ in hits] == [paths[-1]], hits
+        hits, _ = timed(index.search, "zebra")
+        assert [path for path, _ in hits] == [paths[5]], hits
+        # the last word is a prefix, so marker5 still finds marker50...
+        found = {path for path, _ in index.search("marker5")} | {path for path, _ in index.search("marker6")}
+        assert paths[5] not in found and paths[6] not in found
+        hits, prefix = timed(index.search, "charl")
+        assert hits
+        assert index.search('"') == [] and index.search("") == []
+
+        print(f"{count} notes, index ok")
+        print(f"full build            {build * 1000:9.1f} ms")
+        print(f"refresh, no changes   {noop * 1000:9.1f} ms")
+        print(f"refresh, 1 changed    {incremental * 1000:9.1f} ms")
+        print(f"query, rare word      {exact * 1000:9.1f} ms")
+        print(f"query, common prefix  {prefix * 1000:9.1f} ms")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 3000)
@@ -0,0 +1,326 @@
+# python -m benchmarks.suite [--quick] [--entries N] [--note-mb N] [--baseline PATH] [--save-baseline]
+#
+# End to end timings on generated workloads (see benchmarks.workloads): highlighting,
+# the gutter, save/load, tree population, search and folder sizing.
+#
+# Without a display the explorers run against ModelTree, a small stand-in for
+# ttk.Treeview, so the real populate_tree code still runs and only the widget cost
+# is missing; the highlighter runs as tokenize + line index.
+# Under a display (xvfb-run python -m benchmarks.suite) the real widgets are used and
+# the Tk-only cases (tk.*) are added.
+#
+# Every run is written to the cache dir and compared against the baseline file, if
+# there is one. Cases slower than the baseline by more than --tolerance are listed and
+# the exit status is 1.
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+
+import dirlist
+import disk_usage
+import drive_search
+import folder_size
+import mkformat
+from benchmarks import workloads
+from highlighter import LineIndex, MARKDOWN_TAGS, tokenize
+from notebook import Files
+from USB_reader import USB_reader
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+
+class ModelTree:
+    """The part of ttk.Treeview the explorers use, kept in dicts."""
+
+    def __init__(self):
+        self.items = {"": {"text": "", "values": (), "children": []}}
+        self.parents = {}
+        self.next_id = 0
+        self.focused = ""
+        self.pending = []
+
+    def insert(self, parent, index, text="", values=(), open=False, tags=()):
+        self.next_id += 1
+        iid = f"I{self.next_id:06X}"
+        self.items[iid] = {"text": text, "values": tuple(values), "children": []}
+        self.parents[iid] = parent
+        children = self.items[parent]["children"]
+        if index == "end":
+            children.append(iid)
+        else:
+            children.insert(index, iid)
+        return iid
+
+    def delete(self, *iids):
+        for iid in iids:
+            if iid not in self.items:
+                continue
+            self.delete(*self.items[iid]["children"])
+            self.items[self.parents.pop(iid)]["children"].remove(iid)
+            del self.items[iid]
+
+    def move(self, iid, parent, index):
+        self.items[self.parents[iid]]["children"].remove(iid)
+        self.parents[iid] = parent
+        self.items[parent]["children"].insert(index, iid)
+
+    def get_children(self, iid=""):
+        return tuple(self.items[iid]["children"])
+
+    def item(self, iid, option=None, **options):
+        item = self.items[iid]
+        if options:
+            item.update((key, tuple(value) if key == "values" else value) for key, value in options.items())
+            return None
+        return item[option] if option else dict(item)
+
+    def set(self, iid, column):
+        return self.items[iid]["values"][0]
+
+    def focus(self, iid=None):
+        if iid is None:
+            return self.focused
+        self.focused = iid
+
+    def exists(self, iid):
+        return iid in self.items
+
+    def selection(self):
+        return ()
+
+    def tag_configure(self, tag, **options):
+        pass
+
+    def bind(self, sequence, func, add=None):
+        pass
+
+    def after(self, ms, func):
+        self.pending.append(func)
+
+    def update(self):
+        # stands in for the Tk event loop: run what's due, right away
+        pending, self.pending = self.pending, []
+        for func in pending:
+            func()
+
+
+class FilesView:
+    # Files minus the frame: the methods run unchanged against whatever tree we hand them
+    populate_tree = Files.populate_tree
+    insert_entry = Files.insert_entry
+
+    def __init__(self, tree):
+        self.tree = tree
+        self.lister = dirlist.TreeFiller(tree, self.insert_entry, page_size=dirlist.PAGE_SIZE)
+
+
+class USBView:
+    populate_tree = USB_reader.populate_tree
+    insert_entry = USB_reader.insert_entry
+    get_full_path = USB_reader.get_full_path
+
+    def __init__(self, tree):
+        self.tree = tree
+        self.lister = dirlist.TreeFiller(tree, self.insert_entry, page_size=dirlist.PAGE_SIZE)
+
+
+def measure(func, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return {"median_ms": round(statistics.median(times) * 1000, 3),
+            "min_ms": round(min(times) * 1000, 3), "runs": repeat}
+
+
+def highlight_model(text):
+    tokens = tokenize(text)
+    lines = LineIndex(text)
+    return {tag: lines.flatten(tokens[tag]) for tag in MARKDOWN_TAGS}
+
+
+def note_cases(args, tmp):
+    data = workloads.make_note_data(int(args.note_mb * 1024 * 1024))
+    path = os.path.join(tmp, "big.mk")
+    mkformat.dump(data, path)
+
+    def first_screen():
+        for kind, _ in mkformat.iter_note(path):
+            if kind == "text":
+                return
+
+    yield "note.highlight_model", lambda: highlight_model(data["content"])
+    yield "note.save", lambda: mkformat.dump(data, path)
+    yield "note.load", lambda: mkformat.load(path)
+    yield "note.first_screen", first_screen
+
+
+def tree_cases(args, new_tree, pump):
+    wide = workloads.ensure_tree("wide", args.entries // 5)
+    deep = workloads.ensure_tree("deep", args.entries)
+
+    def wait(view, root):
+        while view.lister.busy(root):
+            pump(view.tree)
+            time.sleep(0.001)
+
+    def populate(view, path):
+        # from the call until the last row is in, the listing runs on a worker thread
+        dirlist.cache.forget(path)
+        root = view.tree.insert("", "end", text=path, values=(path,))
+        view.populate_tree(root, path)
+        wait(view, root)
+        # the first page and a "more" row
+        assert len(view.tree.get_children(root)) == min(len(os.listdir(path)), dirlist.PAGE_SIZE + 1)
+        view.tree.delete(root)
+
+    def reopen(view, root, path):
+        # an unchanged folder opened again: cached listing, nothing to diff
+        view.populate_tree(root, path)
+        wait(view, root)
+
+    files_view = FilesView(new_tree())
+    files_root = files_view.tree.insert("", "end", text=wide, values=(wide,))
+    files_view.populate_tree(files_root, wide)
+    wait(files_view, files_root)
+
+    def search():
+        # the worker side of USB_reader.search, on this thread
+        assert drive_search.Crawl(deep, drive_search.substring("report")).run_all()
+
+    yield "dirlist.scan_wide", lambda: dirlist.scan(wide)
+    yield "files.populate_wide", lambda: populate(FilesView(new_tree()), wide)
+    yield "files.reopen_wide", lambda: reopen(files_view, files_root, wide)
+    yield "usb.populate_wide", lambda: populate(USBView(new_tree()), wide)
+    yield "usb.search_deep", search
+    def folder_size_cold():
+        folder_size.cache.clear()
+        return folder_size.Sizing(deep).run()
+
+    yield "usb.folder_size_deep", folder_size_cold
+    yield "usb.folder_size_warm", lambda: folder_size.Sizing(deep).run()
+    yield "usb.disk_usage_deep", lambda: disk_usage.Usage(deep).run_all()
+
+
+def tk_cases(root, args, tmp):
+    from notebook import Notebook
+    root.deiconify()  # dlineinfo only answers for a mapped window
+    editor = Notebook(root, sample=False)
+    editor.pack(fill="both", expand=True)
+    path = os.path.join(tmp, "tk.mk")
+    mkformat.dump(workloads.make_note_data(int(args.note_mb * 1024 * 1024)), path)
+
+    def open_note():
+        editor.open_file(path)
+        while editor._load is not None:
+            root.update()
+
+    def gutter():
+        # a different scroll position each time so the layout check can't skip the work
+        gutter.top = (getattr(gutter, "top", 0) + 0.137) % 1
+        editor.text_widget.yview_moveto(gutter.top)
+        root.update_idletasks()
+        editor._gutter_layout = None
+        editor.update_line_numbers()
+
+    yield "tk.open_file", open_note
+    yield "tk.highlight_syntax", editor.highlight_syntax
+    yield "tk.update_line_numbers", gutter
+    yield "tk.save", lambda: mkformat.dump(editor.note_data(), path)
+
+
+def compare(results, baseline, tolerance):
+    slower = []
+    for name, result in results.items():
+        old = baseline.get(name)
+        if not old:
+            continue
+        ratio = result["median_ms"] / old["median_ms"] if old["median_ms"] else 1.0
+        mark = ""
+        if ratio > 1 + tolerance:
+            mark = "  REGRESSION"
+            slower.append(name)
+        print(f"  {name:<26}{old['median_ms']:>10.1f} -> {result['median_ms']:>10.1f} ms  x{ratio:.2f}{mark}")
+    return slower
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--quick", action="store_true", help="small workloads, for a smoke run")
+    parser.add_argument("--entries", type=int, default=100_000, help="entries in the deep tree")
+    parser.add_argument("--note-mb", type=float, default=4.0, help="size of the generated note")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--baseline", default=BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="make this run the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown, 0.25 = 25%%")
+    args = parser.parse_args(argv)
+    if args.quick:
+        args.entries, args.note_mb, args.repeat = 20_000, 1.0, 3
+
+    try:
+        import tkinter as tk
+        from tkinter import ttk
+        root = tk.Tk()
+        root.withdraw()
+    except Exception:
+        root = None
+    if root is None:
+        new_tree, pump = ModelTree, ModelTree.update
+    else:
+        pump = lambda tree: root.update()
+        new_tree = lambda: ttk.Treeview(root, columns=("fullpath",), displaycolumns=())
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        cases = list(note_cases(args, tmp)) + list(tree_cases(args, new_tree, pump))
+        if root is not None:
+            cases += list(tk_cases(root, args, tmp))
+        for name, func in cases:
+            results[name] = measure(func, args.repeat)
+            print(f"{name:<28}{results[name]['median_ms']:>10.1f} ms  (min {results[name]['min_ms']:.1f})")
+    if root is not None:
+        root.destroy()
+
+    run = {
+        "time": time.time(),
+        "mode": "headless" if root is None else "tk",
+        "python": platform.python_version(),
+        "machine": platform.platform(),
+        "entries": args.entries,
+        "note_mb": args.note_mb,
+        "results": results,
+    }
+    out = os.path.join(workloads.workload_dir(), f"results-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    with open(out, "w") as f:
+        json.dump(run, f, indent=1)
+    print(f"results in {out}")
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(run, f, indent=1)
+        print(f"saved as baseline {args.baseline}")
+        return 0
+    if not os.path.exists(args.baseline):
+        print("no baseline yet, run with --save-baseline to make one")
+        return 0
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if (baseline.get("entries"), baseline.get("note_mb")) != (args.entries, args.note_mb):
+        print("baseline was made with other workload sizes, not comparing")
+        return 0
+    print(f"against {args.baseline} ({baseline.get('machine')}):")
+    slower = compare(results, baseline["results"], args.tolerance)
+    if slower:
+        print(f"{len(slower)} slower than the baseline: {', '.join(slower)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
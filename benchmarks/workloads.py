@@ -0,0 +1,137 @@
+# generated inputs for benchmarks.suite: big markdown notes and synthetic directory trees.
+#
+# Everything is seeded, so the same parameters always give the same workload, and
+# generated trees are kept under the cache dir so reruns don't pay for them again.
+import os
+import random
+import shutil
+
+import note_search
+
+WORDS = ["alpha", "bravo", "charlie", "delta", "echo", "foxtrot", "golf", "hotel", "india",
+         "juliet", "kilo", "lima", "report", "draft", "photo", "backup", "invoice", "notes"]
+EXTENSIONS = [".txt", ".jpg", ".png", ".pdf", ".mk", ".mp3", ".docx", ".zip", ".log", ""]
+
+
+def workload_dir():
+    return os.path.join(note_search.cache_dir(), "bench")
+
+
+def _sentence(rng, words):
+    parts = []
+    for _ in range(words):
+        word = rng.choice(WORDS)
+        roll = rng.random()
+        if roll < 0.05:
+            word = f"**{word}**"
+        elif roll < 0.08:
+            word = f"*{word}*"
+        elif roll < 0.11:
+            word = f"`{word}`"
+        elif roll < 0.13:
+            word = f"[{word}](https://example.com/{word})"
+        elif roll < 0.14:
+            word = f"{word}@example.com"
+        elif roll < 0.16:
+            word = f"#{word}"
+        elif roll < 0.17:
+            word = f"~~{word}~~"
+        parts.append(word)
+    return " ".join(parts)
+
+
+def make_note_text(chars, seed=1):
+    """Markdown of roughly chars characters: headings, lists, quotes, fences, links, tags."""
+    rng = random.Random(seed)
+    lines = []
+    size = 0
+    while size < chars:
+        roll = rng.random()
+        if roll < 0.04:
+            block = [f"{'#' * rng.randint(1, 4)} {_sentence(rng, rng.randint(2, 6))}"]
+        elif roll < 0.08:
+            block = ["```"] + [f"    {_sentence(rng, rng.randint(3, 10))}" for _ in range(rng.randint(2, 15))] + ["```"]
+        elif roll < 0.25:
+            block = [f"- {_sentence(rng, rng.randint(4, 14))}" for _ in range(rng.randint(2, 6))]
+        elif roll < 0.30:
+            block = [f"> {_sentence(rng, rng.randint(6, 20))}"]
+        elif roll < 0.35:
+            block = [""]
+        else:
+            block = [_sentence(rng, rng.randint(8, 40))]
+        lines.extend(block)
+        size += sum(len(line) + 1 for line in block)
+    return "\n".join(lines) + "\n"
+
+
+def make_note_data(chars, seed=1):
+    """A note dict as mkformat.dump takes it, with a few thousand local style ranges."""
+    content = make_note_text(chars, seed)
+    rng = random.Random(seed)
+    line_count = content.count("\n")
+    ranges = []
+    for line in sorted(rng.sample(range(1, line_count), min(line_count - 1, 5000))):
+        ranges.append((f"{line}.0", f"{line}.4"))
+    return {
+        "global": {"font_size": 12, "global_text_color": "black", "global_bg_color": "white"},
+        "content": content,
+        "persistent_tags": [
+            {"tag": "custom_text_color_0", "ranges": ranges[::2], "config": {"foreground": "#ff0000"}},
+            {"tag": "sel_font_1", "ranges": ranges[1::2], "config": {"font": "Courier 16"}},
+        ],
+    }
+
+
+def _file_name(rng, i):
+    return f"{rng.choice(WORDS)}_{i}{rng.choice(EXTENSIONS)}"
+
+
+def _make_file(path, rng):
+    # sparse files, the size is what stat reports without writing the bytes
+    with open(path, "wb") as f:
+        f.truncate(rng.choice((0, 120, 4096, 70_000, 2_500_000)))
+
+
+def make_wide_tree(root, entries, seed=2):
+    """One folder holding entries children, a tenth of them folders."""
+    rng = random.Random(seed)
+    os.makedirs(root)
+    for i in range(entries):
+        path = os.path.join(root, _file_name(rng, i))
+        if i % 10 == 0:
+            os.mkdir(path)
+        else:
+            _make_file(path, rng)
+
+
+def make_deep_tree(root, entries, seed=3, files_per_dir=20, subdirs=4, max_depth=12):
+    """About entries files and folders, breadth first, fanning out subdirs per level."""
+    rng = random.Random(seed)
+    os.makedirs(root)
+    queue = [(root, 0)]
+    made = 0
+    while queue and made < entries:
+        folder, depth = queue.pop(0)
+        for _ in range(files_per_dir):
+            _make_file(os.path.join(folder, _file_name(rng, made)), rng)
+            made += 1
+        if depth < max_depth:
+            for _ in range(subdirs):
+                sub = os.path.join(folder, f"{rng.choice(WORDS)}_dir{made}")
+                os.mkdir(sub)
+                queue.append((sub, depth + 1))
+                made += 1
+    return made
+
+
+def ensure_tree(kind, entries):
+    """Path to a generated "wide" or "deep" tree, built on first use."""
+    root = os.path.join(workload_dir(), f"{kind}-{entries}")
+    done = os.path.join(workload_dir(), f"{kind}-{entries}.done")
+    if os.path.exists(done):
+        return root
+    if os.path.exists(root):
+        shutil.rmtree(root)  # a generation that didn't finish
+    (make_wide_tree if kind == "wide" else make_deep_tree)(root, entries)
+    open(done, "w").close()
+    return root
@@ -0,0 +1,419 @@
+# directory listings for the two tree explorers (notebook.Files and USB_reader).
+#
+# scan() lists a folder with os.scandir, which gets "is this a folder" from the
+# directory entry itself on most filesystems instead of one stat per entry.
+# TreeFiller runs scan() on a worker thread and feeds the sorted result into a
+# Treeview a batch per Tk tick, so a folder with 50k entries doesn't freeze the window.
+#
+# Past page_size rows a folder shows a "more" row instead of the rest; selecting it
+# brings in the next page. The whole listing stays in a Listing (names plus a couple of
+# arrays, no Tk items), which is also what sorting and filtering work on.
+#
+# Listings are cached per folder and reused while the folder's mtime is unchanged.
+# refresh() brings a node in line with the folder by inserting, moving and deleting
+# just the rows that changed, so expanded subfolders and the selection survive. With
+# watch=True the filler also refreshes folders that change on disk (see dirwatch).
+import os
+import queue
+import threading
+import time
+from array import array
+from collections import OrderedDict
+
+import dirwatch
+import mkformat
+import perf
+
+SLICE_MS = 15  # Tk time spent inserting rows per tick
+POLL_MS = 10
+WATCH_POLL_MS = 250
+PAGE_SIZE = 1000
+# an mtime this close to the scan could hide a change made in the same tick
+# (FAT keeps mtimes to 2 seconds), so such a listing isn't trusted
+RACY_SECONDS = 2.0
+
+
+class Listing:
+    """One folder's entries. order holds the visible ones (filtered, sorted) as indices."""
+
+    def __init__(self, folder, names, dirs):
+        self.folder = folder
+        self.names = names      # list of str
+        self.dirs = dirs        # bytearray, 1 for folders
+        self.order = array("I", range(len(names)))
+        self.reverse = False
+        self.pattern = ""
+
+    def __len__(self):
+        return len(self.order)
+
+    def view(self):
+        """A Listing over the same entries with its own order, sort and filter."""
+        return Listing(self.folder, self.names, self.dirs)
+
+    def entry(self, pos):
+        """(name, path, is_dir) of the pos-th visible entry."""
+        i = self.order[pos]
+        name = self.names[i]
+        return name, os.path.join(self.folder, name), bool(self.dirs[i])
+
+    def sort(self, reverse=False):
+        self.reverse = reverse
+        self._reorder()
+
+    def filter(self, text):
+        """Only show names containing text (case-insensitive), "" shows everything."""
+        self.pattern = text.casefold()
+        self._reorder()
+
+    def _reorder(self):
+        names, dirs, pattern = self.names, self.dirs, self.pattern
+        picked = [i for i in range(len(names)) if pattern in names[i].casefold()] if pattern else range(len(names))
+        # folders first either way, the direction only flips the names
+        picked = sorted(picked, key=lambda i: names[i].casefold(), reverse=self.reverse)
+        picked.sort(key=lambda i: not dirs[i])
+        self.order = array("I", picked)
+
+
+def scan(path):
+    """The folder as a Listing, folders first then by name. Raises OSError."""
+    entries = []
+    with os.scandir(path) as it:
+        for entry in it:
+            if mkformat.is_temp(entry.name):
+                continue  # a note being saved, here and gone within the autosave tick
+            try:
+                is_dir = entry.is_dir()  # follows symlinks like os.path.isdir did
+            except OSError:
+                is_dir = False
+            entries.append((not is_dir, entry.name.casefold(), entry.name))
+    entries.sort()
+    return Listing(path, [name for _, _, name in entries], bytearray(not f for f, _, _ in entries))
+
+
+class ListingCache:
+    """Folder listings by path, good while the folder's mtime stays the same. Thread safe."""
+
+    def __init__(self, max_folders=512):
+        self.max_folders = max_folders
+        self.entries = OrderedDict()  # path -> (mtime_ns, scanned_at, Listing), least recent first
+        self.lock = threading.Lock()
+        self.hits = self.misses = 0
+
+    def get(self, path):
+        """A fresh Listing view of path, scanning only if the folder changed. Raises OSError."""
+        mtime = os.stat(path).st_mtime_ns
+        with self.lock:
+            cached = self.entries.get(path)
+            if cached is not None and cached[0] == mtime and cached[1] - mtime / 1e9 > RACY_SECONDS:
+                self.entries.move_to_end(path)
+                self.hits += 1
+                return cached[2].view()
+            self.misses += 1
+        scanned_at = time.time()
+        listing = scan(path)
+        with self.lock:
+            self.entries[path] = (mtime, scanned_at, listing)
+            self.entries.move_to_end(path)
+            while len(self.entries) > self.max_folders:
+                self.entries.popitem(last=False)
+        return listing.view()
+
+    def forget(self, path):
+        with self.lock:
+            self.entries.pop(path, None)
+
+
+cache = ListingCache()
+
+
+class _Job:
+    __slots__ = ("parent", "path", "done", "listing", "pos", "limit", "cleared", "started", "diff")
+
+    def __init__(self, parent, path, done, limit, diff=False):
+        self.parent = parent
+        self.path = path
+        self.done = done
+        self.listing = None     # set once the worker has listed the folder
+        self.pos = 0            # rows inserted so far
+        self.limit = limit      # stop there and add a "more" row
+        self.cleared = False    # the old children are gone
+        self.started = time.perf_counter()
+        self.diff = diff        # update the rows shown instead of putting them all back
+
+
+class TreeFiller:
+    """Fills Treeview nodes from folder listings without blocking the UI.
+
+    insert_row(parent, entry) adds one row for an entry from Listing.entry. The
+    old children of a node stay until the listing is in, so it doesn't collapse
+    while a slow drive is read. on_error(path, error) is called for folders
+    that can't be listed. page_size=None puts every row in. refresh() also
+    calls insert_row(parent, entry, index) and needs the new row back.
+    on_change(path) hears about every folder the watcher saw change.
+    """
+
+    def __init__(self, tree, insert_row, on_error=None, perf_name=None, page_size=None, watch=False,
+                 on_change=None):
+        self.tree = tree
+        self.insert_row = insert_row
+        self.on_error = on_error
+        self.on_change = on_change
+        self.perf_name = perf_name
+        self.page_size = page_size
+        self.reverse = False
+        self.jobs = {}       # parent node -> _Job, a newer fill for the same node replaces the old one
+        self.pages = {}      # parent node -> its finished _Job, kept for "more", sort and filter
+        self.more_rows = {}  # "more" row -> parent node
+        self.again = set()   # nodes to refresh once their fill is done
+        self.results = queue.Queue()
+        self._tick_job = None
+        tree.tag_configure("more", foreground="gray")
+        tree.bind("<<TreeviewSelect>>", self._on_select, add="+")
+        self.watched = {}    # folder -> nodes showing it
+        self.changes = queue.Queue()
+        self.watcher = dirwatch.watcher(self.changes.put) if watch else None
+        if self.watcher is not None:
+            tree.after(WATCH_POLL_MS, self._watch_tick)
+
+    def fill(self, parent, path, done=None):
+        """(Re)list path under parent. done() runs once the (first page of) rows is in."""
+        job = _Job(parent, path, done, self.page_size)
+        self.jobs[parent] = job
+        self._prune()
+        threading.Thread(target=self._list, args=(job,), daemon=True).start()
+        self._schedule()
+
+    def refresh(self, parent, path, done=None):
+        """Update parent's rows to match the folder now, touching only the rows that changed."""
+        if parent not in self.pages:
+            if parent not in self.jobs:
+                self.fill(parent, path, done)
+            return
+        if parent in self.jobs:
+            self.again.add(parent)
+            return
+        job = _Job(parent, path, done, self.page_size, diff=True)
+        self.jobs[parent] = job
+        threading.Thread(target=self._list, args=(job,), daemon=True).start()
+        self._schedule()
+
+    def busy(self, parent):
+        return parent in self.jobs
+
+    def cancel(self, parent=None):
+        if parent is None:
+            self.jobs.clear()
+        else:
+            self.jobs.pop(parent, None)
+
+    def forget(self, parent):
+        """Drop parent's rows and listings, e.g. after its folder was renamed and the
+        rows below point at the old path. It's listed afresh when opened again."""
+        self.jobs.pop(parent, None)
+        self.pages.pop(parent, None)
+        self.again.discard(parent)
+        children = self.tree.get_children(parent)
+        if children:
+            self.tree.delete(*children)
+            self.tree.insert(parent, "end")  # still a folder that can be opened
+            self.tree.item(parent, open=False)
+        self._prune()
+
+    def listing(self, parent):
+        job = self.pages.get(parent)
+        return job.listing if job is not None else None
+
+    def load_more(self, parent):
+        job = self.pages.get(parent)
+        if job is None or parent in self.jobs or not self.tree.exists(parent):
+            return
+        self._drop_more_row(parent)
+        job.limit = job.pos + self.page_size
+        job.started = time.perf_counter()
+        self.jobs[parent] = job
+        self._schedule()
+
+    def sort(self, reverse):
+        """Re-sort every listing shown and put its first page back in."""
+        self.reverse = reverse
+        for parent, job in list(self.pages.items()):
+            job.listing.sort(reverse)
+            self._redo(parent, job)
+
+    def filter(self, parent, text):
+        job = self.pages.get(parent)
+        if job is None:
+            return
+        job.listing.filter(text)
+        self._redo(parent, job)
+
+    def _redo(self, parent, job):
+        if parent in self.jobs or not self.tree.exists(parent):
+            return
+        self._drop_more_row(parent)
+        job.pos, job.limit, job.cleared = 0, self.page_size, False
+        job.started = time.perf_counter()
+        self.jobs[parent] = job
+        self._schedule()
+
+    def _drop_more_row(self, parent):
+        for row, owner in list(self.more_rows.items()):
+            if owner == parent:
+                del self.more_rows[row]
+                if self.tree.exists(row):
+                    self.tree.delete(row)
+
+    def _prune(self):
+        # listings of nodes that are gone, e.g. a refilled folder's old subfolders
+        exists = self.tree.exists
+        self.pages = {parent: job for parent, job in self.pages.items() if exists(parent)}
+        self.more_rows = {row: parent for row, parent in self.more_rows.items() if exists(row)}
+        for path, parents in list(self.watched.items()):
+            parents.intersection_update(self.pages)
+            if not parents:
+                del self.watched[path]
+                self.watcher.remove(path)
+
+    def _on_select(self, event=None):
+        for row in self.tree.selection():
+            parent = self.more_rows.get(row)
+            if parent is not None:
+                self.load_more(parent)
+
+    def _list(self, job):
+        # worker thread, never touches Tk
+        try:
+            listing = cache.get(job.path)
+            if self.reverse:
+                listing.sort(True)
+            self.results.put((job, listing))
+        except OSError as e:
+            self.results.put((job, e))
+
+    def _schedule(self):
+        if self._tick_job is None:
+            self._tick_job = self.tree.after(POLL_MS, self._tick)
+
+    def _tick(self):
+        self._tick_job = None
+        while True:
+            try:
+                job, result = self.results.get_nowait()
+            except queue.Empty:
+                break
+            if self.jobs.get(job.parent) is not job:
+                continue  # replaced or cancelled meanwhile
+            if isinstance(result, OSError):
+                del self.jobs[job.parent]
+                # a shown folder that's gone goes away with its row when the parent refreshes
+                if self.on_error and not job.diff:
+                    self.on_error(job.path, result)
+                continue
+            job.listing = result
+            if job.diff:
+                self._apply_diff(job)
+        deadline = time.monotonic() + SLICE_MS / 1000
+        for job in list(self.jobs.values()):
+            if job.listing is None:
+                continue
+            if not self.tree.exists(job.parent):
+                del self.jobs[job.parent]
+                continue
+            if not job.cleared:
+                self.tree.delete(*self.tree.get_children(job.parent))
+                job.cleared = True
+            listing = job.listing
+            stop = len(listing) if job.limit is None else min(job.limit, len(listing))
+            while job.pos < stop and time.monotonic() < deadline:
+                # check the clock every few rows, not on every one
+                for pos in range(job.pos, min(stop, job.pos + 64)):
+                    self.insert_row(job.parent, listing.entry(pos))
+                job.pos = min(stop, job.pos + 64)
+            if job.pos >= stop:
+                self._finish(job, len(listing) - job.pos)
+            if time.monotonic() >= deadline:
+                break
+        if self.jobs:
+            self._tick_job = self.tree.after(1 if self._has_rows() else POLL_MS, self._tick)
+
+    def _apply_diff(self, job):
+        parent, tree = job.parent, self.tree
+        if not tree.exists(parent):
+            del self.jobs[parent]
+            return
+        old = self.pages.get(parent)
+        listing = job.listing
+        if old is not None:
+            # keep the filter and sort the user picked
+            listing.pattern, listing.reverse = old.listing.pattern, old.listing.reverse
+            listing._reorder()
+        shown = len(listing) if self.page_size is None else \
+            min(len(listing), max(old.pos if old else 0, self.page_size))
+        self._drop_more_row(parent)
+        # a row is only kept for an entry of the same name and kind, a file that
+        # became a folder (or the other way) needs insert_row's expand placeholder
+        # put in or left out. A row renamed in place (see forget) isn't in the old
+        # listing, its children tell whether it's a folder.
+        was_dir = dict(zip(old.listing.names, map(bool, old.listing.dirs))) if old is not None else {}
+        current = {}
+        for row in tree.get_children(parent):
+            name = tree.item(row, "text")
+            is_dir = was_dir.get(name)
+            current[name, bool(tree.get_children(row)) if is_dir is None else is_dir] = row
+        wanted = []
+        for pos in range(shown):
+            entry = listing.entry(pos)
+            wanted.append((current.pop((entry[0], entry[2]), None), entry))
+        if current:
+            tree.delete(*current.values())
+        children = list(tree.get_children(parent))
+        for index, (row, entry) in enumerate(wanted):
+            if row is None:
+                children.insert(index, self.insert_row(parent, entry, index))
+            elif index >= len(children) or children[index] != row:
+                tree.move(row, parent, index)
+                children.remove(row)
+                children.insert(index, row)
+        job.pos = shown
+        job.cleared = True
+        self._finish(job, len(listing) - shown)
+
+    def _finish(self, job, left):
+        del self.jobs[job.parent]
+        self.pages[job.parent] = job
+        if left:
+            row = self.tree.insert(job.parent, "end", text=f"... {left:,} more", values=("",), tags=("more",))
+            self.more_rows[row] = job.parent
+        if self.watcher is not None:
+            parents = self.watched.setdefault(job.path, set())
+            if not parents:
+                self.watcher.add(job.path)
+            parents.add(job.parent)
+        if self.perf_name:
+            perf.record(self.perf_name, time.perf_counter() - job.started)
+        if job.done:
+            job.done()
+            job.done = None
+        if job.parent in self.again:
+            self.again.discard(job.parent)
+            self.refresh(job.parent, job.path)
+
+    def _watch_tick(self):
+        changed = set()
+        while True:
+            try:
+                changed.add(self.changes.get_nowait())
+            except queue.Empty:
+                break
+        if changed:
+            self._prune()
+        for path in changed:
+            if self.on_change is not None:
+                self.on_change(path)
+            for parent in list(self.watched.get(path, ())):
+                self.refresh(parent, path)
+        self.tree.after(WATCH_POLL_MS, self._watch_tick)
+
+    def _has_rows(self):
+        return any(job.listing is not None for job in self.jobs.values())
@@ -0,0 +1,148 @@
+# tells the explorers when a folder they show changes on disk.
+#
+# On Linux this is inotify (through ctypes, no extra packages); anywhere else, or if
+# inotify can't be set up (out of watches, odd filesystem), folders are polled for a
+# new mtime every couple of seconds. Either way changed(path) is called on the
+# watcher's own thread with the folder that changed.
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import threading
+
+POLL_INTERVAL = 2.0
+
+# inotify(7)
+IN_MOVED_FROM = 0x040
+IN_MOVED_TO = 0x080
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+IN_DELETE_SELF = 0x400
+IN_MOVE_SELF = 0x800
+IN_IGNORED = 0x8000
+IN_ONLYDIR = 0x1000000
+WATCH_MASK = IN_CREATE | IN_DELETE | IN_MOVED_FROM | IN_MOVED_TO | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR
+_EVENT = struct.Struct("iIII")
+
+
+class PollingWatcher:
+    def __init__(self, changed, interval=POLL_INTERVAL):
+        self.changed = changed
+        self.interval = interval
+        self.paths = {}  # path -> mtime_ns last seen
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def add(self, path):
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            return
+        with self.lock:
+            self.paths.setdefault(path, mtime)
+
+    def remove(self, path):
+        with self.lock:
+            self.paths.pop(path, None)
+
+    def close(self):
+        self.stopped.set()
+
+    def _run(self):
+        while not self.stopped.wait(self.interval):
+            with self.lock:
+                paths = list(self.paths.items())
+            for path, seen in paths:
+                try:
+                    mtime = os.stat(path).st_mtime_ns
+                except OSError:
+                    mtime = None
+                if mtime != seen:
+                    with self.lock:
+                        if path in self.paths:
+                            self.paths[path] = mtime
+                    self.changed(path)
+
+
+class InotifyWatcher:
+    def __init__(self, changed):
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self._add_watch = libc.inotify_add_watch
+        self._add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self._rm_watch = libc.inotify_rm_watch
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.changed = changed
+        self.paths = {}    # path -> watch descriptor
+        self.watches = {}  # watch descriptor -> path
+        self.fallback = None  # polls the folders inotify refused, e.g. past max_user_watches
+        self.lock = threading.Lock()
+        self.stopped = False
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def add(self, path):
+        with self.lock:
+            if path in self.paths:
+                return
+            wd = self._add_watch(self.fd, os.fsencode(path), WATCH_MASK)
+            if wd >= 0:
+                self.paths[path] = wd
+                self.watches[wd] = path
+                return
+            if self.fallback is None:
+                self.fallback = PollingWatcher(self.changed)
+        self.fallback.add(path)
+
+    def remove(self, path):
+        with self.lock:
+            wd = self.paths.pop(path, None)
+            if wd is not None:
+                self.watches.pop(wd, None)
+                self._rm_watch(self.fd, wd)
+        if self.fallback is not None:
+            self.fallback.remove(path)
+
+    def close(self):
+        self.stopped = True
+        if self.fallback is not None:
+            self.fallback.close()
+
+    def _run(self):
+        while not self.stopped:
+            ready, _, _ = select.select([self.fd], [], [], 0.5)
+            if not ready:
+                continue
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                continue
+            # one call per folder, however many events a burst of changes made
+            changed = []
+            pos = 0
+            while pos < len(data):
+                wd, mask, _, name_len = _EVENT.unpack_from(data, pos)
+                pos += _EVENT.size + name_len
+                with self.lock:
+                    path = self.watches.get(wd)
+                    if mask & IN_IGNORED and path is not None:
+                        del self.watches[wd]
+                        self.paths.pop(path, None)
+                if path is not None and path not in changed:
+                    changed.append(path)
+            for path in changed:
+                self.changed(path)
+        os.close(self.fd)
+
+
+def watcher(changed):
+    """The best watcher this platform has, calling changed(path) from its thread."""
+    if sys.platform.startswith("linux"):
+        try:
+            return InotifyWatcher(changed)
+        except (OSError, AttributeError):
+            pass
+    return PollingWatcher(changed)
@@ -0,0 +1,149 @@
+# what's taking the space on a drive, for USB_reader's disk usage panel.
+#
+# A Usage makes one scandir pass over a folder on a worker thread and keeps only
+# summaries: the largest files and folders in fixed-size heaps, bytes per
+# extension and bytes per depth. Folders are totalled as the walk leaves them and
+# each folder is read entry by entry, so what it holds is the folders on the
+# current path and the paths of their subfolders not visited yet. That grows
+# with how wide and deep the folders are, not with how many files the drive has.
+# snapshot() gives the Tk side a copy to show while the walk goes on.
+import heapq
+import os
+import threading
+import time
+
+TOP = 50
+MAX_EXTENSIONS = 1000  # past this many different ones, new extensions go under OTHER
+NO_EXTENSION = "(none)"
+OTHER = "(other)"
+
+
+def extension(name):
+    ext = os.path.splitext(name)[1].lower()
+    return ext if 1 < len(ext) <= 12 else NO_EXTENSION
+
+
+class Usage:
+    """Disk usage under root, largest first, kept to top entries per list."""
+
+    def __init__(self, root, top=TOP):
+        self.root = root
+        self.top = top
+        self.size = 0
+        self.files = 0
+        self.folders = 0
+        self.errors = 0
+        self.current = root
+        self.cancelled = threading.Event()
+        self.done = threading.Event()
+        self.started = time.perf_counter()
+        self.elapsed = None
+        self._lock = threading.Lock()
+        self._files = []    # min-heaps of (size, path), the smallest kept one on top
+        self._folders = []
+        self._extensions = {}  # ext -> [bytes, files]
+        self._depths = []      # [bytes, files] of the files at each depth, root's own at 0
+
+    def start(self):
+        threading.Thread(target=self.run, daemon=True).start()
+        return self
+
+    def cancel(self):
+        self.cancelled.set()
+
+    def _keep(self, heap, size, path):
+        if len(heap) < self.top:
+            heapq.heappush(heap, (size, path))
+        elif size > heap[0][0]:
+            heapq.heapreplace(heap, (size, path))
+
+    def _list(self, folder, depth):
+        """Adds up the files directly in folder, returns (their bytes, subfolder paths)."""
+        self.current = folder
+        own = files = 0
+        subdirs = []
+        try:
+            it = os.scandir(folder)
+        except OSError:
+            self.errors += 1
+            return 0, subdirs
+        with it:
+            while True:
+                try:
+                    entry = next(it, None)
+                except OSError:
+                    self.errors += 1  # the listing broke off, keep what was read
+                    break
+                if entry is None:
+                    break
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirs.append(entry.path)
+                        continue
+                    if not entry.is_file(follow_symlinks=False):
+                        continue
+                    size = entry.stat(follow_symlinks=False).st_size
+                except OSError:
+                    continue
+                own += size
+                files += 1
+                ext = extension(entry.name)
+                # only while adding it in, so snapshot() never waits on the drive
+                with self._lock:
+                    self.size += size
+                    self.files += 1
+                    self._keep(self._files, size, entry.path)
+                    totals = self._extensions.get(ext)
+                    if totals is None:
+                        if len(self._extensions) >= MAX_EXTENSIONS:
+                            ext = OTHER
+                        totals = self._extensions.setdefault(ext, [0, 0])
+                    totals[0] += size
+                    totals[1] += 1
+        with self._lock:
+            if files:
+                while len(self._depths) <= depth:
+                    self._depths.append([0, 0])
+                self._depths[depth][0] += own
+                self._depths[depth][1] += files
+            self.folders += 1
+        return own, subdirs
+
+    def run(self):
+        try:
+            # [path, bytes so far, subfolders still to visit] for each folder on the way down
+            own, subdirs = self._list(self.root, 0)
+            stack = [[self.root, own, subdirs]]
+            while stack and not self.cancelled.is_set():
+                frame = stack[-1]
+                if frame[2]:
+                    path = frame[2].pop()
+                    own, subdirs = self._list(path, len(stack))
+                    stack.append([path, own, subdirs])
+                    continue
+                stack.pop()
+                if stack:
+                    stack[-1][1] += frame[1]
+                    with self._lock:
+                        self._keep(self._folders, frame[1], frame[0])
+        finally:
+            self.elapsed = time.perf_counter() - self.started
+            self.done.set()
+
+    def run_all(self):
+        """Run on the calling thread and return the final snapshot, for scripts and benchmarks."""
+        self.run()
+        return self.snapshot()
+
+    def snapshot(self):
+        """dict of files and folders as (bytes, path), extensions as (bytes, files, ext) and
+        depths as (bytes, files) per level, the first three largest first. Folders only show
+        up once the walk has finished them."""
+        with self._lock:
+            return {
+                "files": sorted(self._files, reverse=True),
+                "folders": sorted(self._folders, reverse=True),
+                "extensions": sorted(((size, files, ext) for ext, (size, files) in self._extensions.items()),
+                                     reverse=True)[:self.top],
+                "depths": [tuple(level) for level in self._depths],
+            }
@@ -0,0 +1,558 @@
+# headless note model: text buffer, local style spans and a token cache.
+# No tkinter in here, the Notebook widget mirrors it (see Notebook._text_proxy).
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+
+from find_replace import OffsetMap, replace_text
+from highlighter import HEADING_LINE_RE, INLINE_TAGS, find_fences, tokenize
+
+LEAF_MAX = 2048     # chars per leaf before it splits
+BRANCH_MAX = 32     # children per node before it splits
+EDIT_COST = 4096    # about what one rope edit costs, in chars of rope rebuilt
+
+
+class _Node:
+    __slots__ = ("text", "children", "length", "newlines")
+
+    def __init__(self, text=None, children=None):
+        self.text = text
+        self.children = children
+        self.update()
+
+    def update(self):
+        if self.children is None:
+            self.length = len(self.text)
+            self.newlines = self.text.count("\n")
+        else:
+            self.length = sum(child.length for child in self.children)
+            self.newlines = sum(child.newlines for child in self.children)
+
+
+def _leaves(text):
+    size = LEAF_MAX // 2
+    return [_Node(text[i:i + size]) for i in range(0, len(text), size)] or [_Node("")]
+
+
+def _group(nodes):
+    # split an overfull child list into siblings of the same depth
+    if len(nodes) <= BRANCH_MAX:
+        return None
+    size = BRANCH_MAX // 2
+    return [_Node(children=nodes[i:i + size]) for i in range(0, len(nodes), size)]
+
+
+class Rope:
+    """B-tree of text leaves; every node knows its length and newline count.
+
+    Inserts, deletes and line/offset lookups only walk one root-to-leaf path, so they
+    cost O(log n) plus the size of a leaf.
+    """
+
+    def __init__(self, text=""):
+        self.root = _Node(children=_leaves(text))
+        self._regroup_root()
+
+    def __len__(self):
+        return self.root.length
+
+    def line_count(self):
+        return self.root.newlines + 1
+
+    def _regroup_root(self):
+        while True:
+            groups = _group(self.root.children)
+            if groups is None:
+                return
+            self.root = _Node(children=groups)
+
+    def insert(self, offset, text):
+        if not text:
+            return
+        offset = max(0, min(offset, len(self)))
+        self._insert(self.root, offset, text)
+        self._regroup_root()
+
+    def _insert(self, node, offset, text):
+        children = node.children
+        for i, child in enumerate(children):
+            if offset <= child.length or i == len(children) - 1:
+                break
+            offset -= child.length
+        if child.children is None:
+            joined = child.text[:offset] + text + child.text[offset:]
+            if len(joined) <= LEAF_MAX:
+                child.text = joined
+                child.update()
+            else:
+                children[i:i + 1] = _leaves(joined)
+        else:
+            self._insert(child, offset, text)
+            groups = _group(child.children)
+            if groups is not None:
+                children[i:i + 1] = groups
+        node.update()
+
+    def delete(self, start, end):
+        start = max(0, start)
+        end = min(end, len(self))
+        if start >= end:
+            return
+        self._delete(self.root, start, end)
+        # drop levels that are down to one child
+        while len(self.root.children) == 1 and self.root.children[0].children is not None:
+            self.root = self.root.children[0]
+        if not self.root.children:
+            self.root.children = [_Node("")]
+            self.root.update()
+
+    def _delete(self, node, start, end):
+        kept = []
+        pos = 0
+        for child in node.children:
+            child_start, child_end = pos, pos + child.length
+            pos = child_end
+            if child_end <= start or child_start >= end:
+                kept.append(child)
+                continue
+            lo, hi = max(start, child_start) - child_start, min(end, child_end) - child_start
+            if child.children is None:
+                child.text = child.text[:lo] + child.text[hi:]
+            else:
+                self._delete(child, lo, hi)
+            child.update()
+            if child.length:
+                kept.append(child)
+        node.children = _merge_small_leaves(kept)
+        node.update()
+
+    def text(self, start=0, end=None):
+        end = len(self) if end is None else min(end, len(self))
+        parts = []
+        self._collect(self.root, max(0, start), end, parts)
+        return "".join(parts)
+
+    def _collect(self, node, start, end, parts):
+        pos = 0
+        for child in node.children:
+            child_start, child_end = pos, pos + child.length
+            pos = child_end
+            if child_end <= start:
+                continue
+            if child_start >= end:
+                break
+            lo, hi = max(start, child_start) - child_start, min(end, child_end) - child_start
+            if child.children is None:
+                parts.append(child.text[lo:hi])
+            else:
+                self._collect(child, lo, hi, parts)
+
+    def line_start(self, line):
+        """Offset of the first char of line (0-based), clamped to the last line."""
+        line = min(line, self.root.newlines)
+        if line <= 0:
+            return 0
+        node, offset = self.root, 0
+        while node.children is not None:
+            for child in node.children:
+                if line <= child.newlines:
+                    node = child
+                    break
+                line -= child.newlines
+                offset += child.length
+        pos = -1
+        for _ in range(line):
+            pos = node.text.find("\n", pos + 1)
+        return offset + pos + 1
+
+    def line_of(self, offset):
+        """0-based line holding offset."""
+        offset = max(0, min(offset, len(self)))
+        node, line = self.root, 0
+        while node.children is not None:
+            for child in node.children:
+                if offset < child.length:
+                    node = child
+                    break
+                offset -= child.length
+                line += child.newlines
+            else:
+                return line
+        return line + node.text.count("\n", 0, offset)
+
+
+def _merge_small_leaves(children):
+    merged = []
+    for child in children:
+        last = merged[-1] if merged else None
+        if (last is not None and last.children is None and child.children is None
+                and last.length + child.length <= LEAF_MAX // 2):
+            last.text += child.text
+            last.update()
+        else:
+            merged.append(child)
+    return merged
+
+
+class StyleSpans:
+    """Local formatting as char ranges, {(kind, value): [[start, end], ...]} kept sorted.
+
+    Follows the same rules as the editor's style tags: one style of each kind per
+    char, and text typed inside a span joins it.
+    """
+
+    def __init__(self):
+        self.spans = {}
+
+    def add(self, key, start, end):
+        if start >= end:
+            return
+        for other in list(self.spans):
+            if other[0] == key[0]:
+                self.remove(other, start, end)
+        merged = [start, end]
+        kept = []
+        for span in self.spans.get(key, []):
+            if span[1] < merged[0] or span[0] > merged[1]:
+                kept.append(span)
+            else:
+                merged = [min(span[0], merged[0]), max(span[1], merged[1])]
+        kept.append(merged)
+        kept.sort()
+        self.spans[key] = kept
+
+    def remove(self, key, start, end):
+        kept = []
+        for s, e in self.spans.get(key, []):
+            if s < start:
+                kept.append([s, min(e, start)])
+            if e > end:
+                kept.append([max(s, end), e])
+        if kept:
+            self.spans[key] = kept
+        else:
+            self.spans.pop(key, None)
+
+    def insert(self, offset, length):
+        for spans in self.spans.values():
+            for span in spans:
+                if span[0] >= offset:
+                    span[0] += length
+                    span[1] += length
+                elif span[1] > offset:
+                    span[1] += length
+
+    def remap(self, offsets):
+        """Move every span through an OffsetMap, dropping the ones that vanish."""
+        for key in list(self.spans):
+            spans = self.spans[key]
+            starts = [s for s, _ in spans]
+
+            def styled(offset):
+                i = bisect_right(starts, offset) - 1
+                return i >= 0 and spans[i][1] > offset
+
+            kept = []
+            for s, e in spans:
+                s, e = offsets.range(s, e, styled)
+                if kept and s <= kept[-1][1]:
+                    kept[-1][1] = max(kept[-1][1], e)
+                elif s < e:
+                    kept.append([s, e])
+            if kept:
+                self.spans[key] = kept
+            else:
+                del self.spans[key]
+
+    def delete(self, start, end):
+        removed = end - start
+        for key in list(self.spans):
+            kept = []
+            for s, e in self.spans[key]:
+                s = s if s <= start else max(start, s - removed)
+                e = e if e <= start else max(start, e - removed)
+                if s < e:
+                    kept.append([s, e])
+            if kept:
+                self.spans[key] = kept
+            else:
+                del self.spans[key]
+
+
+class TokenCache:
+    """Inline tokens per line text, least recently used lines dropped past max_lines."""
+
+    def __init__(self, max_lines=20000):
+        self.max_lines = max_lines
+        self.hits = 0
+        self.misses = 0
+        self._lines = OrderedDict()
+
+    def __len__(self):
+        return len(self._lines)
+
+    def line(self, text):
+        tokens = self._lines.get(text)
+        if tokens is not None:
+            self._lines.move_to_end(text)
+            self.hits += 1
+            return tokens
+        self.misses += 1
+        found = tokenize(text)
+        tokens = [(tag, start, end) for tag in INLINE_TAGS for start, end in found[tag]]
+        self._lines[text] = tokens
+        if len(self._lines) > self.max_lines:
+            self._lines.popitem(last=False)
+        return tokens
+
+
+class HeadingIndex:
+    """Heading lines of the note in order: lines[i] (1-based), levels[i], titles[i], ids[i].
+
+    Edits only rescan the lines they touched, the headings below just move.
+    version changes when a heading appears, goes or gets retitled, not when it
+    only moves, and ids stay put as long as the number of headings does.
+    """
+
+    def __init__(self, text=""):
+        self.lines = []
+        self.levels = []
+        self.titles = []
+        self.ids = []
+        self.version = 0
+        self._next_id = 0
+        self._positions = None
+        self.replace_lines(1, 0, text)
+
+    def __len__(self):
+        return len(self.lines)
+
+    def _scan(self, text, first):
+        found = []
+        line, pos = first, 0
+        for match in HEADING_LINE_RE.finditer(text):
+            line += text.count("\n", pos, match.start())
+            pos = match.start()
+            found.append((line, len(match.group(1)), match.group(2).strip()))
+        return found
+
+    def replace_lines(self, first, last, text):
+        """Lines first..last now hold text (any number of lines, last < first for a pure insert)."""
+        lo = bisect_left(self.lines, first)
+        hi = bisect_right(self.lines, last)
+        found = self._scan(text, first)
+        delta = text.count("\n") - (last - first)
+        if delta:
+            lines = self.lines
+            for i in range(hi, len(lines)):
+                lines[i] += delta
+        if [(level, title) for _, level, title in found] != list(zip(self.levels[lo:hi], self.titles[lo:hi])):
+            self.version += 1
+        if len(found) == hi - lo:
+            ids = self.ids[lo:hi]
+        else:
+            ids = list(range(self._next_id, self._next_id + len(found)))
+            self._next_id += len(found)
+            self._positions = None
+        self.lines[lo:hi] = [line for line, _, _ in found]
+        self.levels[lo:hi] = [level for _, level, _ in found]
+        self.titles[lo:hi] = [title for _, _, title in found]
+        self.ids[lo:hi] = ids
+
+    def position(self, heading_id):
+        """Where the heading with this id sits in the lists, None if it's gone."""
+        if self._positions is None:
+            self._positions = {heading_id: i for i, heading_id in enumerate(self.ids)}
+        return self._positions.get(heading_id)
+
+    def section_end(self, i):
+        """Last line of heading i's section, None if it runs to the end of the note."""
+        level = self.levels[i]
+        for j in range(i + 1, len(self.lines)):
+            if self.levels[j] <= level:
+                return self.lines[j] - 1
+        return None
+
+
+class FenceIndex:
+    """Every ``` of the note as sorted (line, col) pairs, lines 1-based.
+
+    Kept up to date like HeadingIndex, so the editor finds the fences after an
+    edit with a bisect instead of searching the widget to the end of the note.
+    """
+
+    def __init__(self, text=""):
+        self.positions = []
+        self.replace_lines(1, 0, text)
+
+    def __len__(self):
+        return len(self.positions)
+
+    def replace_lines(self, first, last, text):
+        """Lines first..last now hold text, same contract as HeadingIndex.replace_lines."""
+        lo = bisect_left(self.positions, (first, 0))
+        hi = bisect_left(self.positions, (last + 1, 0))
+        found = []
+        line, pos = first, 0
+        for offset in find_fences(text):
+            # a fence never spans lines, so scanning line by line finds the same ones
+            line += text.count("\n", pos, offset)
+            pos = offset
+            found.append((line, offset - text.rfind("\n", 0, offset) - 1))
+        delta = text.count("\n") - (last - first)
+        if delta:
+            # the fences below move, like the headings do
+            self.positions[hi:] = [(line + delta, col) for line, col in self.positions[hi:]]
+        self.positions[lo:hi] = found
+
+    def after(self, line, col=0):
+        """Position in the list of the first fence at or after line.col."""
+        return bisect_left(self.positions, (line, col))
+
+
+def common_prefix(a, b):
+    """How many leading chars a and b share.
+
+    Halving with slice compares keeps the char loop in C, a keystroke on a very
+    long line costs a few memcmps instead of a Python step per char.
+    """
+    lo, hi = 0, min(len(a), len(b))
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if a[lo:mid] == b[lo:mid]:
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
+
+
+def common_suffix(a, b, limit):
+    """How many trailing chars a and b share, at most limit."""
+    lo, hi = 0, limit
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if a[len(a) - mid:len(a) - lo] == b[len(b) - mid:len(b) - lo]:
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
+
+
+class Document:
+    """The note itself: rope text, style spans and token cache, no widget needed.
+
+    Lines are 1-based like Tk, and offset/index convert between char offsets and
+    "line.col" strings.
+    """
+
+    def __init__(self, text=""):
+        self.buffer = Rope(text)
+        self.styles = StyleSpans()
+        self.tokens = TokenCache()
+        self.headings = HeadingIndex(text)
+        self.fences = FenceIndex(text)
+
+    def __len__(self):
+        return len(self.buffer)
+
+    def text(self, start=0, end=None):
+        return self.buffer.text(start, end)
+
+    def line_count(self):
+        return self.buffer.line_count()
+
+    def insert(self, offset, text):
+        line = self.buffer.line_of(offset) + 1
+        self._insert(offset, text)
+        self._lines_changed(line, line, self.lines_text(line, line + text.count("\n")))
+
+    def delete(self, start, end):
+        first, last = self.buffer.line_of(start) + 1, self.buffer.line_of(end) + 1
+        self._delete(start, end)
+        self._lines_changed(first, last, self.lines_text(first, first))
+
+    def _lines_changed(self, first, last, text):
+        # lines first..last became text, the line based indexes follow
+        self.headings.replace_lines(first, last, text)
+        self.fences.replace_lines(first, last, text)
+
+    def _insert(self, offset, text):
+        self.buffer.insert(offset, text)
+        self.styles.insert(offset, len(text))
+
+    def _delete(self, start, end):
+        self.buffer.delete(start, end)
+        self.styles.delete(start, end)
+
+    def replace_ranges(self, replacements):
+        """Swap in [(start, end, new text), ...] (sorted, not overlapping) all at once.
+
+        A few ranges (an undone replace-all, say) are edited into the rope one by
+        one and cost what they change. When there are so many that the edits
+        would cost more than rebuilding the whole rope, it's rebuilt once.
+        """
+        if not replacements:
+            return
+        self.styles.remap(OffsetMap(replacements))
+        if self.rebuilds(len(replacements)):
+            old_lines = self.line_count()
+            text = replace_text(self.buffer.text(), replacements)
+            self.buffer = Rope(text)
+            self._lines_changed(1, old_lines, text)
+            return
+        # last first, so the offsets of the ones before stay put
+        for start, end, new in reversed(replacements):
+            first, last = self.buffer.line_of(start) + 1, self.buffer.line_of(end) + 1
+            if end > start:
+                self.buffer.delete(start, end)
+            if new:
+                self.buffer.insert(start, new)
+            self._lines_changed(first, last, self.lines_text(first, first + new.count("\n")))
+
+    def rebuilds(self, count):
+        """Whether replace_ranges would rebuild the rope for count replacements."""
+        return count * EDIT_COST > len(self.buffer)
+
+    def line_start(self, line):
+        return self.buffer.line_start(line - 1)
+
+    def line_end(self, line):
+        if line >= self.line_count():
+            return len(self.buffer)
+        return self.buffer.line_start(line) - 1
+
+    def lines_text(self, first, last):
+        """Lines first..last without the final newline, like Text.get("first.0", "last.end")."""
+        return self.buffer.text(self.line_start(first), self.line_end(last))
+
+    def offset(self, index):
+        """"line.col" -> char offset, clamped the way Tk clamps indices."""
+        line, col = (int(part) for part in str(index).split("."))
+        if line < 1:
+            return 0
+        if line > self.line_count():
+            return len(self.buffer)
+        return min(self.line_start(line) + col, self.line_end(line))
+
+    def index(self, offset):
+        line = self.buffer.line_of(offset)
+        return f"{line + 1}.{offset - self.buffer.line_start(line)}"
+
+    def replace_lines(self, first, last, text):
+        """Swap lines first..last for text, touching only the chars that differ."""
+        start, end = self.line_start(first), self.line_end(last)
+        old = self.buffer.text(start, end)
+        prefix = common_prefix(old, text)
+        suffix = common_suffix(old, text, min(len(old), len(text)) - prefix)
+        self._delete(start + prefix, end - suffix)
+        self._insert(start + prefix, text[prefix:len(text) - suffix])
+        self._lines_changed(first, last, text)
+
+    def inline_tokens(self, first, last):
+        """{tag: [(start, end), ...]} for lines first..last, offsets from the start of first."""
+        found = {tag: [] for tag in INLINE_TAGS}
+        base = 0
+        for line in self.lines_text(first, last).split("\n"):
+            for tag, start, end in self.tokens.line(line):
+                found[tag].append((base + start, base + end))
+            base += len(line) + 1
+        return found
@@ -0,0 +1,256 @@
+# file name index for a mounted drive, so USB_reader can search without a crawl.
+#
+# Every folder and every name in it go into a SQLite database in the cache dir,
+# one per volume. Names are also in an FTS5 trigram table, which answers "name
+# contains x" from the index for any x of three or more characters.
+#
+# refresh() only lists folders whose mtime changed since they were indexed (a
+# folder's mtime moves when an entry is added, removed or renamed in it), the
+# others cost one stat, so keeping a big stick's index current is cheap.
+#
+# An index is trusted for FRESH_SECONDS after a refresh, except under folders
+# marked stale (the reader marks the folders it changes itself, and the ones its
+# watcher sees change) and as long as every indexed folder under the search still
+# has the mtime it was listed at. That check is a stat per folder, what a no-op
+# refresh costs, so another program copying to or deleting from the stick sends
+# the search to a crawl instead of missing (or inventing) files.
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+import dirlist
+import note_search
+
+SCHEMA = """
+PRAGMA journal_mode = WAL;
+CREATE TABLE IF NOT EXISTS dirs (
+    id INTEGER PRIMARY KEY,
+    path TEXT UNIQUE NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    listed_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS entries (
+    id INTEGER PRIMARY KEY,
+    dir_id INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    is_dir INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_dir ON entries (dir_id);
+CREATE VIRTUAL TABLE IF NOT EXISTS names USING fts5(name, content='entries', content_rowid='id', tokenize='trigram');
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value);
+"""
+COMMIT_EVERY = 500   # folders per transaction while refreshing
+FRESH_SECONDS = 600  # an index refreshed longer ago than this isn't trusted for a search
+
+
+def volume_id(root):
+    """Something that tells this volume apart from another one mounted at the same place."""
+    if os.name == "nt":
+        import ctypes
+        serial = ctypes.c_uint32()
+        if ctypes.windll.kernel32.GetVolumeInformationW(root, None, 0, ctypes.byref(serial), None, None, None, 0):
+            return f"serial-{serial.value:08x}"
+    return f"dev-{os.stat(root).st_dev}"
+
+
+def default_db_path(root):
+    key = hashlib.sha1(f"{os.path.abspath(root)}|{volume_id(root)}".encode("utf-8")).hexdigest()[:16]
+    return os.path.join(note_search.cache_dir(), f"drive-{key}.sqlite")
+
+
+def _scan(path):
+    names = {}
+    with os.scandir(path) as it:
+        for entry in it:
+            try:
+                names[entry.name] = (entry.is_dir(), entry.is_symlink())
+            except OSError:
+                continue
+    return names
+
+
+class DriveIndex:
+    """Names of everything under root. search() is safe from any thread, refresh() runs on one at a time."""
+
+    def __init__(self, root, db_path=None):
+        self.root = os.path.abspath(root)
+        self.db_path = db_path or default_db_path(self.root)
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        self.refreshing = threading.Lock()
+        self.folders = 0  # folders looked at by the running refresh
+        self.stale = set()  # folders changed since the last refresh started, see mark_stale
+        self._stale_lock = threading.Lock()
+        with self._connect() as db:
+            db.executescript(SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        db = sqlite3.connect(self.db_path, timeout=10)
+        try:
+            with db:
+                yield db
+        finally:
+            db.close()
+
+    def _meta(self, db, key, default=None):
+        row = db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def refreshed_at(self):
+        """When the last complete refresh finished, None if there never was one."""
+        with self._connect() as db:
+            return self._meta(db, "refreshed_at")
+
+    def mark_stale(self, folder):
+        """Entries in folder were added, removed or renamed, don't answer for it until a refresh."""
+        with self._stale_lock:
+            self.stale.add(os.path.abspath(folder))
+
+    def fresh(self, max_age=FRESH_SECONDS, under=None):
+        """Whether a search under the folder under (default: anywhere) can trust the index.
+
+        Stats every indexed folder under it, so call it off the Tk thread.
+        """
+        refreshed = self.refreshed_at()
+        if refreshed is None or time.time() - refreshed >= max_age:
+            return False
+        under = self.root if under is None else os.path.abspath(under)
+        with self._stale_lock:
+            stale = list(self.stale)
+        # a changed folder inside the search, or one above it (its entry may be the search folder)
+        if any(folder == under or folder.startswith(os.path.join(under, ""))
+               or under.startswith(os.path.join(folder, "")) for folder in stale):
+            return False
+        return self.unchanged(under)
+
+    def unchanged(self, under):
+        """Whether every indexed folder under under (itself included) still has its indexed mtime."""
+        prefix = os.path.join(under, "")
+        with self._connect() as db:
+            rows = db.execute("SELECT path, mtime_ns, listed_at FROM dirs WHERE path = ? OR substr(path, 1, ?) = ?",
+                              (under, len(prefix), prefix)).fetchall()
+        if not rows:
+            return False  # never indexed, or gone
+        for path, mtime, listed_at in rows:
+            try:
+                now = os.stat(path).st_mtime_ns
+            except OSError:
+                return False
+            # same rule as refresh: a listing too close to the mtime may have missed a change
+            if now != mtime or listed_at - mtime / 1e9 <= dirlist.RACY_SECONDS:
+                return False
+        return True
+
+    def start_refresh(self):
+        """Refresh on a worker thread, unless one is running already."""
+        if self.refreshing.locked():
+            return
+        threading.Thread(target=self.refresh, daemon=True).start()
+
+    def refresh(self):
+        """Bring the index up to date with the drive. Returns how many folders were (re)listed."""
+        if not self.refreshing.acquire(blocking=False):
+            return 0
+        with self._stale_lock:
+            marked = set(self.stale)  # this refresh lists them, later marks wait for the next one
+        db = sqlite3.connect(self.db_path, timeout=10)
+        try:
+            known = {path: (dir_id, mtime, listed_at)
+                     for dir_id, path, mtime, listed_at in db.execute("SELECT id, path, mtime_ns, listed_at FROM dirs")}
+            subdirs = {}
+            for dir_id, name in db.execute("SELECT dir_id, name FROM entries WHERE is_dir = 2"):
+                subdirs.setdefault(dir_id, []).append(name)
+            self.folders = listed = 0
+            pending = [self.root]
+            while pending:
+                folder = pending.pop()
+                try:
+                    mtime = os.stat(folder).st_mtime_ns
+                except OSError:
+                    continue
+                self.folders += 1
+                old = known.pop(folder, None)
+                if old is not None and old[1] == mtime and old[2] - mtime / 1e9 > dirlist.RACY_SECONDS:
+                    # nothing added or removed here, only its subfolders need a look
+                    pending.extend(os.path.join(folder, name) for name in subdirs.get(old[0], ()))
+                    continue
+                try:
+                    listed_at = time.time()
+                    names = _scan(folder)
+                except OSError:
+                    continue
+                self._store(db, folder, mtime, listed_at, names, old[0] if old else None)
+                pending.extend(os.path.join(folder, name) for name, (is_dir, link) in names.items()
+                               if is_dir and not link)
+                listed += 1
+                if listed % COMMIT_EVERY == 0:
+                    db.commit()
+            # folders that weren't reached any more are gone
+            for dir_id, _, _ in known.values():
+                self._drop_dir(db, dir_id)
+            db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('refreshed_at', ?)", (time.time(),))
+            db.commit()
+            with self._stale_lock:
+                self.stale -= marked
+            return listed
+        finally:
+            db.close()
+            self.refreshing.release()
+
+    def _store(self, db, folder, mtime, listed_at, names, dir_id):
+        # is_dir: 0 file, 1 folder we don't descend into (a link), 2 folder
+        kinds = {name: (2 if is_dir and not link else int(is_dir)) for name, (is_dir, link) in names.items()}
+        if dir_id is None:
+            dir_id = db.execute("INSERT INTO dirs (path, mtime_ns, listed_at) VALUES (?, ?, ?)",
+                                (folder, mtime, listed_at)).lastrowid
+            old = {}
+        else:
+            db.execute("UPDATE dirs SET mtime_ns = ?, listed_at = ? WHERE id = ?", (mtime, listed_at, dir_id))
+            old = {name: (entry_id, kind) for entry_id, name, kind
+                   in db.execute("SELECT id, name, is_dir FROM entries WHERE dir_id = ?", (dir_id,))}
+        for name, (entry_id, kind) in old.items():
+            if kinds.get(name) != kind:
+                db.execute("INSERT INTO names (names, rowid, name) VALUES ('delete', ?, ?)", (entry_id, name))
+                db.execute("DELETE FROM entries WHERE id = ?", (entry_id,))
+        for name, kind in kinds.items():
+            if name in old and old[name][1] == kind:
+                continue
+            entry_id = db.execute("INSERT INTO entries (dir_id, name, is_dir) VALUES (?, ?, ?)",
+                                  (dir_id, name, kind)).lastrowid
+            db.execute("INSERT INTO names (rowid, name) VALUES (?, ?)", (entry_id, name))
+
+    def _drop_dir(self, db, dir_id):
+        for entry_id, name in db.execute("SELECT id, name FROM entries WHERE dir_id = ?", (dir_id,)).fetchall():
+            db.execute("INSERT INTO names (names, rowid, name) VALUES ('delete', ?, ?)", (entry_id, name))
+        db.execute("DELETE FROM entries WHERE dir_id = ?", (dir_id,))
+        db.execute("DELETE FROM dirs WHERE id = ?", (dir_id,))
+
+    def search(self, term, under=None, limit=None):
+        """Paths under the folder under (default: the whole drive) whose name contains term, any case."""
+        term = term.lower()
+        if not term:
+            return []
+        base = "SELECT dirs.path, entries.name FROM {} JOIN dirs ON dirs.id = entries.dir_id WHERE {}"
+        if len(term) >= 3:
+            # trigram matching folds ASCII case only, the check below does the rest
+            sql = base.format("names JOIN entries ON entries.id = names.rowid", "names MATCH ?")
+            args = ['"' + term.replace('"', '""') + '"']
+        else:
+            sql = base.format("entries", "instr(lower(entries.name), ?) > 0")
+            args = [term]
+        if under is not None:
+            under = os.path.abspath(under)
+            prefix = os.path.join(under, "")
+            sql += " AND (dirs.path = ? OR substr(dirs.path, 1, ?) = ?)"
+            args += [under, len(prefix), prefix]
+        found = []
+        with self._connect() as db:
+            for folder, name in db.execute(sql, args):
+                if term in name.lower():
+                    found.append(os.path.join(folder, name))
+                    if limit is not None and len(found) >= limit:
+                        break
+        return found
@@ -0,0 +1,130 @@
+# searching a drive by file name without blocking the USB reader.
+#
+# A Crawl walks the tree with os.scandir on a worker thread. Matches pile up in a
+# buffer the Tk side empties with take() on a timer, so the window shows results
+# (and a running count) while the walk goes on, and cancel() stops it between
+# two entries. What matches is a file_query node. An IndexedCrawl answers from
+# the drive's name index instead when that still matches the drive.
+import os
+import threading
+import time
+
+import file_query
+
+
+def substring(term):
+    """Case-insensitive name match, what the search box has always done."""
+    return file_query.Name(term)
+
+
+class Crawl:
+    """One search: every path under root the query matches, up to cap."""
+
+    from_index = False  # see IndexedCrawl
+
+    def __init__(self, root, query, cap=None):
+        self.root = root
+        self.query = query
+        self.cap = cap
+        self.found = 0          # matches so far
+        self.folders = 0        # folders listed so far
+        self.pruned = 0         # folders skipped because nothing in them could match
+        self.current = root     # folder being listed
+        self.truncated = False  # stopped at cap
+        self.cancelled = threading.Event()
+        self.done = threading.Event()
+        self.started = time.perf_counter()
+        self.elapsed = None
+        self._lock = threading.Lock()
+        self._new = []
+
+    def start(self):
+        threading.Thread(target=self.run, daemon=True).start()
+        return self
+
+    def cancel(self):
+        self.cancelled.set()
+
+    def take(self):
+        """Matches found since the last call."""
+        with self._lock:
+            new, self._new = self._new, []
+        return new
+
+    def run(self):
+        # depth first with an explicit stack, like os.walk but with the DirEntry kept
+        query = self.query
+        try:
+            pending = [(self.root, "")]  # (path, path below root with "/")
+            while pending and not self.cancelled.is_set():
+                folder, relative = pending.pop()
+                self.current = folder
+                try:
+                    with os.scandir(folder) as it:
+                        entries = list(it)
+                except OSError:
+                    continue
+                self.folders += 1
+                found = []
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            below = f"{relative}/{entry.name}" if relative else entry.name
+                            if query.descend(below):
+                                pending.append((entry.path, below))
+                            else:
+                                self.pruned += 1
+                        if query.match(entry, relative):
+                            found.append(entry.path)
+                    except OSError:
+                        continue
+                if found:
+                    if self.cap is not None and self.found + len(found) >= self.cap:
+                        found = found[:self.cap - self.found]
+                        self.truncated = True
+                        self.cancelled.set()
+                    with self._lock:
+                        self._new.extend(found)
+                    self.found += len(found)
+        finally:
+            self.elapsed = time.perf_counter() - self.started
+            self.done.set()
+
+    def run_all(self):
+        """Run on the calling thread and return every match, for scripts and benchmarks."""
+        self.run()
+        return self.take()
+
+
+class IndexedCrawl(Crawl):
+    """A Crawl that answers from a drive_index.DriveIndex when it can.
+
+    Whether the index still matches the drive under root takes a stat per folder,
+    so it's decided here on the worker thread. term is the plain name the query
+    boils down to (file_query.plain_name); from_index says which way it went.
+    """
+
+    def __init__(self, root, query, index, term, cap=None):
+        super().__init__(root, query, cap)
+        self.index = index
+        self.term = term
+        self.from_index = False
+
+    def run(self):
+        try:
+            usable = self.index.fresh(under=self.root)
+        except Exception:
+            usable = False  # a broken index database only costs the crawl
+        if not usable or self.cancelled.is_set():
+            super().run()
+            return
+        try:
+            matches = self.index.search(self.term, under=self.root, limit=self.cap)
+            self.from_index = True
+            self.found = len(matches)
+            self.truncated = self.cap is not None and self.found >= self.cap
+            with self._lock:
+                self._new.extend(matches)
+        finally:
+            self.elapsed = time.perf_counter() - self.started
+            self.done.set()
@@ -0,0 +1,365 @@
+# the USB reader's search language.
+#
+#   report                       name contains "report" (any case), like the old search box
+#   *.jp?g  name:IMG_*           glob on the name
+#   re:^IMG_\d{4}                regex searched in the name (any case)
+#   ext:jpg,png                  extension(s)
+#   size:>10M  size:1k..5M       size in bytes, k/M/G/T are powers of 1024
+#   mtime:>2024-01-01  mtime:<2024-01-01  mtime:2024-05-01
+#                                modified after a date, before it, or on that day
+#   mtime:7d  mtime:>7d          modified in the last 7 days (> reads as "after 7 days ago")
+#   mtime:<30d                   modified before 30 days ago, so older than 30 days
+#   type:file  type:dir
+#   path:DCIM/**                 glob on the path below the search folder, "/" separated
+#
+# Terms in a row must all match; OR, NOT (or a leading -) and parentheses combine
+# them: (ext:jpg OR ext:png) -path:*/thumbs/** size:>1M
+#
+# Text without a known key:, AND/OR/NOT or a * or ? is one name substring, spaces,
+# brackets and dashes included, so "photo (1)", "notes: draft" and "x-ray -2"
+# search the way the box always did. Text that does use the syntax but can't be
+# read (parse(strict=True) says why) falls back to a substring too.
+#
+# Checks run cheapest first (name, type, globs, then anything needing a stat), stat
+# results come from the DirEntry so nothing is stat'ed twice, and descend() lets a
+# crawl skip folders whose path can't match.
+import fnmatch
+import re
+import time
+from datetime import datetime, timedelta
+
+KEYS = ("name", "re", "ext", "type", "path", "size", "mtime")
+# what makes text a query rather than a name; brackets, quotes and dashes only
+# count alongside one of these
+SYNTAX = re.compile(r'(?:^|[\s(\-"])(?:' + "|".join(KEYS) + r'):|\b(?:AND|OR|NOT)\b|[*?]')
+UNITS = {"": 1, "b": 1, "k": 1024, "m": 1024 ** 2, "g": 1024 ** 3, "t": 1024 ** 4}
+AGES = {"h": 3600, "d": 86400, "w": 7 * 86400}
+
+
+class QueryError(ValueError):
+    pass
+
+
+# Every node has match(entry, folder), folder being the entry's folder relative to
+# the search root ("" at the top); descend(folder), false when nothing below folder
+# can match; and cost, for ordering.
+
+class Name:
+    cost = 1
+
+    def __init__(self, text):
+        self.text = text.lower()
+
+    def match(self, entry, folder):
+        return self.text in entry.name.lower()
+
+    def descend(self, folder):
+        return True
+
+
+class Glob(Name):
+    cost = 2
+
+    def __init__(self, pattern):
+        self.regex = re.compile(fnmatch.translate(pattern.lower()))
+
+    def match(self, entry, folder):
+        return self.regex.match(entry.name.lower()) is not None
+
+
+class Regex(Name):
+    cost = 3
+
+    def __init__(self, pattern):
+        try:
+            self.regex = re.compile(pattern, re.IGNORECASE)
+        except re.error as e:
+            raise QueryError(f"bad regex {pattern!r}: {e}")
+
+    def match(self, entry, folder):
+        return self.regex.search(entry.name) is not None
+
+
+class Ext(Name):
+    def __init__(self, text):
+        self.exts = tuple("." + ext.lower().lstrip(".") for ext in text.split(",") if ext)
+        if not self.exts:
+            raise QueryError("ext: needs an extension")
+
+    def match(self, entry, folder):
+        return entry.name.lower().endswith(self.exts)
+
+
+class Type(Name):
+    def __init__(self, text):
+        if text not in ("file", "dir", "folder"):
+            raise QueryError("type: is file or dir")
+        self.dirs = text != "file"
+
+    def match(self, entry, folder):
+        # straight from the directory entry, no stat
+        return entry.is_dir(follow_symlinks=False) == self.dirs
+
+
+class Path(Name):
+    cost = 2
+
+    def __init__(self, pattern):
+        self.pattern = pattern.replace("\\", "/").strip("/").lower()
+        self.regex = re.compile(fnmatch.translate(self.pattern))
+        # the part before the first wildcard, everything that matches starts with it
+        self.prefix = re.split(r"[*?\[]", self.pattern, 1)[0]
+        self.open_end = self.pattern.endswith("*")
+
+    def match(self, entry, folder):
+        path = f"{folder}/{entry.name}" if folder else entry.name
+        return self.regex.match(path.lower()) is not None
+
+    def descend(self, folder):
+        below = (folder + "/").lower() if folder else ""
+        return below.startswith(self.prefix) or self.prefix.startswith(below)
+
+    def matches_all_below(self, folder):
+        # "x/*" matching "folder/" means it matches folder/anything too
+        return self.open_end and folder and self.regex.match((folder + "/").lower()) is not None
+
+
+class Range(Name):
+    """low <= the stat field < high, either end None for open."""
+    cost = 10  # needs a stat
+
+    def __init__(self, field, low, high):
+        self.field = field  # e.g. "st_size"
+        self.low = low
+        self.high = high
+
+    def match(self, entry, folder):
+        try:
+            value = getattr(entry.stat(follow_symlinks=False), self.field)  # DirEntry caches the stat
+        except OSError:
+            return False
+        return (self.low is None or value >= self.low) and (self.high is None or value < self.high)
+
+
+class Size(Range):
+    def __init__(self, low, high):
+        super().__init__("st_size", low, high)
+
+    def match(self, entry, folder):
+        # a folder's own size means nothing here
+        return not entry.is_dir(follow_symlinks=False) and super().match(entry, folder)
+
+
+class Mtime(Range):
+    def __init__(self, low, high):
+        super().__init__("st_mtime", low, high)
+
+
+class And:
+    def __init__(self, parts):
+        self.parts = sorted(parts, key=lambda part: part.cost)
+        self.cost = sum(part.cost for part in parts)
+
+    def match(self, entry, folder):
+        return all(part.match(entry, folder) for part in self.parts)
+
+    def descend(self, folder):
+        return all(part.descend(folder) for part in self.parts)
+
+
+class Or(And):
+    def match(self, entry, folder):
+        return any(part.match(entry, folder) for part in self.parts)
+
+    def descend(self, folder):
+        return any(part.descend(folder) for part in self.parts)
+
+
+class Not:
+    def __init__(self, part):
+        self.part = part
+        self.cost = part.cost
+
+    def match(self, entry, folder):
+        return not self.part.match(entry, folder)
+
+    def descend(self, folder):
+        # only prunable when everything below is sure to match what's negated
+        return not (isinstance(self.part, Path) and self.part.matches_all_below(folder))
+
+
+def parse_size(text):
+    match = re.fullmatch(r"(\d+(?:\.\d+)?)\s*([kmgt]?)b?", text.lower())
+    if not match:
+        raise QueryError(f"bad size {text!r}, try 10M or 500k")
+    return int(float(match.group(1)) * UNITS[match.group(2)])
+
+
+def parse_time(text, now):
+    """(start, end) of the moment or day text names, as timestamps."""
+    match = re.fullmatch(r"(\d+)([hdw])", text.lower())
+    if match:
+        moment = now - int(match.group(1)) * AGES[match.group(2)]
+        return moment, moment
+    for layout, span in (("%Y-%m-%d", timedelta(days=1)), ("%Y-%m-%dT%H:%M", timedelta(minutes=1)),
+                         ("%Y-%m", None), ("%Y", None)):
+        try:
+            start = datetime.strptime(text, layout)
+        except ValueError:
+            continue
+        if span is None:
+            end = start.replace(year=start.year + 1) if layout == "%Y" else \
+                (start.replace(month=start.month + 1) if start.month < 12 else start.replace(year=start.year + 1, month=1))
+        else:
+            end = start + span
+        return start.timestamp(), end.timestamp()
+    raise QueryError(f"bad date {text!r}, try 2024-05-01 or 30d")
+
+
+def parse_range(text, parse_one, node, relative=False):
+    if ".." in text:
+        low, high = text.split("..", 1)
+        return node(parse_one(low)[0] if low else None, parse_one(high)[1] if high else None)
+    for op in (">=", "<=", ">", "<", "="):
+        if text.startswith(op):
+            start, end = parse_one(text[len(op):])
+            break
+    else:
+        op = ">=" if relative and re.fullmatch(r"\d+[hdw]", text.lower()) else "="
+        start, end = parse_one(text)
+    return {">": node(end, None), ">=": node(start, None), "<": node(None, start),
+            "<=": node(None, end), "=": node(start, end)}[op]
+
+
+def _size_span(text):
+    size = parse_size(text)
+    return size, size + 1
+
+
+def term(key, value, now):
+    if not value:
+        raise QueryError(f"{key}: needs a value")
+    if key == "name":
+        return Glob(value) if re.search(r"[*?\[]", value) else Name(value)
+    if key == "re":
+        return Regex(value)
+    if key == "ext":
+        return Ext(value)
+    if key == "type":
+        return Type(value.lower())
+    if key == "path":
+        return Path(value)
+    if key == "size":
+        return parse_range(value, _size_span, Size)
+    if key == "mtime":
+        return parse_range(value, lambda text: parse_time(text, now), Mtime, relative=True)
+    raise QueryError(f"unknown key {key}:")
+
+
+TOKEN = re.compile(r'\s*(?:(\()|(\))|"((?:[^"]|"")*)"|([^\s()"]+(?:"(?:[^"]|"")*")?))')
+
+
+def tokenize(text):
+    tokens = []
+    pos = 0
+    text = text.strip()
+    while pos < len(text):
+        match = TOKEN.match(text, pos)
+        if not match or match.end() == pos:
+            raise QueryError(f"can't read the query from {text[pos:]!r}")
+        pos = match.end()
+        if match.group(1):
+            tokens.append("(")
+        elif match.group(2):
+            tokens.append(")")
+        elif match.group(3) is not None:
+            tokens.append(("word", match.group(3).replace('""', '"')))
+        else:
+            word = match.group(4)
+            if word in ("AND", "OR", "NOT"):
+                tokens.append(word)
+            else:
+                # key:"quoted value"
+                word = re.sub(r'"((?:[^"]|"")*)"$', lambda quoted: quoted.group(1).replace('""', '"'), word)
+                tokens.append(("word", word))
+    return tokens
+
+
+class _Parser:
+    def __init__(self, tokens, now):
+        self.tokens = tokens
+        self.pos = 0
+        self.now = now
+
+    def peek(self):
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else None
+
+    def take(self):
+        token = self.peek()
+        self.pos += 1
+        return token
+
+    def parse_or(self):
+        parts = [self.parse_and()]
+        while self.peek() == "OR":
+            self.take()
+            parts.append(self.parse_and())
+        return parts[0] if len(parts) == 1 else Or(parts)
+
+    def parse_and(self):
+        parts = [self.parse_unary()]
+        while self.peek() not in (None, ")", "OR"):
+            if self.peek() == "AND":
+                self.take()
+            parts.append(self.parse_unary())
+        return parts[0] if len(parts) == 1 else And(parts)
+
+    def parse_unary(self):
+        token = self.take()
+        if token is None:
+            raise QueryError("the query ends too early")
+        if token == "NOT":
+            return Not(self.parse_unary())
+        if token == "(":
+            inner = self.parse_or()
+            if self.take() != ")":
+                raise QueryError("missing )")
+            return inner
+        if token in (")", "AND", "OR"):
+            raise QueryError(f"unexpected {token}")
+        word = token[1]
+        if word.startswith("-") and len(word) > 1:
+            self.tokens[self.pos - 1] = ("word", word[1:])
+            self.pos -= 1
+            return Not(self.parse_unary())
+        key, sep, value = word.partition(":")
+        if sep and key in KEYS:
+            return term(key, value, self.now)
+        return Glob(word) if re.search(r"[*?\[]", word) else Name(word)
+
+
+def parse(text, now=None, strict=False):
+    """The query in text as a node tree.
+
+    Text that can't be read as a query is a name substring, unless strict, then
+    it raises QueryError with something to show the user. Empty text always raises.
+    """
+    if not text.strip():
+        raise QueryError("empty query")
+    if not SYNTAX.search(text):
+        return Name(text.strip())
+    try:
+        parser = _Parser(tokenize(text), time.time() if now is None else now)
+        node = parser.parse_or()
+        if parser.peek() is not None:
+            raise QueryError(f"unexpected {parser.peek()}")
+    except QueryError:
+        if strict:
+            raise
+        return Name(text.strip())
+    return node
+
+
+def plain_name(node):
+    """The substring if the query is just a name substring (what the drive index can answer), else None."""
+    return node.text if type(node) is Name else None
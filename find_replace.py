@@ -0,0 +1,159 @@
+# find/replace engine for the editor, no tkinter in here.
+#
+# Searches run over a plain string snapshot of the note (Document.text()) so
+# they can happen on a worker thread. Matches come back as two parallel arrays
+# of char offsets, sorted, which is all next/previous needs.
+import re
+from array import array
+from bisect import bisect_left, bisect_right
+
+from highlighter import LineIndex
+
+CHECK_EVERY = 4096  # matches between looks at the cancel flag
+
+
+class Cancelled(Exception):
+    pass
+
+
+def compile_pattern(query, regex=False, case=False, word=False):
+    """The pattern the find bar's options describe. Raises re.error for a bad regex."""
+    source = query if regex else re.escape(query)
+    if word:
+        source = rf"\b(?:{source})\b"
+    return re.compile(source, 0 if case else re.IGNORECASE)
+
+
+class MatchIndex:
+    """Sorted match offsets, starts[i]..ends[i] is match i."""
+
+    def __init__(self, starts=None, ends=None):
+        self.starts = starts if starts is not None else array("q")
+        self.ends = ends if ends is not None else array("q")
+
+    def __len__(self):
+        return len(self.starts)
+
+    def ranges(self):
+        return zip(self.starts, self.ends)
+
+    def after(self, offset):
+        """First match starting at or after offset, wrapping to the first one. None if empty."""
+        if not self.starts:
+            return None
+        i = bisect_left(self.starts, offset)
+        return i if i < len(self.starts) else 0
+
+    def before(self, offset):
+        """Last match starting before offset, wrapping to the last one. None if empty."""
+        if not self.starts:
+            return None
+        i = bisect_left(self.starts, offset) - 1
+        return i if i >= 0 else len(self.starts) - 1
+
+    def at(self, start, end):
+        """Index of the match exactly covering start..end, or None."""
+        i = bisect_left(self.starts, start)
+        if i < len(self.starts) and self.starts[i] == start and self.ends[i] == end:
+            return i
+        return None
+
+
+def find_all(pattern, text, cancelled=None):
+    """MatchIndex of every match of pattern in text. cancelled is an optional threading.Event."""
+    starts, ends = array("q"), array("q")
+    for n, match in enumerate(pattern.finditer(text)):
+        if cancelled is not None and n % CHECK_EVERY == 0 and cancelled.is_set():
+            raise Cancelled()
+        starts.append(match.start())
+        ends.append(match.end())
+    return MatchIndex(starts, ends)
+
+
+def replacement(match, repl, regex=False):
+    # regex replacements may use \1 / \g<name>, plain ones are taken literally
+    return match.expand(repl) if regex else repl
+
+
+def find_replacements(pattern, text, repl, regex=False, cancelled=None):
+    """[(start, end, new text), ...] for every match, in order."""
+    found = []
+    for n, match in enumerate(pattern.finditer(text)):
+        if cancelled is not None and n % CHECK_EVERY == 0 and cancelled.is_set():
+            raise Cancelled()
+        found.append((match.start(), match.end(), replacement(match, repl, regex)))
+    return found
+
+
+def replace_text(text, replacements):
+    """text with every (start, end, new) swapped in, replacements sorted and not overlapping."""
+    parts = []
+    pos = 0
+    for start, end, new in replacements:
+        parts.append(text[pos:start])
+        parts.append(new)
+        pos = end
+    parts.append(text[pos:])
+    return "".join(parts)
+
+
+def tk_script_args(text, replacements):
+    """Flat (index, index, new, ...) list, last replacement first so earlier indices stay put."""
+    indices = LineIndex(text).flatten((start, end) for start, end, _ in reversed(replacements))
+    flat = [None] * (len(replacements) * 3)
+    flat[0::3] = indices[0::2]
+    flat[1::3] = indices[1::2]
+    flat[2::3] = [new for _, _, new in reversed(replacements)]
+    return flat
+
+
+class OffsetMap:
+    """Where offsets of the old text end up after replace_text.
+
+    Matches that touch form a run. The new text of a run keeps a style only
+    when the chars just before and just after the run both had it.
+    """
+
+    def __init__(self, replacements):
+        self.starts = [start for start, _, _ in replacements]
+        self.ends = [end for _, end, _ in replacements]
+        self.new_starts = []
+        self.new_ends = []
+        self.shift = []  # total length change up to and including each replacement
+        self.run_first = []  # first and last replacement of the run each one is in
+        self.run_last = [0] * len(replacements)
+        total = 0
+        for i, (start, end, new) in enumerate(replacements):
+            self.new_starts.append(start + total)
+            self.new_ends.append(start + total + len(new))
+            total += len(new) - (end - start)
+            self.shift.append(total)
+            touching = i > 0 and self.ends[i - 1] == start
+            self.run_first.append(self.run_first[i - 1] if touching else i)
+        for i in range(len(replacements) - 1, -1, -1):
+            touching = i + 1 < len(replacements) and self.starts[i + 1] == self.ends[i]
+            self.run_last[i] = self.run_last[i + 1] if touching else i
+
+    def range(self, start, end, styled=None):
+        """New (start, end) of the old range start..end.
+
+        styled(offset) tells whether an old char past the end of the range has the
+        same style, so a run between two ranges can keep it.
+        """
+        new_start, new_end = start, end
+        i = bisect_right(self.starts, start) - 1  # last match starting at or before start
+        if i >= 0:
+            if start < self.ends[i] or start == self.starts[i]:
+                new_start = self.new_ends[self.run_last[i]]
+            else:
+                new_start = start + self.shift[i]
+        i = bisect_right(self.starts, end) - 1
+        if i >= 0:
+            first, last = self.run_first[i], self.run_last[i]
+            if end > self.ends[i]:
+                new_end = end + self.shift[i]
+            elif start < self.starts[first] and styled is not None and styled(self.ends[last]):
+                new_end = self.new_ends[last]
+            else:
+                new_end = self.new_starts[first]
+        return new_start, new_end
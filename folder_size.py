@@ -0,0 +1,164 @@
+# folder sizes for the USB reader's attributes dialog.
+#
+# A Sizing walks a folder with a small thread pool (listing a folder on a USB
+# stick is mostly waiting, so a few run at once) and keeps a running total the
+# dialog can show while it goes.
+#
+# What each folder holds directly (bytes, files, subfolders) is cached against the
+# folder's mtime, which changes whenever an entry is added, removed or renamed in
+# it. A folder whose mtime hasn't moved costs one stat instead of a listing, so
+# sizing a parent after one of its children, or the same folder again, is quick.
+# Rewriting a file in place doesn't touch the folder's mtime; recount=True skips
+# the cache for that.
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import dirlist
+
+WORKERS = 4
+REPORT_EVERY = 64  # folders a worker sizes before adding them to the running total
+
+
+class SizeCache:
+    """path -> (mtime_ns, listed_at, bytes, files, subfolders) for what's directly in each folder."""
+
+    def __init__(self, max_folders=200_000):
+        self.max_folders = max_folders
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, path, mtime):
+        with self.lock:
+            cached = self.entries.get(path)
+            if cached is None or cached[0] != mtime or cached[1] - mtime / 1e9 <= dirlist.RACY_SECONDS:
+                return None
+            self.entries.move_to_end(path)
+            return cached[2:]
+
+    def put(self, path, mtime, listed_at, size, files, subdirs):
+        with self.lock:
+            self.entries[path] = (mtime, listed_at, size, files, subdirs)
+            self.entries.move_to_end(path)
+            while len(self.entries) > self.max_folders:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+cache = SizeCache()
+
+
+def list_folder(path):
+    """(bytes, files, subfolders) directly in path. Raises OSError."""
+    size = files = 0
+    subdirs = []
+    with os.scandir(path) as it:
+        for entry in it:
+            try:
+                if entry.is_file(follow_symlinks=False):
+                    size += entry.stat(follow_symlinks=False).st_size
+                    files += 1
+                elif entry.is_dir(follow_symlinks=False):
+                    subdirs.append(entry.name)
+            except OSError:
+                continue
+    return size, files, tuple(subdirs)
+
+
+class Sizing:
+    """One folder being sized. Read size/files/folders at any time, done is set at the end."""
+
+    def __init__(self, root, recount=False, workers=WORKERS, size_cache=None):
+        self.root = root
+        self.recount = recount
+        self.cache = size_cache or cache
+        self.workers = workers
+        self.size = 0
+        self.files = 0
+        self.folders = 0
+        self.cached = 0      # folders answered from the cache
+        self.errors = 0      # folders that couldn't be read
+        self.done = threading.Event()
+        self.cancelled = threading.Event()
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="folder-size")
+
+    def start(self):
+        self._submit([self.root])
+        return self
+
+    def run(self):
+        """Size on the pool and wait for it, returns the total bytes."""
+        self.start()
+        self.done.wait()
+        return self.size
+
+    def cancel(self):
+        self.cancelled.set()
+
+    def _submit(self, paths):
+        with self._lock:
+            self._pending += len(paths)
+        for path in paths:
+            self._pool.submit(self._size_folder, path)
+
+    def _size_folder(self, path):
+        # walks its own stack and hands subfolders to the pool only while a worker is
+        # idle, so a big tree is a few long tasks rather than one per folder
+        stack = [path]
+        counts = [0, 0, 0, 0, 0]  # size, files, folders, cached, errors since the last report
+        try:
+            while stack and not self.cancelled.is_set():
+                folder = stack.pop()
+                subdirs = [os.path.join(folder, name) for name in self._folder(folder, counts)]
+                if len(subdirs) > 1 and self._pending < self.workers:
+                    self._submit(subdirs[1:])
+                    del subdirs[1:]
+                stack.extend(subdirs)
+                if counts[2] >= REPORT_EVERY:
+                    self._report(counts)
+        finally:
+            with self._lock:
+                self._add(counts)
+                self._pending -= 1
+                finished = self._pending == 0
+            if finished:
+                self._pool.shutdown(wait=False)
+                self.done.set()
+
+    def _folder(self, path, counts):
+        try:
+            mtime = os.stat(path).st_mtime_ns
+            cached = None if self.recount else self.cache.get(path, mtime)
+            if cached is None:
+                listed_at = time.time()
+                cached = list_folder(path)
+                self.cache.put(path, mtime, listed_at, *cached)
+            else:
+                counts[3] += 1
+        except OSError:
+            counts[4] += 1
+            return ()
+        size, files, subdirs = cached
+        counts[0] += size
+        counts[1] += files
+        counts[2] += 1
+        return subdirs
+
+    def _report(self, counts):
+        with self._lock:
+            self._add(counts)
+
+    def _add(self, counts):
+        self.size += counts[0]
+        self.files += counts[1]
+        self.folders += counts[2]
+        self.cached += counts[3]
+        self.errors += counts[4]
+        counts[:] = [0, 0, 0, 0, 0]
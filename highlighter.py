@@ -0,0 +1,154 @@
+# markdown tokenizer for the notebook, no tkinter in here so it can be benchmarked headless
+import re
+from bisect import bisect_right
+from itertools import accumulate
+
+# markdown highlighting rules, tag name -> pattern (kept for reference / the benchmark)
+MARKDOWN_PATTERNS = {
+    "heading": r"^(#{1,6})\s+.*$",
+    "bold": r"\*\*(.+?)\*\*",
+    "italic": r"\*(.+?)\*",
+    "strikethrough": r"~~(.+?)~~",
+    "bullet": r"^- .*$",
+    "quote": r"^> .*$",
+    "code_block": r"```[\s\S]+?```",
+    "inline_code": r"`(.+?)`",
+    "link": r"\[([^\]]+)\]\((https?://[^\)]+)\)",
+    "email": r"\[([^\]]+)\]\((mailto:[^)]+)\)",
+}
+MARKDOWN_TAGS = list(MARKDOWN_PATTERNS)
+# everything but code fences stays on one line, so it can be redone line by line
+INLINE_TAGS = [tag for tag in MARKDOWN_TAGS if tag != "code_block"]
+# tags that cover the rest of the line once their marker is seen
+LINE_TAGS = ("heading", "bullet", "quote")
+# a whole heading line, same marker rule as the heading token (for the outline)
+HEADING_LINE_RE = re.compile(r"^(#{1,6})[ \t]+(.*)$", re.MULTILINE)
+
+# Line rules share one pass that only looks at line starts. Inline rules get a
+# pass each, like the original highlighter, because they nest: **[a](https://x)**,
+# `a **b** c`, ~~**x**~~ and **bold *it* more** carry both tags. Each pattern
+# starts with a literal, so the regex engine skips to candidates without trying
+# every position.
+LINE_START_RE = re.compile(r"^(?:(?P<heading>#{1,6}(?=[ \t]))|(?P<bullet>- )|(?P<quote>> ))", re.MULTILINE)
+INLINE_RES = {
+    "bold": re.compile(r"\*\*.+?\*\*"),
+    # a lone star, so the markers of **bold** aren't italic themselves; the star
+    # comes before the lookbehind to keep the literal prefix
+    "italic": re.compile(r"\*(?<!\*\*)(?!\*).+?(?<!\*)\*(?!\*)"),
+    "strikethrough": re.compile(r"~~.+?~~"),
+    "inline_code": re.compile(r"`[^`\n]+?`"),
+    "link": re.compile(r"\[[^\]\n]+\]\(https?://[^)\n]+\)"),
+    "email": re.compile(r"\[[^\]\n]+\]\(mailto:[^)\n]+\)"),
+}
+
+
+def tokenize(text):
+    """Find every markdown token.
+
+    Returns {tag: [(start, end), ...]} with string offsets, each list in order.
+    """
+    tokens = {tag: [] for tag in LINE_TAGS}
+    for match in LINE_START_RE.finditer(text):
+        start = match.start()
+        end = text.find("\n", start)
+        tokens[match.lastgroup].append((start, len(text) if end == -1 else end))
+    for tag, regex in INLINE_RES.items():
+        tokens[tag] = [match.span() for match in regex.finditer(text)]
+    tokens["code_block"] = pair_fences(find_fences(text))
+    return {tag: tokens[tag] for tag in MARKDOWN_TAGS}
+
+
+def find_fences(text):
+    fences = []
+    pos = text.find("```")
+    while pos != -1:
+        fences.append(pos)
+        pos = text.find("```", pos + 3)
+    return fences
+
+
+def pair_fences(fences):
+    # fences open and close in document order, a block needs something between them
+    blocks = []
+    opener = None
+    for pos in fences:
+        if opener is None:
+            opener = pos
+        elif pos >= opener + 4:
+            blocks.append((opener, pos + 3))
+            opener = None
+    return blocks
+
+
+class LineIndex:
+    """Turns string offsets into Tk "line.col" indices with a bisect over line starts.
+
+    Saves Tk from resolving "1.0+Nc" by counting characters from the top of the buffer.
+    """
+
+    def __init__(self, text="", first_line=1):
+        self.first_line = first_line
+        self.starts = [0]
+        self.length = 0
+        self.append(text)
+
+    def append(self, text):
+        """Extend the table with text that follows what it has seen so far."""
+        # running sum of line lengths, one C level pass instead of a Python step per line
+        lengths = [len(line) + 1 for line in text.split("\n")]
+        lengths.pop()  # what follows the last newline doesn't end a line
+        if lengths:
+            lengths[0] += self.length
+            self.starts.extend(accumulate(lengths))
+        self.length += len(text)
+
+    def offset(self, index):
+        """"line.col" -> offset, clamped to the line like Tk does."""
+        line, col = str(index).split(".")
+        row = int(line) - self.first_line
+        if row >= len(self.starts):
+            return self.length
+        line_end = self.starts[row + 1] - 1 if row + 1 < len(self.starts) else self.length
+        return min(self.starts[row] + int(col), line_end)
+
+    def offsets(self, indices):
+        """offset() for many indices at once, e.g. every saved tag range of a note."""
+        starts = self.starts
+        rows = len(starts)
+        first_line = self.first_line
+        length = self.length
+        found = []
+        append = found.append
+        for index in indices:
+            line, _, col = str(index).partition(".")
+            row = int(line) - first_line
+            if row >= rows:
+                append(length)
+                continue
+            line_end = starts[row + 1] - 1 if row + 1 < rows else length
+            offset = starts[row] + int(col)
+            append(offset if offset < line_end else line_end)
+        return found
+
+    def index(self, offset):
+        row = bisect_right(self.starts, offset) - 1
+        return f"{self.first_line + row}.{offset - self.starts[row]}"
+
+    def flatten(self, ranges):
+        """[(start, end), ...] -> [index, index, ...] ready for a single tag_add call."""
+        starts = self.starts
+        first_line = self.first_line - 1
+        last = len(starts)
+        indices = []
+        append = indices.append
+        for start, end in ranges:
+            row = bisect_right(starts, start)  # one past the line start is on
+            line_start = starts[row - 1]
+            append(f"{first_line + row}.{start - line_start}")
+            if row == last or end < starts[row]:
+                # most tokens end on the line they start on
+                append(f"{first_line + row}.{end - line_start}")
+            else:
+                row = bisect_right(starts, end, row)
+                append(f"{first_line + row}.{end - starts[row - 1]}")
+        return indices
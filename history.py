@@ -0,0 +1,176 @@
+# undo/redo history for the editor, no tkinter in here.
+#
+# Edits are stored as small diffs in document char offsets:
+#
+#   ("insert", at, text)
+#   ("delete", at, text, styles)            styles: [(kind, value, start, end)] relative to at
+#   ("style", kind, value, start, end, before)   before: [(value, start, end)] of that kind
+#   ("ranges", replacements, inverse, styles)    a replace-all, see Notebook.replace_ranges
+#
+# A group is what one undo takes back. Typing into the same spot coalesces into
+# one group, and once the two stacks together grow past max_bytes the oldest undo
+# steps go, then the redo steps furthest away.
+# Long texts are kept zlib-compressed until they're needed again.
+import time
+import zlib
+from collections import deque
+
+COMPRESS_AT = 4096  # chars, texts this long are stored compressed
+OP_OVERHEAD = 64    # rough bytes per op on top of its text
+
+
+def pack(text):
+    if len(text) < COMPRESS_AT:
+        return text
+    return zlib.compress(text.encode("utf-8"), 1)
+
+
+def unpack(text):
+    return text if isinstance(text, str) else zlib.decompress(text).decode("utf-8")
+
+
+def _text_size(text):
+    return len(text) if isinstance(text, bytes) else len(text) * 2
+
+
+def op_size(op):
+    kind = op[0]
+    if kind in ("insert", "delete"):
+        return OP_OVERHEAD + _text_size(op[2])
+    if kind == "style":
+        return OP_OVERHEAD * (1 + len(op[5]))
+    replacements, inverse, styles = op[1], op[2], op[3]
+    size = OP_OVERHEAD * (len(replacements) + sum(len(spans) for spans in styles.values()))
+    return size + sum(_text_size(text) for _, _, text in replacements) + sum(_text_size(text) for _, _, text in inverse)
+
+
+class Group:
+    __slots__ = ("ops", "size", "typing", "last")
+
+    def __init__(self, typing=False):
+        self.ops = []
+        self.size = 0
+        self.typing = typing
+        self.last = time.monotonic()
+
+
+class History:
+    """Undo and redo stacks of op groups, kept under max_bytes."""
+
+    def __init__(self, max_bytes=16 * 1024 * 1024, coalesce_ms=1000):
+        self.max_bytes = max_bytes
+        self.coalesce_ms = coalesce_ms
+        self.undo_stack = deque()
+        self.redo_stack = []
+        self.size = 0        # bytes held by both stacks
+        self.evicted = 0     # groups dropped to stay under max_bytes
+        self._depth = 0      # open begin() calls
+        self._open = None    # the group begin() started
+        self._boundary = True
+
+    def clear(self):
+        self.undo_stack = deque()
+        self.redo_stack = []
+        self.size = 0
+        self._open = None
+        self._boundary = True
+
+    def begin(self):
+        """Everything recorded until the matching end() undoes as one step."""
+        self._depth += 1
+
+    def end(self):
+        self._depth -= 1
+        if self._depth == 0:
+            self._open = None
+            self._boundary = True
+
+    def separator(self):
+        """Stop typing from coalescing into the group before."""
+        self._boundary = True
+
+    def record(self, op):
+        if self.redo_stack:
+            self.size -= sum(group.size for group in self.redo_stack)
+            self.redo_stack = []
+        if op[0] in ("insert", "delete"):
+            op = (op[0], op[1], pack(op[2])) + tuple(op[3:])
+        if self._depth:
+            if self._open is None:
+                self._open = self._push(Group())
+            self._add(self._open, op)
+        elif not self._coalesce(op):
+            self._add(self._push(Group(typing=self._is_typing(op))), op)
+            self._boundary = False
+        self._evict()
+
+    def _push(self, group):
+        self.undo_stack.append(group)
+        return group
+
+    def _add(self, group, op):
+        size = op_size(op)
+        group.ops.append(op)
+        group.size += size
+        group.last = time.monotonic()
+        self.size += size
+
+    def _is_typing(self, op):
+        # a few chars typed or backspaced, nothing with a line break
+        return op[0] in ("insert", "delete") and isinstance(op[2], str) and len(op[2]) <= 8 \
+            and "\n" not in op[2] and not (op[0] == "delete" and op[3])
+
+    def _coalesce(self, op):
+        if self._boundary or not self.undo_stack or not self._is_typing(op):
+            return False
+        group = self.undo_stack[-1]
+        if not group.typing or (time.monotonic() - group.last) * 1000 > self.coalesce_ms:
+            return False
+        last = group.ops[-1]
+        if op[0] == "insert" and last[0] == "insert" and op[1] == last[1] + len(last[2]):
+            merged = ("insert", last[1], last[2] + op[2])
+        elif op[0] == "delete" and last[0] == "delete" and op[1] + len(op[2]) == last[1]:
+            merged = ("delete", op[1], op[2] + last[2], [])  # backspace
+        elif op[0] == "delete" and last[0] == "delete" and op[1] == last[1]:
+            merged = ("delete", last[1], last[2] + op[2], [])  # forward delete
+        else:
+            return False
+        size = op_size(merged) - op_size(last)
+        group.ops[-1] = merged
+        group.size += size
+        group.last = time.monotonic()
+        self.size += size
+        return True
+
+    def _evict(self):
+        # oldest undo steps go first, then the redo steps furthest from where the
+        # user is; the newest undo step and the next redo step always stay
+        while self.size > self.max_bytes:
+            if len(self.undo_stack) > 1:
+                group = self.undo_stack.popleft()
+            elif len(self.redo_stack) > 1:
+                group = self.redo_stack.pop(0)
+            else:
+                break
+            self.size -= group.size
+            self.evicted += 1
+
+    def undo(self):
+        """The group to take back (apply its ops inverted, last first), or None."""
+        if not self.undo_stack or self._depth:
+            return None
+        group = self.undo_stack.pop()
+        self.redo_stack.append(group)
+        self._boundary = True
+        self._evict()
+        return group
+
+    def redo(self):
+        """The group to apply again (ops in order), or None."""
+        if not self.redo_stack or self._depth:
+            return None
+        group = self.redo_stack.pop()
+        self.undo_stack.append(group)
+        self._boundary = True
+        self._evict()
+        return group
@@ -0,0 +1,281 @@
+# .mk note files.
+#
+# v1 is one JSON object: {"global": {...}, "content": "...", "persistent_tags": [...]}
+# with tag ranges as Tk "line.col" strings.
+#
+# v2 is a container that can be read a piece at a time:
+#
+#   MAGIC | header length (uint32 LE) | header JSON | data section
+#
+# The header holds the globals, the style table and a table of content chunks
+# (where each zlib-compressed chunk sits in the data section and how many chars
+# it holds). Tag ranges are packed (style, start, end) uint32 char offsets,
+# compressed as one more blob. Any chunk can be decoded on its own, so a reader
+# can mmap the file and pull just the part it needs.
+#
+# dump always writes v2, so saving a v1 note upgrades it; load reads both.
+# What v2 buys is the first screen (one chunk instead of the whole JSON) and
+# size on disk. A full open still has to turn every tag offset back into a Tk
+# "line.col" string in Python, which v1 got for free from the C JSON parser, so
+# on notes with many styled ranges the full decode is slower than v1's.
+import json
+import mmap
+import os
+import shutil
+import struct
+import tempfile
+import zlib
+from array import array
+from bisect import bisect_right
+from itertools import groupby
+
+from highlighter import LineIndex
+
+MAGIC = b"MKNOTE2\n"
+# dump's scratch file, next to the note so the rename stays on one filesystem;
+# the explorers leave these out (see is_temp)
+TEMP_SUFFIX = ".mk-saving"
+CHUNK_CHARS = 64 * 1024
+_HEADER_LEN = struct.Struct("<I")
+
+
+def is_temp(name):
+    """Whether a file name is one of dump's half written saves."""
+    return name.startswith(".") and name.endswith(TEMP_SUFFIX)
+
+
+def is_v2(path):
+    with open(path, "rb") as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+# mkstemp makes files 0600, a new note gets what open() would have given it
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+
+def _fsync_dir(folder):
+    # makes the rename itself durable; Windows can't open a folder for this
+    if os.name == "nt":
+        return
+    try:
+        fd = os.open(folder, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass  # some network filesystems refuse, the data itself is synced already
+    finally:
+        os.close(fd)
+
+
+def dump(data, path, compresslevel=1):
+    """Write a note (v1 shaped dict) to path in the v2 format, whatever it was before.
+
+    The file is written next to path and renamed over it, so a crash mid-write
+    leaves the old note in place. An existing note keeps its permissions.
+    """
+    blob = encode(data, compresslevel)
+    folder = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix=".", suffix=TEMP_SUFFIX, dir=folder)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(blob)
+            f.flush()
+            os.fsync(f.fileno())
+        if os.path.exists(path):
+            shutil.copymode(path, tmp_path)
+        else:
+            os.chmod(tmp_path, 0o666 & ~_UMASK)
+        os.replace(tmp_path, path)
+        _fsync_dir(folder)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def encode(data, compresslevel=1):
+    content = data.get("content", "")
+    lines = LineIndex(content)
+    blobs = []
+    chunks = []
+    offset = 0
+    for pos in range(0, len(content), CHUNK_CHARS):
+        blob = zlib.compress(content[pos:pos + CHUNK_CHARS].encode("utf-8"), compresslevel)
+        chunks.append([offset, len(blob), pos])
+        blobs.append(blob)
+        offset += len(blob)
+    styles = []
+    packed = array("I")
+    for style, tag_data in enumerate(data.get("persistent_tags", [])):
+        styles.append({"tag": tag_data["tag"], "config": tag_data.get("config", {})})
+        ranges = tag_data.get("ranges", [])
+        offsets = array("I", lines.offsets(index for pair in ranges for index in pair))
+        # (style, start, end) triples, filled a column at a time
+        triples = array("I", [style]) * (3 * len(ranges))
+        triples[1::3] = offsets[0::2]
+        triples[2::3] = offsets[1::2]
+        packed.extend(triples)
+    tags_blob = zlib.compress(_little_endian(packed).tobytes(), compresslevel)
+    header = json.dumps({
+        "version": 2,
+        "global": data.get("global", {}),
+        "length": len(content),
+        "chunks": chunks,
+        "styles": styles,
+        "tags": [offset, len(tags_blob)],
+    }).encode("utf-8")
+    return b"".join([MAGIC, _HEADER_LEN.pack(len(header)), header] + blobs + [tags_blob])
+
+
+def load(path):
+    """Read a v1 or v2 note into the v1 shaped dict the editor works with."""
+    if not is_v2(path):
+        with open(path, "r") as f:
+            return json.load(f)
+    with NoteReader(path) as note:
+        content = "".join(note.iter_chunks())
+        return {
+            "global": note.global_data,
+            "content": content,
+            "persistent_tags": note.persistent_tags(LineIndex(content)),
+        }
+
+
+def iter_note(path):
+    """Yield ("global", dict), ("length", chars), then ("text", str) pieces, then
+    ("tags", persistent_tags).
+
+    Works for both versions; v2 files are decoded one chunk at a time.
+    """
+    if not is_v2(path):
+        with open(path, "r") as f:
+            data = json.load(f)
+        content = data.get("content", "")
+        yield "global", data.get("global", {})
+        yield "length", len(content)
+        yield "text", content
+        yield "tags", data.get("persistent_tags", [])
+        return
+    with NoteReader(path) as note:
+        yield from _iter_reader(note)
+
+
+def iter_blob(blob):
+    """iter_note for a v2 note held in memory (what encode returns)."""
+    with NoteReader(data=blob) as note:
+        yield from _iter_reader(note)
+
+
+def _iter_reader(note):
+    yield "global", note.global_data
+    yield "length", note.length
+    lines = LineIndex()
+    for text in note.iter_chunks():
+        lines.append(text)
+        yield "text", text
+    yield "tags", note.persistent_tags(lines)
+
+
+class NoteReader:
+    """Memory-mapped v2 note (or one already in memory as data). Only the header is parsed up front."""
+
+    def __init__(self, path=None, data=None):
+        self._file = None
+        if data is not None:
+            self._map = data
+            path = "data"
+        else:
+            self._file = open(path, "rb")
+            try:
+                self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:  # empty file
+                self._file.close()
+                raise ValueError(f"{path} is not a v2 note")
+        if self._map[:len(MAGIC)] != MAGIC:
+            self.close()
+            raise ValueError(f"{path} is not a v2 note")
+        header_at = len(MAGIC)
+        (header_len,) = _HEADER_LEN.unpack_from(self._map, header_at)
+        header_at += _HEADER_LEN.size
+        self.header = json.loads(self._map[header_at:header_at + header_len].decode("utf-8"))
+        self._data_at = header_at + header_len
+        self.global_data = self.header.get("global", {})
+        self.length = self.header["length"]
+        self._chunk_starts = [chunk[2] for chunk in self.header["chunks"]]
+
+    def close(self):
+        if self._file is not None:
+            self._map.close()
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _blob(self, offset, size):
+        start = self._data_at + offset
+        return zlib.decompress(self._map[start:start + size])
+
+    def chunk(self, i):
+        offset, size, _ = self.header["chunks"][i]
+        return self._blob(offset, size).decode("utf-8")
+
+    def iter_chunks(self):
+        for i in range(len(self.header["chunks"])):
+            yield self.chunk(i)
+
+    def text(self, start, end):
+        """Characters start..end, decoding only the chunks that hold them."""
+        if start >= end or not self._chunk_starts:
+            return ""
+        first = bisect_right(self._chunk_starts, start) - 1
+        last = bisect_right(self._chunk_starts, end - 1) - 1
+        text = "".join(self.chunk(i) for i in range(first, last + 1))
+        base = self._chunk_starts[first]
+        return text[start - base:end - base]
+
+    def _tag_array(self):
+        # (style, start, end, style, start, end, ...) as an array
+        offset, size = self.header["tags"]
+        packed = array("I")
+        packed.frombytes(self._blob(offset, size))
+        return _little_endian(packed)
+
+    def tag_offsets(self):
+        """[(style index, start, end), ...] as char offsets into the content."""
+        packed = self._tag_array()
+        return list(zip(packed[0::3], packed[1::3], packed[2::3]))
+
+    def persistent_tags(self, lines=None):
+        """The v1 style list, ranges turned back into Tk indices.
+
+        Pass the LineIndex of the content if it was already read, saves decoding it again.
+        """
+        tags = [{"tag": s["tag"], "ranges": [], "config": s["config"]} for s in self.header["styles"]]
+        packed = self._tag_array()
+        if not packed:
+            return tags
+        if lines is None:
+            lines = LineIndex("".join(self.iter_chunks()))
+        # every index in one flatten pass, then handed out per run of the same style
+        # (dump writes each style's ranges together)
+        indices = iter(lines.flatten(zip(packed[1::3], packed[2::3])))
+        ranges = list(zip(indices, indices))
+        pos = 0
+        for style, run in groupby(packed[0::3]):
+            count = sum(1 for _ in run)
+            tags[style]["ranges"].extend(ranges[pos:pos + count])
+            pos += count
+        return tags
+
+
+def _little_endian(packed):
+    if struct.pack("=I", 1) != struct.pack("<I", 1):
+        packed = array(packed.typecode, packed)
+        packed.byteswap()
+    return packed
@@ -0,0 +1,136 @@
+# full-text search over every .mk note under a workspace root.
+#
+# Note contents live in a SQLite FTS5 table next to a small table of
+# (path, mtime, size). refresh() walks the workspace and only re-reads notes
+# whose mtime or size changed, so keeping the index current is cheap and
+# queries never touch the notes themselves.
+import hashlib
+import os
+import sqlite3
+from contextlib import contextmanager
+
+import mkformat
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS notes (
+    id INTEGER PRIMARY KEY,
+    path TEXT UNIQUE NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS notes_fts USING fts5(content, tokenize='unicode61');
+"""
+COMMIT_EVERY = 200  # notes per transaction while (re)indexing
+
+
+def cache_dir():
+    base = os.environ.get("LOCALAPPDATA") or os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")
+    return os.path.join(base, "notebook")
+
+
+def default_db_path(root_dir):
+    key = hashlib.sha1(os.path.abspath(root_dir).encode("utf-8")).hexdigest()[:16]
+    return os.path.join(cache_dir(), f"notes-{key}.sqlite")
+
+
+def iter_notes(root_dir):
+    """(path, mtime_ns, size) for every .mk file under root_dir."""
+    pending = [root_dir]
+    while pending:
+        folder = pending.pop()
+        try:
+            with os.scandir(folder) as it:
+                for entry in it:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            pending.append(entry.path)
+                        elif entry.name.endswith(".mk") and entry.is_file():
+                            stat = entry.stat()
+                            yield entry.path, stat.st_mtime_ns, stat.st_size
+                    except OSError:
+                        continue
+        except OSError:
+            continue
+
+
+def fts_query(text):
+    # every word has to appear, the last one may still be half typed
+    words = [word.replace('"', '""') for word in text.split()]
+    if not words:
+        return None
+    terms = [f'"{word}"' for word in words]
+    terms[-1] += "*"
+    return " ".join(terms)
+
+
+class NoteIndex:
+    """Inverted index of the notes in one workspace. Safe to use from any thread."""
+
+    def __init__(self, root_dir, db_path=None):
+        self.root_dir = os.path.abspath(root_dir)
+        self.db_path = db_path or default_db_path(self.root_dir)
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        with self._connect() as db:
+            db.executescript(SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        # one short-lived connection per call keeps the worker and Tk threads apart
+        db = sqlite3.connect(self.db_path, timeout=10)
+        try:
+            with db:  # commit, or roll back on error
+                yield db
+        finally:
+            db.close()
+
+    def refresh(self):
+        """Bring the index up to date with the disk. Returns how many notes were re-read."""
+        with self._connect() as db:
+            known = {path: (note_id, mtime, size)
+                     for note_id, path, mtime, size in db.execute("SELECT id, path, mtime_ns, size FROM notes")}
+        changed = []
+        for path, mtime, size in iter_notes(self.root_dir):
+            old = known.pop(path, None)
+            if old is None or old[1:] != (mtime, size):
+                changed.append((path, mtime, size, old[0] if old else None))
+        with self._connect() as db:
+            for note_id, _, _ in known.values():
+                db.execute("DELETE FROM notes WHERE id = ?", (note_id,))
+                db.execute("DELETE FROM notes_fts WHERE rowid = ?", (note_id,))
+        reread = 0
+        for i in range(0, len(changed), COMMIT_EVERY):
+            with self._connect() as db:
+                for path, mtime, size, note_id in changed[i:i + COMMIT_EVERY]:
+                    self._index_note(db, path, mtime, size, note_id)
+            reread += len(changed[i:i + COMMIT_EVERY])
+        return reread
+
+    def _index_note(self, db, path, mtime, size, note_id):
+        try:
+            content = mkformat.load(path).get("content", "")
+        except Exception:
+            content = ""  # not a note we can read, still remember it so it isn't retried
+        if note_id is None:
+            note_id = db.execute("INSERT INTO notes (path, mtime_ns, size) VALUES (?, ?, ?)",
+                                 (path, mtime, size)).lastrowid
+        else:
+            db.execute("UPDATE notes SET mtime_ns = ?, size = ? WHERE id = ?", (mtime, size, note_id))
+            db.execute("DELETE FROM notes_fts WHERE rowid = ?", (note_id,))
+        db.execute("INSERT INTO notes_fts (rowid, content) VALUES (?, ?)", (note_id, content))
+
+    def search(self, text, limit=100):
+        """[(path, snippet), ...] best matches first."""
+        query = fts_query(text)
+        if query is None:
+            return []
+        with self._connect() as db:
+            try:
+                rows = db.execute(
+                    "SELECT notes.path, snippet(notes_fts, 0, '[', ']', '...', 8) "
+                    "FROM notes_fts JOIN notes ON notes.id = notes_fts.rowid "
+                    "WHERE notes_fts MATCH ? ORDER BY rank LIMIT ?",
+                    (query, limit),
+                ).fetchall()
+            except sqlite3.OperationalError:
+                return []
+        return rows
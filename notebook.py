@@ -2,23 +2,95 @@
 import tkinter as tk
 from tkinter.scrolledtext import ScrolledText
 from tkinter import filedialog, messagebox, simpledialog, colorchooser
-import re
+from tkinter import font as tkfont
 from tkinter import ttk
 import os
+import re
 import shutil
-import json
+import time
+import threading
+import queue
+from collections import OrderedDict
+from contextlib import contextmanager
+from highlighter import INLINE_TAGS, LineIndex, MARKDOWN_TAGS, tokenize
+import mkformat
+import autosave
+import note_search
+import find_replace
+import perf
+import dirlist
+from history import History, unpack
+from document import Document
+
+# local formatting kinds -> (tag name prefix, tag option)
+STYLE_KINDS = {
+    "text_color": ("custom_text_color_", "foreground"),
+    "bg_color": ("custom_bg_color_", "background"),
+    "font_size": ("sel_font_", "font"),
+}
 
 class Notebook(tk.Frame):
-    def __init__(self, parent):
+    def __init__(self, parent, sample=True):
         super().__init__(parent)
+        self.sample = sample
         # Global starter style
         self.font_size = 12  
         self.global_text_color = "black"
         self.global_bg_color = "white"
-        # Counters for unique tag names 
-        self.bg_color_tag_count = 0
-        self.text_color_tag_count = 0
-        self.sel_font_tag_count = 0
+        # Local formatting reuses one tag per distinct style, (kind, value) <-> tag name
+        self.style_tags = {}
+        self.style_keys = {}
+        self.style_tag_count = 0
+        # (first, last) line ranges edited since the last highlight pass
+        self._dirty_lines = []
+        # headless copy of the note that every edit to text_widget is mirrored into,
+        # highlighting and saving read from it instead of copying out of Tk
+        self.document = Document()
+        # bumped on every edit, so work done on an older snapshot can tell it's stale
+        self.edit_version = 0
+        self.find_bar = None
+        # undo/redo, recorded in _text_proxy/apply_style/replace_ranges and replayed
+        # through the widget (with _replaying set so replays aren't recorded again)
+        self.history = History()
+        self._replaying = False
+        self._idle_group = None
+        # outline sidebar, drawn from document.headings; folded sections are elided
+        # by one "fold_<heading id>" tag each
+        self.outline_visible = False
+        self._outline_version = None
+        self._outline_levels = None
+        self.folded = set()
+        # Notes longer than viewport_threshold lines only get the visible lines
+        # (plus viewport_margin above and below) tokenized, the rest on scroll.
+        self.viewport_threshold = 5000
+        self.viewport_margin = 100
+        self._viewport_mode = False
+        self._visible_pending = None
+        # Highlight/gutter refreshes wait debounce_ms for the next keystroke, but never
+        # lag more than max_latency_ms behind the first edit of a burst.
+        self.debounce_ms = 40
+        self.max_latency_ms = 150
+        self.refresh_stats = {"requests": 0, "runs": 0, "coalesced": 0}
+        self._refresh_job = None
+        self._refresh_since = None
+        self._pending = set()
+        # (line count, height, visible (line, y) rows) the gutter was last drawn for
+        self._gutter_layout = None
+        self._gutter_pending = None
+        # Notes are decoded on a worker thread and fed into the widget in slices of
+        # at most load_slice_ms per tick so the window keeps painting.
+        self.load_chunk_size = 64 * 1024
+        self.load_slice_ms = 15
+        self._load = None
+        self._load_job = None
+        # Once a note has a file, edits are journaled next to it and a full snapshot
+        # is written in the background after autosave_idle_ms without typing.
+        self.file_path = None
+        self.autosaver = None
+        self.autosave_idle_ms = 2000
+        self._autosave_job = None
+        self._last_edit = 0
+        self.on_path_change = None  # called with the editor when file_path changes
         self.init_ui()
 
     def init_ui(self):
@@ -26,20 +98,28 @@ class Notebook(tk.Frame):
         self.text_frame = tk.Frame(self)
         self.text_frame.pack(fill='both', expand=True)
 
-        # Line number widget. (it exists)
-        self.line_numbers = tk.Text(
-            self.text_frame, width=4, padx=5, wrap='none',
-            font=("Courier", self.font_size), state='disabled',
-            bg='#f0f0f0', fg='gray', relief='flat'
+        # Line number gutter. (it exists) Only the visible lines get drawn on it.
+        self.gutter_font = tkfont.Font(family="Courier", size=self.font_size)
+        self.line_numbers = tk.Canvas(
+            self.text_frame, width=40, bg='#f0f0f0', highlightthickness=0, bd=0
         )
         self.line_numbers.pack(side='left', fill='y')
 
+        # Heading outline, packed left of the gutter by toggle_outline
+        self.outline_tree = ttk.Treeview(self.text_frame, show='tree', selectmode='browse')
+        self.outline_tree.bind('<<TreeviewSelect>>', self.on_outline_select)
+        self.outline_tree.bind('<Double-1>', self.on_outline_double_click)
+
         # Main text widget (ScrolledText) with global colors
         self.text_widget = ScrolledText(
             self.text_frame, wrap='word', font=("Courier", self.font_size),
             foreground=self.global_text_color, background=self.global_bg_color
         )
         self.text_widget.pack(side='right', fill='both', expand=True)
+        self._install_edit_hook()
+        self.configure_tags()
+        self.text_widget.configure(yscrollcommand=self._on_text_scroll)
+        self.text_widget.bind('<Configure>', self.sync_scroll, add='+')
 
         # Toolbar with file, formatting, font size, and color buttons
         toolbar = tk.Frame(self)
@@ -47,6 +127,8 @@ class Notebook(tk.Frame):
 
         # File buttons
         tk.Button(toolbar, text="Save", command=self.save_to_file).pack(side='left')
+        tk.Button(toolbar, text="Undo", command=self.undo).pack(side='left')
+        tk.Button(toolbar, text="Redo", command=self.redo).pack(side='left')
         tk.Button(toolbar, text="Load", command=self.load_from_file).pack(side='left')
         # Markdown formatting buttons
         tk.Button(toolbar, text="B", command=lambda: self.apply_tag("**")).pack(side='left')
@@ -66,9 +148,29 @@ class Notebook(tk.Frame):
         # Global color buttons (persistently update default style)
         tk.Button(toolbar, text="Global Text Color", command=self.global_choose_text_color).pack(side='left')
         tk.Button(toolbar, text="Global BG Color", command=self.global_choose_bg_color).pack(side='left')
+        tk.Button(toolbar, text="Outline", command=self.toggle_outline).pack(side='left')
+
+        # Find/replace, packed by show_find (Ctrl+F)
+        self.find_bar = FindBar(self)
+
+        # Load progress, only packed while a note is streaming in
+        self.load_status = tk.Frame(self)
+        self.load_label = tk.Label(self.load_status, anchor='w')
+        self.load_label.pack(side='left', padx=5)
+        self.load_progress = ttk.Progressbar(self.load_status, mode='determinate', maximum=100)
+        self.load_progress.pack(side='left', fill='x', expand=True, padx=5)
+        tk.Button(self.load_status, text="Cancel", command=self.cancel_load).pack(side='left')
 
         # Bind events 
         self.text_widget.bind('<KeyRelease>', self.on_key_release)
+        self.text_widget.bind('<Control-f>', self.show_find)
+        self.text_widget.bind('<Control-z>', self.undo)
+        self.text_widget.bind('<Control-y>', self.redo)
+        self.text_widget.bind('<Control-Z>', self.redo)
+        self.text_widget.bind('<Button-1>', lambda e: self.history.separator(), add='+')
+        self.text_widget.bind('<<Paste>>', self._group_until_idle, add='+')
+        self.text_widget.bind('<<Cut>>', self._group_until_idle, add='+')
+        self.text_widget.bind('<KeyPress>', self._on_key_press, add='+')
         self.text_widget.bind('<MouseWheel>', self.sync_scroll)
         self.text_widget.bind('<Shift-MouseWheel>', self.sync_scroll)
 
@@ -87,41 +189,194 @@ class Notebook(tk.Frame):
             "~~Deleted Text~~\n"
             "[Email](mailto:example@example.com)\n"
         )
-        self.text_widget.insert("1.0", sample_content)
+        if self.sample:
+            self.text_widget.insert("1.0", sample_content)
+            self.history.clear()
         self.highlight_syntax()
         self.update_line_numbers()
 
     def on_key_release(self, event=None):
-        self.highlight_syntax()
-        self.update_line_numbers()
+        self.schedule_refresh()
+
+    def schedule_refresh(self, highlight=True, gutter=True, full=False):
+        """Queue a highlight and/or line number update, coalescing bursts into one run."""
+        if full:
+            self._pending.add("full")
+        if highlight:
+            self._pending.add("highlight")
+        if gutter:
+            self._pending.add("gutter")
+        self.refresh_stats["requests"] += 1
+        now = time.monotonic()
+        if self._refresh_job is not None:
+            self.after_cancel(self._refresh_job)
+            self.refresh_stats["coalesced"] += 1
+        else:
+            self._refresh_since = now
+        waited = (now - self._refresh_since) * 1000
+        delay = int(min(self.debounce_ms, self.max_latency_ms - waited))
+        if delay > 0:
+            self._refresh_job = self.after(delay, self.flush_refresh)
+        else:
+            self._refresh_job = self.after_idle(self.flush_refresh)
+
+    def flush_refresh(self):
+        """Run whatever schedule_refresh queued right now."""
+        if self._refresh_job is not None:
+            self.after_cancel(self._refresh_job)
+            self._refresh_job = None
+        pending, self._pending = self._pending, set()
+        if not pending:
+            return
+        self.refresh_stats["runs"] += 1
+        if "full" in pending:
+            self.highlight_syntax()
+        elif "highlight" in pending:
+            self.highlight_dirty()
+        if "full" in pending or "highlight" in pending:
+            self.update_outline()
+        if "gutter" in pending:
+            self.update_line_numbers()
 
     def apply_tag(self, tag):
         try:
             start = self.text_widget.index(tk.SEL_FIRST)
             end = self.text_widget.index(tk.SEL_LAST)
-            text = self.text_widget.get(start, end)
-            self.text_widget.delete(start, end)
-            self.text_widget.insert(start, f"{tag}{text}{tag}")
-            self.highlight_syntax()
-            self.update_line_numbers()
+            # only the markers go in, so the selection keeps its styles and undo stays small
+            with self.edit_group():
+                self.text_widget.insert(end, tag)
+                self.text_widget.insert(start, tag)
+            self.schedule_refresh()
         except tk.TclError:
             pass
 
     def apply_heading(self, prefix):
         try:
             line_start = self.text_widget.index(tk.SEL_FIRST).split('.')[0]
-            self.text_widget.insert(f"{line_start}.0", f"{prefix} ")
-            self.highlight_syntax()
-            self.update_line_numbers()
+            with self.edit_group():
+                self.text_widget.insert(f"{line_start}.0", f"{prefix} ")
+            self.schedule_refresh()
         except tk.TclError:
             pass
 
-    def highlight_syntax(self, event=None):
-        # Remove tags related to stuff like bold 
-        for tag in ["heading", "bold", "italic", "strikethrough", "bullet",
-                    "quote", "inline_code", "code_block", "link", "email"]:
-            self.text_widget.tag_remove(tag, "1.0", tk.END)
+    @contextmanager
+    def edit_group(self):
+        """Edits made inside undo as one step."""
+        self.history.begin()
+        try:
+            yield
+        finally:
+            self.history.end()
+
+    def _group_until_idle(self, event=None):
+        # Tk's own bindings (paste, cut, typing over a selection) delete and insert
+        # separately, keep them together as one undo step
+        if self._idle_group is None:
+            self.history.begin()
+            self._idle_group = self.after_idle(self._end_idle_group)
+
+    def _end_idle_group(self):
+        self._idle_group = None
+        self.history.end()
+
+    def _on_key_press(self, event):
+        if (event.char.isprintable() or event.char in "\r\t") and self.text_widget.tag_ranges(tk.SEL):
+            self._group_until_idle()
+
+    def undo(self, event=None):
+        group = self.history.undo() if self._load is None else None
+        if group is not None:
+            self._replay_group(reversed(group.ops), undo=True)
+        return "break"
+
+    def redo(self, event=None):
+        group = self.history.redo() if self._load is None else None
+        if group is not None:
+            self._replay_group(group.ops, undo=False)
+        return "break"
+
+    def _replay_group(self, ops, undo):
+        self._replaying = True
+        cursor = None
+        try:
+            for op in ops:
+                cursor = self._replay_op(op, undo)
+        finally:
+            self._replaying = False
+        self.prune_style_tags()
+        if cursor is not None:
+            index = self.document.index(cursor)
+            self.text_widget.mark_set(tk.INSERT, index)
+            self.text_widget.see(index)
+        self.schedule_refresh()
+
+    def _replay_op(self, op, undo):
+        # returns the char offset to leave the cursor at
+        doc = self.document
+        tw = self.text_widget
+        kind = op[0]
+        if kind in ("insert", "delete"):
+            at, text = op[1], unpack(op[2])
+            if (kind == "insert") == undo:
+                tw.delete(doc.index(at), doc.index(at + len(text)))
+                return at
+            tw.insert(doc.index(at), text)
+            for style_kind, value, start, end in (op[3] if kind == "delete" else ()):
+                self.apply_style(style_kind, value, doc.index(at + start), doc.index(at + end), prune=False)
+            return at + len(text)
+        if kind == "style":
+            _, style_kind, value, start, end, before = op
+            if not undo:
+                self.apply_style(style_kind, value, doc.index(start), doc.index(end), prune=False)
+                return end
+            self.remove_style(style_kind, doc.index(start), doc.index(end))
+            for old_value, s, e in before:
+                self.apply_style(style_kind, old_value, doc.index(s), doc.index(e), prune=False)
+            return end
+        _, replacements, inverse, styles = op
+        if undo:
+            self.replace_ranges(inverse, styles=styles)
+            return inverse[0][0]
+        self.replace_ranges(replacements)
+        return replacements[0][0]
+
+    def _recording(self):
+        return self._load is None and not self._replaying
+
+    def _undo_ops(self, args):
+        # what an insert/delete/replace is about to do, as history ops
+        doc = self.document
 
+        def offset(i):
+            return doc.offset(str(self.tk.call(self._text_cmd, "index", i)))
+        op = args[0]
+        if op == "insert":
+            text = "".join(args[2::2])
+            return [("insert", offset(args[1]), text)] if text else []
+        if op == "replace":
+            pairs = [(args[1], args[2])]
+        else:
+            indices = list(args[1:])
+            if len(indices) % 2:
+                indices.append(f"{indices[-1]}+1c")
+            pairs = list(zip(indices[::2], indices[1::2]))
+        # last range first, same as the journal
+        spans = sorted(((offset(a), offset(b)) for a, b in pairs), reverse=True)
+        ops = [("delete", start, doc.text(start, end), self._styles_in(start, end))
+               for start, end in spans if start < end]
+        if op == "replace":
+            text = "".join(args[3::2])
+            if text:
+                ops.append(("insert", spans[-1][0], text))
+        return ops
+
+    def _styles_in(self, start, end):
+        # local styles over start..end, relative to start
+        return [(kind, value, max(s, start) - start, min(e, end) - start)
+                for (kind, value), spans in self.document.styles.spans.items()
+                for s, e in spans if s < end and e > start]
+
+    def configure_tags(self):
         # these are tags probs i dunno ask greg
         self.text_widget.tag_configure("heading", foreground="blue", font=("Courier", self.font_size+2, "bold"))
         self.text_widget.tag_configure("bold", foreground="darkred", font=("Courier", self.font_size, "bold"))
@@ -134,142 +389,631 @@ class Notebook(tk.Frame):
         self.text_widget.tag_configure("link", foreground="blue", underline=True, font=("Courier", self.font_size))
         self.text_widget.tag_configure("email", foreground="blue", underline=True, font=("Courier", self.font_size))
 
+    @perf.timed("highlight_syntax")
+    def highlight_syntax(self, event=None):
+        """Re-tokenize the whole buffer. Typing goes through highlight_dirty instead."""
+        self._dirty_lines = []
+        last_line = self._last_line()
+        self._viewport_mode = last_line > self.viewport_threshold
+        if self._viewport_mode:
+            for tag in INLINE_TAGS + ["highlighted"]:
+                self.text_widget.tag_remove(tag, "1.0", tk.END)
+            # fences are paired over the whole note so blocks cut by the viewport still render
+            self._rescan_code_blocks(1, last_line)
+            self.highlight_visible()
+        else:
+            self._highlight_lines(1, last_line, MARKDOWN_TAGS)
+
+    def highlight_dirty(self, event=None):
+        """Re-tokenize only the lines edited since the last highlight pass."""
+        if not self._dirty_lines:
+            return
+        last_line = self._last_line()
+        ranges = sorted((max(1, lo), min(hi, last_line)) for lo, hi in self._dirty_lines)
+        self._dirty_lines = []
+        merged = [list(ranges[0])]
+        for lo, hi in ranges[1:]:
+            if lo <= merged[-1][1] + 1:
+                merged[-1][1] = max(merged[-1][1], hi)
+            else:
+                merged.append([lo, hi])
+        for lo, hi in merged:
+            if self._viewport_mode:
+                # off-screen edits are picked up by highlight_visible when scrolled to
+                self.text_widget.tag_remove("highlighted", f"{lo}.0", f"{hi + 1}.0")
+            else:
+                self._highlight_lines(lo, hi, INLINE_TAGS)
+        self._rescan_code_blocks(merged[0][0], merged[-1][1])
+        if self._viewport_mode:
+            self.highlight_visible()
+
+    def highlight_visible(self, event=None):
+        """Tokenize the on-screen lines (plus viewport_margin) that haven't been yet."""
+        self._visible_pending = None
+        if not self._viewport_mode:
+            return
+        tw = self.text_widget
+        first = int(tw.index("@0,0").split('.')[0]) - self.viewport_margin
+        last = int(tw.index(f"@0,{tw.winfo_height()}").split('.')[0]) + self.viewport_margin
+        pos = tw.index(f"{max(first, 1)}.0")
+        end = tw.index(f"{min(last, self._last_line()) + 1}.0")
+        # lines already tokenized carry the (unstyled) "highlighted" tag, fill the gaps
+        while tw.compare(pos, "<", end):
+            done = tw.tag_nextrange("highlighted", pos, end)
+            stop = tw.index(done[0]) if done else end
+            if tw.compare(pos, "<", stop):
+                lo = int(pos.split('.')[0])
+                line, col = map(int, stop.split('.'))
+                hi = line - 1 if col == 0 else line
+                self._highlight_lines(lo, hi, INLINE_TAGS)
+                tw.tag_add("highlighted", f"{lo}.0", f"{hi + 1}.0")
+            if not done:
+                break
+            pos = tw.index(done[1])
+
+    def _on_text_scroll(self, first, last):
+        self.text_widget.vbar.set(first, last)
+        self.sync_scroll()
+        if self._viewport_mode and self._visible_pending is None:
+            self._visible_pending = self.after_idle(self.highlight_visible)
+
+    def _highlight_lines(self, first_line, last_line, tags):
+        start = f"{first_line}.0"
+        end = f"{last_line}.end"
+        for tag in tags:
+            self.text_widget.tag_remove(tag, start, end)
         # computer magic
-        text = self.text_widget.get("1.0", tk.END)
-        patterns = {
-            "heading": r"^(#{1,6})\s+.*$",
-            "bold": r"\*\*(.+?)\*\*",
-            "italic": r"\*(.+?)\*",
-            "strikethrough": r"~~(.+?)~~",
-            "bullet": r"^- .*$",
-            "quote": r"^> .*$",
-            "code_block": r"```[\s\S]+?```",
-            "inline_code": r"`(.+?)`",
-            "link": r"\[([^\]]+)\]\((https?://[^\)]+)\)",
-            "email": r"\[([^\]]+)\]\((mailto:[^)]+)\)",
-        }
-        for tag, pattern in patterns.items():
-            for match in re.finditer(pattern, text, re.MULTILINE):
-                start_index = f"1.0+{match.start()}c"
-                end_index = f"1.0+{match.end()}c"
-                self.text_widget.tag_add(tag, start_index, end_index)
+        text = self.document.lines_text(first_line, last_line)
+        if tags is INLINE_TAGS:
+            tokens = self.document.inline_tokens(first_line, last_line)
+        else:
+            tokens = tokenize(text)
+        lines = LineIndex(text, first_line)
+        for tag in tags:
+            if tokens[tag]:
+                self.text_widget.tag_add(tag, *lines.flatten(tokens[tag]))
+
+    def _rescan_code_blocks(self, first_line, last_line):
+        # Fences pair up in document order, so one typed ``` can flip every block
+        # below it. Re-pair from the block the edit sits in and stop as soon as an
+        # opener past the edit already started a block before (the rest is unchanged).
+        # The fences come from document.fences, a bisect rather than a widget search
+        # to the end of the note on every key.
+        tw = self.text_widget
+        pos = f"{first_line}.0"
+        prev = tw.tag_prevrange("code_block", f"{pos}+1c")
+        if prev and tw.compare(prev[1], ">", pos):
+            pos = tw.index(prev[0])
+        fences = self.document.fences.positions
+        i = self.document.fences.after(*map(int, pos.split(".")))
+        blocks = []
+        stop = tk.END
+        while i < len(fences):
+            line, col = fences[i]
+            opener = f"{line}.{col}"
+            if line > last_line and self._starts_code_block(opener):
+                stop = opener
+                break
+            # the closer needs something between it and the opener, like pair_fences
+            i += 1
+            if i < len(fences) and fences[i] == (line, col + 3):
+                i += 1
+            if i >= len(fences):
+                break
+            line, col = fences[i]
+            blocks.append((opener, f"{line}.{col + 3}"))
+            i += 1
+        tw.tag_remove("code_block", pos, stop)
+        for start, end in blocks:
+            tw.tag_add("code_block", start, end)
+
+    def _starts_code_block(self, index):
+        if "code_block" not in self.text_widget.tag_names(index):
+            return False
+        return (self.text_widget.compare(index, "==", "1.0")
+                or "code_block" not in self.text_widget.tag_names(f"{index}-1c"))
+
+    def _last_line(self):
+        return self.document.line_count()
+
+    def _install_edit_hook(self):
+        # Route the text widget's Tcl command through _text_proxy so every insert/delete
+        # (typing, paste, our own formatting edits) marks the lines it touched as dirty.
+        widget = str(self.text_widget)
+        self._text_cmd = widget + "_orig"
+        self.tk.call("rename", widget, self._text_cmd)
+        self.tk.createcommand(widget, self._text_proxy)
+
+    def _text_proxy(self, *args):
+        if not args or args[0] not in ("insert", "delete", "replace"):
+            return self.tk.call((self._text_cmd,) + args)
+        if str(self.tk.call(self._text_cmd, "cget", "-state")) == "disabled":
+            return self.tk.call((self._text_cmd,) + args)  # Tk ignores the edit
+        undo_ops = ()
+        try:
+            span = self._note_edit(args)
+            if self.autosaver is not None and self._load is None:
+                self._journal_edit(args)
+            if self._recording():
+                undo_ops = self._undo_ops(args)
+        except tk.TclError:
+            span = None  # bad index, let the real call below raise it
+        result = self.tk.call((self._text_cmd,) + args)
+        for op in undo_ops:
+            self.history.record(op)
+        if span is not None:
+            # read the touched lines back so the document matches Tk char for char
+            first, last, added = span
+            text = self.tk.call(self._text_cmd, "get", f"{first}.0", f"{last + added}.end")
+            self.document.replace_lines(first, last, str(text))
+            self._edited()
+        return result
+
+    def _edited(self):
+        self.edit_version += 1
+        if self.find_bar is not None and self.find_bar.active:
+            self.find_bar.buffer_changed()
+
+    def replace_ranges(self, replacements, tk_args=None, styles=None):
+        """Replace-all as one grouped edit.
+
+        replacements are (start, end, new text) char ranges of the current buffer,
+        sorted and not overlapping. The widget gets them in a single Tcl loop and
+        the document is rebuilt once, instead of one proxied edit per match.
+        styles ({(kind, value): [(start, end), ...]}) replaces the local styles over
+        the replaced stretch afterwards, undo uses it to put them back.
+        """
+        if not replacements or self._load is not None:
+            return
+        doc = self.document
+        # a replace-all over most of the note is redone whole, anything smaller (an
+        # undo or redo of one, say) costs what it changes
+        whole = doc.rebuilds(len(replacements))
+        if tk_args is None:
+            tk_args = (find_replace.tk_script_args(doc.text(), replacements) if whole
+                       else self._tk_replace_args(replacements))
+        if self._recording():
+            self.history.record(("ranges", replacements, self._inverse_ranges(replacements),
+                                 self._style_spans(replacements[0][0], replacements[-1][1])))
+        if not whole:
+            self._note_replacements(replacements, tk_args)
+        self.tk.call("set", "::mk_replace", tuple(tk_args))
+        try:
+            self.tk.eval(f"foreach {{a b t}} $::mk_replace {{{self._text_cmd} replace $a $b $t}}")
+        finally:
+            self.tk.call("unset", "::mk_replace")
+        doc.replace_ranges(replacements)
+        shift = sum(len(new) - (end - start) for start, end, new in replacements)
+        lo, hi = replacements[0][0], replacements[-1][1] + shift
+        if styles is not None:
+            for key in list(doc.styles.spans):
+                doc.styles.remove(key, lo, hi)
+            for key, spans in styles.items():
+                for start, end in spans:
+                    doc.styles.add(key, start, end)
+        # Tk styles the new text match by match, the document's rule wins
+        self._sync_style_tags(lo, hi)
+        self.prune_style_tags()
+        self._edited()
+        if not whole:
+            self.schedule_refresh()
+            return
+        self.schedule_refresh(full=True)
+        if self.autosaver is not None:
+            # one snapshot instead of journaling every match
+            self._last_edit = time.monotonic()
+            self.autosaver.snapshot(self.note_data())
+
+    def _tk_replace_args(self, replacements):
+        # tk_script_args without indexing the whole note, last replacement first
+        doc = self.document
+        flat = []
+        for start, end, new in reversed(replacements):
+            flat += [doc.index(start), doc.index(end), new]
+        return flat
+
+    def _note_replacements(self, replacements, tk_args):
+        # what _note_edit and _journal_edit do for a proxied edit, for each range
+        # about to be replaced (tk_args has them last first, as Tk applies them)
+        doc = self.document
+        for start, end, new in reversed(replacements):
+            first, last = doc.buffer.line_of(start) + 1, doc.buffer.line_of(end) + 1
+            added = new.count("\n")
+            self._shift_dirty(first, last, first - last)
+            self._shift_dirty(first, first, added)
+            self._dirty_lines.append((first, first + added))
+        if self.autosaver is not None and self._load is None:
+            self._last_edit = time.monotonic()
+            for i in range(0, len(tk_args), 3):
+                if tk_args[i] != tk_args[i + 1]:
+                    self.autosaver.record({"op": "delete", "from": tk_args[i], "to": tk_args[i + 1]})
+                if tk_args[i + 2]:
+                    self.autosaver.record({"op": "insert", "at": tk_args[i], "text": tk_args[i + 2]})
+
+    def _inverse_ranges(self, replacements):
+        # the replacements that turn the result back into what's there now
+        doc = self.document
+        inverse = []
+        shift = 0
+        for start, end, new in replacements:
+            inverse.append((start + shift, start + shift + len(new), doc.text(start, end)))
+            shift += len(new) - (end - start)
+        return inverse
+
+    def _style_spans(self, start, end):
+        spans = {}
+        for key, key_spans in self.document.styles.spans.items():
+            inside = [(max(s, start), min(e, end)) for s, e in key_spans if s < end and e > start]
+            if inside:
+                spans[key] = inside
+        return spans
+
+    def _sync_style_tags(self, start, end):
+        """Redo the style tags between two char offsets from document.styles."""
+        doc = self.document
+        first, last = doc.index(start), doc.index(end)
+        for tag in self.style_tags.values():
+            self.text_widget.tag_remove(tag, first, last)
+        for (kind, value), spans in doc.styles.spans.items():
+            indices = []
+            for s, e in spans:
+                s, e = max(s, start), min(e, end)
+                if s < e:
+                    indices += [doc.index(s), doc.index(e)]
+            if indices:
+                self.text_widget.tag_add(self.style_tag(kind, value), *indices)
+
+    def show_find(self, event=None):
+        self.find_bar.show()
+        return "break"
 
+    def _journal_edit(self, args):
+        def index(i):
+            return str(self.tk.call(self._text_cmd, "index", i))
+        op = args[0]
+        self._last_edit = time.monotonic()
+        if op == "insert":
+            self.autosaver.record({"op": "insert", "at": index(args[1]), "text": "".join(args[2::2])})
+            return
+        if op == "replace":
+            pairs = [(args[1], args[2])]
+        else:
+            indices = list(args[1:])
+            if len(indices) % 2:
+                indices.append(f"{indices[-1]}+1c")
+            pairs = list(zip(indices[::2], indices[1::2]))
+        # last range first, so replaying them one by one deletes the same text
+        spans = sorted(((index(a), index(b)) for a, b in pairs),
+                       key=lambda span: tuple(map(int, span[0].split('.'))), reverse=True)
+        for start, end in spans:
+            self.autosaver.record({"op": "delete", "from": start, "to": end})
+        if op == "replace":
+            self.autosaver.record({"op": "insert", "at": spans[0][0], "text": "".join(args[3::2])})
+
+    def _edit_line(self, index):
+        index = self.tk.call(self._text_cmd, "index", index)
+        end = self.tk.call(self._text_cmd, "index", "end")
+        if str(index) == str(end):
+            index = self.tk.call(self._text_cmd, "index", "end-1c")
+        return int(str(index).split('.')[0])
+
+    def _note_edit(self, args):
+        # mark the lines an edit touches as dirty, returns them as (first, last, lines added)
+        op = args[0]
+        if op == "insert":
+            line = self._edit_line(args[1])
+            added = sum(chunk.count("\n") for chunk in args[2::2])
+            self._shift_dirty(line, line, added)
+            self._dirty_lines.append((line, line + added))
+            return line, line, added
+        if op == "replace":
+            pairs = [(args[1], args[2])]
+            added = sum(chunk.count("\n") for chunk in args[3::2])
+        else:
+            indices = list(args[1:])
+            if len(indices) % 2:
+                indices.append(f"{indices[-1]}+1c")
+            pairs = list(zip(indices[::2], indices[1::2]))
+            added = 0
+        spans = sorted(((self._edit_line(a), self._edit_line(b)) for a, b in pairs), reverse=True)
+        for first, last in spans:
+            self._shift_dirty(first, last, first - last)
+        line = spans[-1][0]
+        self._shift_dirty(line, line, added)
+        self._dirty_lines.append((line, line + added))
+        removed = sum(last - first for first, last in spans)
+        return line, max(last for _, last in spans), added - removed
+
+    def _shift_dirty(self, first, last, delta):
+        # keep pending dirty ranges pointing at the same text after lines
+        # first..last collapse (delta < 0) or new lines appear after first (delta > 0)
+        def move(line):
+            if line > last:
+                return line + delta
+            if line > first:
+                return first
+            return line
+        self._dirty_lines = [(move(lo), move(hi)) for lo, hi in self._dirty_lines]
+
+    @perf.timed("update_line_numbers")
     def update_line_numbers(self, event=None):
-        self.line_numbers.config(state='normal')
-        self.line_numbers.delete('1.0', tk.END)
-        line_count = int(self.text_widget.index('end-1c').split('.')[0])
-        self.line_numbers.insert('1.0', "\n".join(str(i) for i in range(1, line_count + 1)))
-        self.line_numbers.config(state='disabled')
-
-    def sync_scroll(self, event):
-        self.line_numbers.yview_moveto(self.text_widget.yview()[0])
+        """Draw numbers for the visible lines, unless the layout is the same as last time."""
+        self._gutter_pending = None
+        tw = self.text_widget
+        line_count = self._last_line()
+        rows = []
+        # walk the logical lines on screen, dlineinfo gives the y of each (wrapped) line
+        index = tw.index("@0,0")
+        while True:
+            info = tw.dlineinfo(index)
+            if info is None:
+                # a folded section has no display lines, carry on after it
+                folds = [tag for tag in tw.tag_names(index) if tag.startswith("fold_")]
+                if not folds:
+                    break
+                # the fold stops at the end of its last line, skip that newline too
+                next_index = tw.index(f"{tw.tag_prevrange(folds[0], f'{index}+1c')[1]}+1c")
+                if not tw.compare(next_index, ">", index):
+                    break
+                index = next_index
+                continue
+            rows.append((index.split('.')[0], info[1]))
+            next_index = tw.index(f"{index}+1line linestart")
+            if next_index == index:
+                break
+            index = next_index
+        layout = (line_count, tw.winfo_height(), tuple(rows))
+        if layout == self._gutter_layout:
+            return
+        self._gutter_layout = layout
+        width = self.gutter_font.measure(str(line_count)) + 10
+        if int(self.line_numbers.cget("width")) != width:
+            self.line_numbers.config(width=width)
+        self.line_numbers.delete("all")
+        for line, y in rows:
+            self.line_numbers.create_text(width - 5, y, anchor='ne', text=line,
+                                          font=self.gutter_font, fill='gray')
+
+    def sync_scroll(self, event=None):
+        # the gutter follows the text on the next idle moment, however it was scrolled
+        if self._gutter_pending is None:
+            self._gutter_pending = self.after_idle(self.update_line_numbers)
+
+    def toggle_outline(self):
+        if self.outline_visible:
+            self.outline_tree.pack_forget()
+            self.outline_visible = False
+            return
+        self.outline_tree.pack(side='left', fill='y', before=self.line_numbers)
+        self.outline_visible = True
+        self._outline_version = None
+        self.update_outline()
+
+    def update_outline(self):
+        """Bring the sidebar in line with document.headings, if any heading changed."""
+        headings = self.document.headings
+        self._prune_folds()
+        if not self.outline_visible or headings.version == self._outline_version:
+            return
+        self._outline_version = headings.version
+        tree = self.outline_tree
+        levels = (tuple(headings.levels), tuple(headings.ids))
+        if levels == self._outline_levels:
+            # same headings, only titles changed
+            for heading_id, title in zip(headings.ids, headings.titles):
+                tree.item(heading_id, text=self._outline_text(heading_id, title))
+            return
+        self._outline_levels = levels
+        tree.delete(*tree.get_children())
+        parents = []  # (level, item) of the open sections above
+        for heading_id, level, title in zip(headings.ids, headings.levels, headings.titles):
+            while parents and parents[-1][0] >= level:
+                parents.pop()
+            parent = parents[-1][1] if parents else ''
+            tree.insert(parent, 'end', iid=heading_id, text=self._outline_text(heading_id, title), open=True)
+            parents.append((level, heading_id))
+
+    def _outline_text(self, heading_id, title):
+        return f"\u25b8 {title}" if heading_id in self.folded else title
+
+    def on_outline_select(self, event=None):
+        selection = self.outline_tree.selection()
+        if selection:
+            self.goto_heading(int(selection[0]))
+
+    def on_outline_double_click(self, event=None):
+        item = self.outline_tree.identify_row(event.y)
+        if item:
+            self.toggle_fold(int(item))
         return "break"
 
+    def goto_heading(self, heading_id):
+        i = self.document.headings.position(heading_id)
+        if i is None:
+            return
+        index = f"{self.document.headings.lines[i]}.0"
+        self.text_widget.mark_set(tk.INSERT, index)
+        self.text_widget.see(index)
+
+    def toggle_fold(self, heading_id):
+        """Hide or show everything under a heading up to the next one at its level or above."""
+        headings = self.document.headings
+        i = headings.position(heading_id)
+        if i is None:
+            return
+        tag = f"fold_{heading_id}"
+        if heading_id in self.folded:
+            self.text_widget.tag_delete(tag)
+            self.folded.discard(heading_id)
+        else:
+            line = headings.lines[i]
+            end = headings.section_end(i) or self._last_line()
+            if end <= line:
+                return  # nothing under it
+            self.text_widget.tag_configure(tag, elide=True)
+            self.text_widget.tag_add(tag, f"{line}.end", f"{end}.end")
+            self.folded.add(heading_id)
+        if self.outline_visible:
+            self.outline_tree.item(heading_id, text=self._outline_text(heading_id, headings.titles[i]))
+        self.schedule_refresh(highlight=False)
+
+    def _prune_folds(self):
+        # a fold whose heading was deleted would hide its text for good
+        for heading_id in list(self.folded):
+            if self.document.headings.position(heading_id) is None:
+                self.text_widget.tag_delete(f"fold_{heading_id}")
+                self.folded.discard(heading_id)
+
     def update_fonts(self):
         """Update global font and colors for the text widget and refresh syntax tags."""
         self.text_widget.config(font=("Courier", self.font_size), 
                                 foreground=self.global_text_color, background=self.global_bg_color)
-        self.line_numbers.config(font=("Courier", self.font_size))
-        self.highlight_syntax()
+        self.gutter_font.configure(size=self.font_size)
+        self._gutter_layout = None
+        self.configure_tags()
 
     def increase_font_size(self):
         self.font_size += 1
         self.update_fonts()
-        self.update_line_numbers()
+        self.schedule_refresh(highlight=False)
 
     def decrease_font_size(self):
         if self.font_size > 6:
             self.font_size -= 1
             self.update_fonts()
-            self.update_line_numbers()
+            self.schedule_refresh(highlight=False)
 
-    def choose_text_color(self):
+    def get_selection(self):
         try:
-            start = self.text_widget.index(tk.SEL_FIRST)
-            end = self.text_widget.index(tk.SEL_LAST)
+            return self.text_widget.index(tk.SEL_FIRST), self.text_widget.index(tk.SEL_LAST)
         except tk.TclError:
             messagebox.showinfo("Selection Required")
+            return None
+
+    def choose_text_color(self):
+        selection = self.get_selection()
+        if not selection:
             return
         color = colorchooser.askcolor(title="Choose text color")[1]
         if color:
-            tag_name = f"custom_text_color_{self.text_color_tag_count}"
-            self.text_color_tag_count += 1
-            self.text_widget.tag_add(tag_name, start, end)
-            self.text_widget.tag_configure(tag_name, foreground=color)
+            self.apply_style("text_color", color, *selection)
 
     def choose_bg_color(self):
-        try:
-            start = self.text_widget.index(tk.SEL_FIRST)
-            end = self.text_widget.index(tk.SEL_LAST)
-        except tk.TclError:
-            messagebox.showinfo("Selection Required")
+        selection = self.get_selection()
+        if not selection:
             return
         color = colorchooser.askcolor(title="Choose background color")[1]
         if color:
-            tag_name = f"custom_bg_color_{self.bg_color_tag_count}"
-            self.bg_color_tag_count += 1
-            self.text_widget.tag_add(tag_name, start, end)
-            self.text_widget.tag_configure(tag_name, background=color)
+            self.apply_style("bg_color", color, *selection)
 
     def increase_selection_font_size(self):
-        try:
-            start = self.text_widget.index(tk.SEL_FIRST)
-            end = self.text_widget.index(tk.SEL_LAST)
-        except tk.TclError:
-            messagebox.showinfo("Selection Required")
-            return
-        current_tags = self.text_widget.tag_names(start)
-        current_size = None
-        for tag in current_tags:
-            if tag.startswith("sel_font_"):
-                font_str = self.text_widget.tag_cget(tag, "font")
-                parts = font_str.split()
-                if len(parts) >= 2:
-                    try:
-                        current_size = int(parts[1])
-                        break
-                    except ValueError:
-                        pass
-        if current_size is None:
-            current_size = self.font_size
-        new_size = current_size + 2
-        for tag in self.text_widget.tag_names():
-            if tag.startswith("sel_font_"):
-                self.text_widget.tag_remove(tag, start, end)
-        tag_name = f"sel_font_{self.sel_font_tag_count}"
-        self.sel_font_tag_count += 1
-        self.text_widget.tag_add(tag_name, start, end)
-        self.text_widget.tag_configure(tag_name, font=("Courier", new_size))
+        selection = self.get_selection()
+        if selection:
+            self.apply_style("font_size", self.selection_font_size(selection[0]) + 2, *selection)
 
     def decrease_selection_font_size(self):
-        try:
-            start = self.text_widget.index(tk.SEL_FIRST)
-            end = self.text_widget.index(tk.SEL_LAST)
-        except tk.TclError:
-            messagebox.showinfo("Selection Required")
-            return
-        current_tags = self.text_widget.tag_names(start)
-        current_size = None
-        for tag in current_tags:
-            if tag.startswith("sel_font_"):
-                font_str = self.text_widget.tag_cget(tag, "font")
-                parts = font_str.split()
-                if len(parts) >= 2:
-                    try:
-                        current_size = int(parts[1])
-                        break
-                    except ValueError:
-                        pass
-        if current_size is None:
-            current_size = self.font_size
-        new_size = current_size - 2 if current_size > 6 else current_size
-        for tag in self.text_widget.tag_names():
-            if tag.startswith("sel_font_"):
+        selection = self.get_selection()
+        if selection:
+            current_size = self.selection_font_size(selection[0])
+            new_size = current_size - 2 if current_size > 6 else current_size
+            self.apply_style("font_size", new_size, *selection)
+
+    def selection_font_size(self, index):
+        for tag in self.text_widget.tag_names(index):
+            kind, value = self.style_keys.get(tag, (None, None))
+            if kind == "font_size":
+                return value
+        return self.font_size
+
+    def style_tag(self, kind, value):
+        """The one tag for this style, created on first use."""
+        tag = self.style_tags.get((kind, value))
+        if tag is None:
+            prefix, option = STYLE_KINDS[kind]
+            tag = f"{prefix}{self.style_tag_count}"
+            self.style_tag_count += 1
+            config = ("Courier", value) if kind == "font_size" else value
+            self.text_widget.tag_configure(tag, **{option: config})
+            self.style_tags[(kind, value)] = tag
+            self.style_keys[tag] = (kind, value)
+        return tag
+
+    def apply_style(self, kind, value, start, end, prune=True):
+        # a range only keeps one style of each kind, so the newest choice always shows
+        # and Tk can merge it with neighbouring text of the same style
+        if self._recording():
+            s, e = self.document.offset(start), self.document.offset(end)
+            before = [(other_value, max(a, s), min(b, e))
+                      for (other_kind, other_value), spans in self.document.styles.spans.items()
+                      if other_kind == kind for a, b in spans if a < e and b > s]
+            self.history.record(("style", kind, value, s, e, before))
+        for (other_kind, _), tag in self.style_tags.items():
+            if other_kind == kind:
                 self.text_widget.tag_remove(tag, start, end)
-        tag_name = f"sel_font_{self.sel_font_tag_count}"
-        self.sel_font_tag_count += 1
-        self.text_widget.tag_add(tag_name, start, end)
-        self.text_widget.tag_configure(tag_name, font=("Courier", new_size))
+        self.text_widget.tag_add(self.style_tag(kind, value), start, end)
+        self.document.styles.add((kind, value), self.document.offset(start), self.document.offset(end))
+        if prune:
+            self.prune_style_tags()
+        if self.autosaver is not None and self._load is None:
+            self._last_edit = time.monotonic()
+            self.autosaver.record({"op": "style", "kind": kind, "value": value,
+                                   "from": str(start), "to": str(end)})
+
+    def remove_style(self, kind, start, end):
+        """Strip every local style of this kind from start..end."""
+        s, e = self.document.offset(start), self.document.offset(end)
+        for (other_kind, value), tag in self.style_tags.items():
+            if other_kind == kind:
+                self.text_widget.tag_remove(tag, start, end)
+                self.document.styles.remove((kind, value), s, e)
+        if self.autosaver is not None and self._load is None:
+            self._last_edit = time.monotonic()
+            self.autosaver.record({"op": "unstyle", "kind": kind, "from": str(start), "to": str(end)})
+
+    def prune_style_tags(self):
+        """Drop style tags that no longer cover any text."""
+        for key, tag in list(self.style_tags.items()):
+            if not self.text_widget.tag_nextrange(tag, "1.0"):
+                self.text_widget.tag_delete(tag)
+                del self.style_tags[key]
+                del self.style_keys[tag]
+
+    def persistent_tags(self):
+        self.prune_style_tags()
+        persistent_tags = []
+        for (kind, value), tag in self.style_tags.items():
+            tag_ranges = self.text_widget.tag_ranges(tag)
+            ranges = [(str(tag_ranges[i]), str(tag_ranges[i+1])) for i in range(0, len(tag_ranges), 2)]
+            option = STYLE_KINDS[kind][1]
+            config = {option: f"Courier {value}" if kind == "font_size" else value}
+            persistent_tags.append({"tag": tag, "ranges": ranges, "config": config})
+        return persistent_tags
+
+    def style_ranges(self, tags_data):
+        """Saved persistent_tags -> [((kind, value), start, end), ...] in the order to apply them.
+
+        Older files carry one tag per use, styles that match end up sharing a tag again.
+        """
+        styles = []
+        for tag_data in tags_data:
+            key = self.style_key(tag_data["tag"], tag_data.get("config", {}))
+            if key is not None:
+                styles.extend((key, start, end) for (start, end) in tag_data.get("ranges", []))
+        return styles
+
+    def style_key(self, tag, config):
+        for kind, (prefix, option) in STYLE_KINDS.items():
+            value = config.get(option)
+            if not tag.startswith(prefix) or not value:
+                continue
+            if kind != "font_size":
+                return kind, value
+            parts = value.split() if isinstance(value, str) else list(value)
+            try:
+                return kind, int(parts[1])
+            except (IndexError, ValueError):
+                return None
+        return None
 
     def global_choose_text_color(self):
         color = colorchooser.askcolor(title="Choose Global Text Color")[1]
@@ -291,106 +1035,595 @@ class Notebook(tk.Frame):
             defaultextension=".mk", filetypes=[("MK Files", "*.mk"), ("All Files", "*.*")]
         )
         if file_path:
-            content = self.text_widget.get("1.0", "end-1c")
-            # Collect tags data
-            persistent_tags = []
-            for tag in self.text_widget.tag_names():
-                if (tag.startswith("custom_text_color_") or 
-                    tag.startswith("custom_bg_color_") or 
-                    tag.startswith("sel_font_")):
-                    ranges = []
-                    tag_ranges = self.text_widget.tag_ranges(tag)
-                    for i in range(0, len(tag_ranges), 2):
-                        start = str(tag_ranges[i])
-                        end = str(tag_ranges[i+1])
-                        ranges.append((start, end))
-                    # Get configuration for options we care about
-                    config = {}
-                    for opt in ["foreground", "background", "font"]:
-                        value = self.text_widget.tag_cget(tag, opt)
-                        if value:
-                            config[opt] = value
-                    persistent_tags.append({"tag": tag, "ranges": ranges, "config": config})
-            data = {
-                "global": {
-                    "font_size": self.font_size,
-                    "global_text_color": self.global_text_color,
-                    "global_bg_color": self.global_bg_color,
-                },
-                "content": content,
-                "persistent_tags": persistent_tags,
-            }
-            try:
-                with open(file_path, "w") as f:
-                    json.dump(data, f)
-            except Exception as e:
-                messagebox.showerror("Error", f"Failed to save file: {e}")
+            self.save_note(file_path)
+
+    def save_note(self, file_path):
+        # written by the autosave thread, errors show up on the next autosave tick
+        if file_path != self.file_path:
+            self.start_autosave(file_path)
+        self.autosaver.snapshot(self.note_data())
+
+    def note_data(self):
+        return {
+            "global": {
+                "font_size": self.font_size,
+                "global_text_color": self.global_text_color,
+                "global_bg_color": self.global_bg_color,
+            },
+            "content": self.document.text(),
+            "persistent_tags": self.persistent_tags(),
+        }
+
+    def start_autosave(self, file_path):
+        self.stop_autosave()
+        self.file_path = file_path
+        self.autosaver = autosave.Autosaver(file_path)
+        self._autosave_job = self.after(1000, self._autosave_tick)
+        if self.on_path_change is not None:
+            self.on_path_change(self)
+
+    def stop_autosave(self, wait=False):
+        """Stop autosaving the current note. What's queued still gets written, wait=True
+        waits for that (app exit only, it blocks for a whole save)."""
+        if self._autosave_job is not None:
+            self.after_cancel(self._autosave_job)
+            self._autosave_job = None
+        if self.autosaver is not None:
+            self.autosaver.close(wait=wait)
+            self.autosaver = None
+
+    def _autosave_tick(self):
+        saver = self.autosaver
+        if saver.error is not None:
+            error, saver.error = saver.error, None
+            messagebox.showerror("Error", f"Failed to save file: {error}")
+        idle = time.monotonic() - self._last_edit >= self.autosave_idle_ms / 1000
+        if saver.changes and idle and self._load is None:
+            saver.snapshot(self.note_data())
+        self._autosave_job = self.after(1000, self._autosave_tick)
+
+    def replay_journal(self, changes):
+        """Re-apply edits an earlier session journaled but never got to save."""
+        for change in changes:
+            op = change.get("op")
+            if op == "insert":
+                self.text_widget.insert(change["at"], change["text"])
+            elif op == "delete":
+                self.text_widget.delete(change["from"], change["to"])
+            elif op == "style":
+                self.apply_style(change["kind"], change["value"], change["from"], change["to"], prune=False)
+            elif op == "unstyle":
+                self.remove_style(change["kind"], change["from"], change["to"])
+
+    def view_state(self):
+        """(scroll fraction, cursor index), what open_blob needs to put the view back."""
+        return self.text_widget.yview()[0], self.text_widget.index(tk.INSERT)
+
+    def footprint(self):
+        """Rough bytes held for this note: Tk's copy of the text, the document, caches and undo."""
+        return len(self.document) * 16 + len(self.document.tokens) * 200 + self.history.size
+
+    def close(self):
+        """Stop every background job, call before destroying the editor."""
+        self.cancel_load()
+        self.stop_autosave()
+        for job in (self._refresh_job, self._gutter_pending, self._visible_pending, self._idle_group):
+            if job is not None:
+                self.after_cancel(job)
+        self._refresh_job = self._gutter_pending = self._visible_pending = None
+        if self._idle_group is not None:
+            self._idle_group = None
+            self.history.end()
+        self.find_bar.close()
 
     def load_from_file(self):
         file_path = filedialog.askopenfilename(
             filetypes=[("MK Files", "*.mk"), ("All Files", "*.*")]
         )
         if file_path:
-            try:
-                with open(file_path, "r") as f:
-                    data = json.load(f)
-                global_data = data.get("global", {})
-                self.font_size = global_data.get("font_size", 12)
-                self.global_text_color = global_data.get("global_text_color", "black")
-                self.global_bg_color = global_data.get("global_bg_color", "white")
-                self.update_fonts()
-                self.text_widget.delete("1.0", tk.END)
-                self.text_widget.insert("1.0", data.get("content", ""))
-                self.highlight_syntax()
-                self.update_line_numbers()
-                # Reapply persistent tags
-                for tag_data in data.get("persistent_tags", []):
-                    tag = tag_data["tag"]
-                    config = tag_data.get("config", {})
-                    ranges = tag_data.get("ranges", [])
-                    self.text_widget.tag_configure(tag, **config)
-                    for (start, end) in ranges:
-                        self.text_widget.tag_add(tag, start, end)
-            except Exception as e:
-                messagebox.showerror("Error", f"Failed to load file: {e}")
+            self.open_file(file_path)
 
     def open_file(self, file_path):
-        try:
-            with open(file_path, "r") as file:
-                data = json.load(file)
-            global_data = data.get("global", {})
-            self.font_size = global_data.get("font_size", 12)
-            self.global_text_color = global_data.get("global_text_color", "black")
-            self.global_bg_color = global_data.get("global_bg_color", "white")
-            self.update_fonts()
+        """Open a note without blocking: decode on a thread, then stream it into the widget."""
+        self._begin_load(NoteLoad(file_path))
+
+    def open_blob(self, blob, file_path=None, view=None):
+        """Open a note packed by mkformat.encode, e.g. a tab coming back from the tab cache."""
+        self._begin_load(NoteLoad(file_path, blob=blob, view=view))
+
+    def _begin_load(self, load):
+        self.cancel_load()
+        self.stop_autosave()
+        self.history.clear()
+        self.file_path = None
+        self._load = load
+        threading.Thread(target=self._load.read, daemon=True).start()
+        name = os.path.basename(load.file_path) if load.file_path else "note"
+        self.load_label.config(text=f"Opening {name}")
+        self.load_progress.config(value=0)
+        self.load_status.pack(fill='x')
+        self._load_job = self.after(10, self._load_tick)
+
+    def cancel_load(self):
+        if self._load is None:
+            return
+        self._load.cancelled.set()
+        started = self._load.started
+        self._end_load()
+        # half a note is worse than none, it could get saved over the real one
+        if started:
             self.text_widget.delete("1.0", tk.END)
-            self.text_widget.insert("1.0", data.get("content", ""))
+            self.prune_style_tags()
+            self.schedule_refresh(full=True)
+
+    def _end_load(self):
+        if self._load_job is not None:
+            self.after_cancel(self._load_job)
+        self._load = None
+        self._load_job = None
+        self.text_widget.config(state='normal')
+        self.load_status.pack_forget()
+
+    def _load_tick(self):
+        load = self._load
+        tw = self.text_widget
+        deadline = time.monotonic() + self.load_slice_ms / 1000
+        tw.config(state='normal')
+        waiting = False
+        while time.monotonic() < deadline:
+            if load.text_pos < len(load.text):
+                piece = load.text[load.text_pos:load.text_pos + self.load_chunk_size]
+                tw.insert("end-1c", piece)
+                load.text_pos += len(piece)
+                load.inserted += len(piece)
+            elif load.finished:
+                if load.style_pos >= len(load.styles):
+                    break
+                key, start, end = load.styles[load.style_pos]
+                self.apply_style(*key, start, end, prune=False)
+                load.style_pos += 1
+            else:
+                try:
+                    kind, value = load.results.get_nowait()
+                except queue.Empty:
+                    waiting = True
+                    break
+                if kind == "error":
+                    self.cancel_load()
+                    messagebox.showerror("Error", f"Failed to open file: {value}")
+                    return
+                if kind == "global":
+                    self.font_size = value.get("font_size", 12)
+                    self.global_text_color = value.get("global_text_color", "black")
+                    self.global_bg_color = value.get("global_bg_color", "white")
+                    self.update_fonts()
+                    tw.delete("1.0", tk.END)
+                    self.prune_style_tags()
+                    load.started = True
+                elif kind == "length":
+                    load.length = value
+                elif kind == "text":
+                    load.text, load.text_pos = value, 0
+                elif kind == "tags":
+                    load.styles = self.style_ranges(value)
+                elif kind == "journal":
+                    load.journal = value
+                elif kind == "done":
+                    load.finished = True
+        if load.inserted and not load.first_screen:
+            load.first_screen = True
             self.highlight_syntax()
             self.update_line_numbers()
-            for tag_data in data.get("persistent_tags", []):
-                tag = tag_data["tag"]
-                config = tag_data.get("config", {})
-                ranges = tag_data.get("ranges", [])
-                self.text_widget.tag_configure(tag, **config)
-                for (start, end) in ranges:
-                    self.text_widget.tag_add(tag, start, end)
+        total = load.length + len(load.styles)
+        done = load.inserted + load.style_pos
+        self.load_progress.config(value=100 * done / total if total else 0)
+        if load.finished and load.text_pos >= len(load.text) and load.style_pos >= len(load.styles):
+            self._end_load()
+            self.replay_journal(load.journal)
+            self.history.clear()  # a freshly opened note has nothing to undo
+            self.prune_style_tags()
+            self.schedule_refresh(full=True)
+            if load.file_path:
+                self.start_autosave(load.file_path)
+            if load.journal:
+                # fold the recovered edits into the note right away
+                self.autosaver.snapshot(self.note_data())
+            if load.view is not None:
+                top, cursor = load.view
+                tw.mark_set(tk.INSERT, cursor)
+                tw.yview_moveto(top)
+            perf.record("open_file", time.perf_counter() - load.opened_at)
+            return
+        # user typing into a half loaded note would shift every saved tag range
+        if load.started:
+            tw.config(state='disabled')
+        self._load_job = self.after(10 if waiting else 1, self._load_tick)
+
+class FindBar(tk.Frame):
+    """Find/replace panel under the toolbar.
+
+    Searches run on a worker thread over a snapshot of the document, matches come
+    back as a find_replace.MatchIndex and get painted with one tag_add call.
+    """
+
+    def __init__(self, editor):
+        super().__init__(editor)
+        self.editor = editor
+        self.active = False
+        self.matches = find_replace.MatchIndex()
+        self.current = None
+        self.search_delay_ms = 150
+        self._pattern = None
+        self._snapshot = ""
+        self._version = None
+        self._jump = False
+        self._search_job = None
+        self._poll_job = None
+        self._cancel = None
+        self._busy = False
+        self._generation = 0
+        self._results = queue.Queue()
+
+        self.find_var = tk.StringVar()
+        self.replace_var = tk.StringVar()
+        self.regex_var = tk.BooleanVar(value=False)
+        self.case_var = tk.BooleanVar(value=False)
+        self.word_var = tk.BooleanVar(value=False)
+        tk.Label(self, text="Find").pack(side='left')
+        self.find_entry = tk.Entry(self, textvariable=self.find_var, width=25)
+        self.find_entry.pack(side='left')
+        tk.Label(self, text="Replace").pack(side='left')
+        self.replace_entry = tk.Entry(self, textvariable=self.replace_var, width=20)
+        self.replace_entry.pack(side='left')
+        for text, var in (("Regex", self.regex_var), ("Case", self.case_var), ("Word", self.word_var)):
+            tk.Checkbutton(self, text=text, variable=var, command=self.search_soon).pack(side='left')
+        tk.Button(self, text="Prev", command=self.find_prev).pack(side='left')
+        tk.Button(self, text="Next", command=self.find_next).pack(side='left')
+        tk.Button(self, text="Replace", command=self.replace_one).pack(side='left')
+        tk.Button(self, text="Replace All", command=self.replace_all).pack(side='left')
+        tk.Button(self, text="x", command=self.hide).pack(side='right')
+        self.count_label = tk.Label(self, anchor='w', width=16)
+        self.count_label.pack(side='left', padx=5)
+
+        self.find_var.trace_add('write', lambda *_: self.search_soon())
+        self.find_entry.bind('<Return>', lambda e: self.find_next())
+        self.find_entry.bind('<Shift-Return>', lambda e: self.find_prev())
+        self.replace_entry.bind('<Return>', lambda e: self.replace_one())
+        for widget in (self.find_entry, self.replace_entry):
+            widget.bind('<Escape>', lambda e: self.hide())
+
+        tw = editor.text_widget
+        tw.tag_configure("find_match", background="#fff2a8")
+        tw.tag_configure("find_current", background="#ffb347")
+
+    def show(self):
+        tw = self.editor.text_widget
+        try:
+            selected = tw.get(tk.SEL_FIRST, tk.SEL_LAST)
+        except tk.TclError:
+            selected = ""
+        if selected and "\n" not in selected:
+            self.find_var.set(selected)
+        if not self.active:
+            self.active = True
+            self.pack(fill='x')
+        self.find_entry.focus_set()
+        self.find_entry.select_range(0, 'end')
+        self.search(jump=True)
+
+    def close(self):
+        self._stop()
+        for job in (self._search_job, self._poll_job):
+            if job is not None:
+                self.after_cancel(job)
+        self._search_job = self._poll_job = None
+
+    def hide(self):
+        self.active = False
+        self._stop()
+        self.pack_forget()
+        tw = self.editor.text_widget
+        tw.tag_remove("find_match", "1.0", tk.END)
+        tw.tag_remove("find_current", "1.0", tk.END)
+        self.matches = find_replace.MatchIndex()
+        self.current = None
+        tw.focus_set()
+
+    def buffer_changed(self):
+        # matches now point at the wrong chars, look again once typing settles
+        self.search_soon(jump=False)
+
+    def search_soon(self, jump=True):
+        if self._search_job is not None:
+            self.after_cancel(self._search_job)
+        self._search_job = self.after(self.search_delay_ms, lambda: self.search(jump))
+
+    def _compile(self):
+        query = self.find_var.get()
+        if not query:
+            return None
+        try:
+            return find_replace.compile_pattern(query, self.regex_var.get(), self.case_var.get(),
+                                                self.word_var.get())
+        except re.error as e:
+            self.count_label.config(text=f"bad pattern: {e.msg}")
+            return None
+
+    def search(self, jump=False):
+        self._search_job = None
+        if not self.active:
+            return
+        pattern = self._compile()
+        if pattern is None:
+            self._stop()
+            self._show_matches(None, "", find_replace.MatchIndex(), [])
+            if not self.find_var.get():
+                self.count_label.config(text="")
+            return
+        self._jump = jump
+        self._start(self._find, pattern, self.editor.document.text(), self.editor.edit_version)
+
+    def _find(self, cancel, pattern, text, version):
+        # worker thread
+        matches = find_replace.find_all(pattern, text, cancel)
+        indices = LineIndex(text).flatten(matches.ranges())
+        return "found", pattern, text, version, matches, indices
+
+    def _replace_all(self, cancel, pattern, text, version, repl, regex):
+        # worker thread
+        replacements = find_replace.find_replacements(pattern, text, repl, regex, cancel)
+        return "replace", version, replacements, find_replace.tk_script_args(text, replacements)
+
+    def _start(self, work, *args):
+        self._stop()
+        self._cancel = threading.Event()
+        self._busy = True
+        threading.Thread(target=self._run, args=(self._generation, self._cancel, work) + args,
+                         daemon=True).start()
+        if self._poll_job is None:
+            self._poll_job = self.after(20, self._poll)
+
+    def _stop(self):
+        # whatever is still running is for an older query
+        if self._cancel is not None:
+            self._cancel.set()
+        self._generation += 1
+        self._busy = False
+
+    def _run(self, generation, cancel, work, *args):
+        try:
+            result = work(cancel, *args)
+        except find_replace.Cancelled:
+            return
         except Exception as e:
-            messagebox.showerror("Error", f"Failed to open file: {e}")
+            result = ("error", e)
+        self._results.put((generation,) + result)
+
+    def _poll(self):
+        self._poll_job = None
+        while True:
+            try:
+                generation, kind, *payload = self._results.get_nowait()
+            except queue.Empty:
+                break
+            if generation != self._generation:
+                continue
+            self._busy = False
+            if kind == "found":
+                pattern, text, version, matches, indices = payload
+                if version != self.editor.edit_version:
+                    self.search(self._jump)  # typed while we looked
+                else:
+                    self._pattern = pattern
+                    self._show_matches(version, text, matches, indices)
+            elif kind == "replace":
+                self._apply_replace_all(*payload)
+            else:
+                self.count_label.config(text=f"error: {payload[0]}")
+        if self._busy and self._poll_job is None:
+            self._poll_job = self.after(20, self._poll)
+
+    def _show_matches(self, version, text, matches, indices):
+        tw = self.editor.text_widget
+        self._version = version
+        self._snapshot = text
+        self.matches = matches
+        self.current = None
+        tw.tag_remove("find_match", "1.0", tk.END)
+        tw.tag_remove("find_current", "1.0", tk.END)
+        if indices:
+            tw.tag_add("find_match", *indices)
+            tw.tag_raise("find_match")
+            tw.tag_raise("find_current")
+            tw.tag_raise("sel")
+        if self._jump and len(matches):
+            self._select(matches.after(self._insert_offset()))
+        else:
+            self._update_count()
+
+    def _stale(self):
+        return self._version is None or self._version != self.editor.edit_version
+
+    def _insert_offset(self):
+        return self.editor.document.offset(self.editor.text_widget.index(tk.INSERT))
+
+    def _update_count(self):
+        total = len(self.matches)
+        if not total:
+            self.count_label.config(text="no matches")
+        elif self.current is None:
+            self.count_label.config(text=f"{total} matches")
+        else:
+            self.count_label.config(text=f"{self.current + 1} of {total}")
+
+    def _select(self, i):
+        tw = self.editor.text_widget
+        doc = self.editor.document
+        self.current = i
+        tw.tag_remove("find_current", "1.0", tk.END)
+        if i is not None:
+            start = doc.index(self.matches.starts[i])
+            end = doc.index(self.matches.ends[i])
+            tw.tag_add("find_current", start, end)
+            tw.tag_remove(tk.SEL, "1.0", tk.END)
+            tw.tag_add(tk.SEL, start, end)
+            tw.mark_set(tk.INSERT, end)
+            tw.see(start)
+        self._update_count()
+
+    def find_next(self):
+        if self._stale():
+            self.search(jump=True)
+            return
+        i = self.matches.after(self._insert_offset())
+        if i is not None and i == self.current and len(self.matches) > 1:
+            i = (i + 1) % len(self.matches)  # empty match right at the cursor
+        self._select(i)
+
+    def find_prev(self):
+        if self._stale():
+            self.search(jump=True)
+            return
+        offset = self._insert_offset()
+        if self.current is not None and self.matches.ends[self.current] == offset:
+            offset = self.matches.starts[self.current]
+        self._select(self.matches.before(offset))
+
+    def replace_one(self):
+        if self._stale() or self.editor._load is not None:
+            return
+        if self.current is None:
+            self.find_next()
+            return
+        start, end = self.matches.starts[self.current], self.matches.ends[self.current]
+        match = self._pattern.search(self._snapshot, start)
+        if match is None or match.start() != start or match.end() != end:
+            return
+        try:
+            new = find_replace.replacement(match, self.replace_var.get(), self.regex_var.get())
+        except (re.error, IndexError) as e:
+            self.count_label.config(text=f"bad replacement: {e}")
+            return
+        tw = self.editor.text_widget
+        doc = self.editor.document
+        with self.editor.edit_group():
+            tw.replace(doc.index(start), doc.index(end), new)
+        tw.mark_set(tk.INSERT, doc.index(start + len(new)))
+        self.search(jump=True)
+
+    def replace_all(self):
+        if self.editor._load is not None:
+            return
+        pattern = self._compile()
+        if pattern is None:
+            return
+        self.count_label.config(text="replacing...")
+        self._start(self._replace_all, pattern, self.editor.document.text(), self.editor.edit_version,
+                    self.replace_var.get(), self.regex_var.get())
+
+    def _apply_replace_all(self, version, replacements, tk_args):
+        if version != self.editor.edit_version:
+            self.replace_all()  # edited in the meantime, go again on the new text
+            return
+        self.editor.replace_ranges(replacements, tk_args)
+        self.search(jump=False)
+        self.count_label.config(text=f"replaced {len(replacements)}")
+
+class NoteLoad:
+    """One note streaming into the editor, see Notebook.open_file."""
+
+    def __init__(self, file_path, blob=None, view=None):
+        self.file_path = file_path
+        self.blob = blob            # read this mkformat.encode output instead of the file
+        self.view = view            # view_state to restore once loaded
+        self.results = queue.Queue(maxsize=4)
+        self.cancelled = threading.Event()
+        self.started = False        # old note cleared, widget locked
+        self.finished = False       # the reader has sent everything
+        self.first_screen = False
+        self.length = 0
+        self.text = ""
+        self.text_pos = 0
+        self.inserted = 0
+        self.styles = []
+        self.style_pos = 0
+        self.opened_at = time.perf_counter()
+        self.journal = []
+
+    def read(self):
+        # worker thread, never touches Tk
+        try:
+            if self.blob is None:
+                items = mkformat.iter_note(self.file_path)
+            else:
+                items = mkformat.iter_blob(self.blob)
+            for item in items:
+                if not self._put(item):
+                    return
+            # a blob is the latest state already, only notes on disk can have a journal
+            journal = autosave.read_journal(self.file_path) if self.blob is None else []
+            if not self._put(("journal", journal)):
+                return
+        except Exception as e:
+            self._put(("error", e))
+            return
+        self._put(("done", None))
+
+    def _put(self, item):
+        while not self.cancelled.is_set():
+            try:
+                self.results.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
 
 class Files(tk.Frame):
     def __init__(self, parent, root_dir=None, editor_callback=None):
         super().__init__(parent)
         self.root_dir = root_dir if root_dir else os.path.abspath(".")
         self.editor_callback = editor_callback  # callback to open file in editor
+        self.note_index = None
+        self._index_thread = None
+        self._index_changed = 0
+        self._index_error = None
+        self._search_paths = []
         self.init_ui()
+        self.start_note_index()
 
     def init_ui(self):
+        search_bar = tk.Frame(self)
+        search_bar.pack(side='top', fill='x')
+        self.search_var = tk.StringVar()
+        self.search_entry = tk.Entry(search_bar, textvariable=self.search_var)
+        self.search_entry.pack(side='left', fill='x', expand=True)
+        self.search_entry.bind('<Return>', self.search_notes)
+        self.search_entry.bind('<Escape>', self.clear_search)
+        tk.Button(search_bar, text="Search", command=self.search_notes).pack(side='left')
+        # narrows the open folder's rows, runs on the listing so it's instant even for huge folders
+        filter_bar = tk.Frame(self)
+        filter_bar.pack(side='top', fill='x')
+        tk.Label(filter_bar, text="Filter:").pack(side='left')
+        self.filter_var = tk.StringVar()
+        filter_entry = tk.Entry(filter_bar, textvariable=self.filter_var)
+        filter_entry.pack(side='left', fill='x', expand=True)
+        filter_entry.bind('<KeyRelease>', self.schedule_filter)
+        self._filter_job = None
+        # only packed while there's something to say, see show_index_status
+        self.index_status = tk.Label(self, anchor='w', fg='gray')
+        # only packed while there are results, see show_search_results
+        self.search_results = tk.Listbox(self, height=10)
+        self.search_results.bind('<Double-1>', self.open_search_result)
+        self.search_results.bind('<Return>', self.open_search_result)
         self.tree = ttk.Treeview(self)
+        self.lister = dirlist.TreeFiller(self.tree, self.insert_entry, perf_name="Files.populate_tree",
+                                         page_size=dirlist.PAGE_SIZE, watch=True)
         ysb = ttk.Scrollbar(self, orient='vertical', command=self.tree.yview)
         self.tree.configure(yscroll=ysb.set)
         self.tree.pack(side='left', fill='both', expand=True)
         ysb.pack(side='right', fill='y')
-        self.tree.heading("#0", text="SideBar - (sidebar)", anchor='w')
+        self.tree.heading("#0", text="SideBar - (sidebar)", anchor='w',
+                          command=lambda: self.lister.sort(not self.lister.reverse))
         abspath = os.path.abspath(self.root_dir)
         root_node = self.tree.insert('', 'end', text=abspath, open=True, values=[abspath])
         self.populate_tree(root_node, abspath)
@@ -403,17 +1636,109 @@ class Files(tk.Frame):
         self.context_menu.add_command(label="Rename", command=self.rename_item)
         self.context_menu.add_command(label="Delete", command=self.delete_item)
 
-    def populate_tree(self, parent, fullpath):
-        self.tree.delete(*self.tree.get_children(parent))
+    def start_note_index(self):
         try:
-            for item in os.listdir(fullpath):
-                item_fullpath = os.path.join(fullpath, item)
-                isdir = os.path.isdir(item_fullpath)
-                node = self.tree.insert(parent, 'end', text=item, values=[item_fullpath])
-                if isdir:
-                    self.tree.insert(node, 'end')
-        except PermissionError:
-            pass
+            self.note_index = note_search.NoteIndex(self.root_dir)
+        except Exception as e:
+            self.note_index = None  # no sqlite/fts5 or nowhere to keep the index
+            self.show_index_status(f"note search disabled: {e}")
+            return
+        self.refresh_note_index()
+
+    def show_index_status(self, text):
+        self.index_status.config(text=text)
+        if not text:
+            self.index_status.pack_forget()
+        elif not self.index_status.winfo_ismapped():
+            self.index_status.pack(side='top', fill='x', before=self.tree)
+
+    def refresh_note_index(self):
+        # re-read changed notes on a worker, the current query reruns when it's done
+        if self.note_index is None or (self._index_thread and self._index_thread.is_alive()):
+            return
+        self._index_thread = threading.Thread(target=self._refresh_index, daemon=True)
+        self._index_thread.start()
+        self.after(100, self._index_tick)
+
+    def _refresh_index(self):
+        try:
+            self._index_changed = self.note_index.refresh()
+        except Exception as e:
+            self._index_changed = 0
+            self._index_error = f"note index refresh failed: {e}"  # shown by _index_tick
+        else:
+            self._index_error = None
+
+    def _index_tick(self):
+        if self._index_thread.is_alive():
+            self.after(100, self._index_tick)
+            return
+        self.show_index_status(self._index_error or "")
+        if self._index_changed and self.search_var.get().strip():
+            self.show_search_results()
+
+    def search_notes(self, event=None):
+        if self.note_index is None:
+            messagebox.showinfo("Search", "Note search isn't available here.")
+            return
+        # answer from the index right away, it catches up with the disk in the background
+        self.show_search_results()
+        self.refresh_note_index()
+
+    def show_search_results(self):
+        query = self.search_var.get().strip()
+        results = self.note_index.search(query) if query else []
+        self.search_results.delete(0, 'end')
+        self._search_paths = []
+        for path, snippet in results:
+            name = os.path.relpath(path, self.root_dir)
+            self.search_results.insert('end', f"{name}: {' '.join(snippet.split())}")
+            self._search_paths.append(path)
+        if not query:
+            self.search_results.pack_forget()
+            return
+        if not results:
+            self.search_results.insert('end', "no matches")
+        if not self.search_results.winfo_ismapped():
+            self.search_results.pack(side='bottom', fill='x', before=self.tree)
+
+    def clear_search(self, event=None):
+        self.search_var.set("")
+        self.show_search_results()
+
+    def open_search_result(self, event=None):
+        selection = self.search_results.curselection()
+        if not selection or selection[0] >= len(self._search_paths):
+            return
+        path = self._search_paths[selection[0]]
+        if self.editor_callback:
+            self.editor_callback(path)
+
+    def populate_tree(self, parent, fullpath):
+        # listed on a worker thread, the rows come in over the next few ticks. A folder
+        # that's already shown only gets the rows that changed.
+        self.lister.refresh(parent, fullpath)
+
+    def insert_entry(self, parent, entry, index='end'):
+        name, item_fullpath, isdir = entry
+        node = self.tree.insert(parent, index, text=name, values=[item_fullpath])
+        if isdir:
+            self.tree.insert(node, 'end')
+        return node
+
+    def schedule_filter(self, event=None):
+        if self._filter_job is not None:
+            self.after_cancel(self._filter_job)
+        self._filter_job = self.after(150, self.apply_filter)
+
+    def apply_filter(self):
+        self._filter_job = None
+        # nothing focused filters the workspace folder, a file the folder it's in
+        node = self.tree.focus() or self.tree.get_children('')[0]
+        while node and self.lister.listing(node) is None:
+            node = self.tree.parent(node)
+        if node:
+            self.lister.filter(node, self.filter_var.get())
 
     def on_open(self, event):
         node = self.tree.focus()
@@ -482,6 +1807,8 @@ class Files(tk.Frame):
             try:
                 os.rename(fullpath, new_path)
                 self.tree.item(item, text=new_name, values=[new_path])
+                # the rows below still carry the old path
+                self.lister.forget(item)
                 parent = self.tree.parent(item)
                 if parent:
                     self.populate_tree(parent, self.tree.item(parent, "values")[0])
@@ -518,20 +1845,148 @@ class Files(tk.Frame):
         elif os.path.isfile(fullpath):
             messagebox.showinfo("Open File", f"Open file: {fullpath}")
 
+class DocumentTab:
+    """One editor tab: a live Notebook, or while evicted the note packed by mkformat.encode."""
+
+    def __init__(self, frame):
+        self.frame = frame
+        self.editor = None
+        self.path = None
+        self.blob = None
+        self.view = None
+
 class Main(tk.Tk):
     def __init__(self):
         super().__init__()
         self.title("Notebook")
         self.geometry("1200x700")
+        # Open tabs stay live (widget, highlighting, token cache, undo) so switching is
+        # just a raise. Past tab_memory_cap (rough, see Notebook.footprint) or
+        # max_live_tabs the least recently used get packed down to a blob.
+        self.tab_memory_cap = 256 * 1024 * 1024
+        self.max_live_tabs = 8
         self.paned = tk.PanedWindow(self, orient='horizontal')
         self.paned.pack(fill='both', expand=True)
         self.file_explorer = Files(self.paned, root_dir=os.path.abspath("."), editor_callback=self.open_file_in_editor)
         self.paned.add(self.file_explorer, minsize=250)
-        self.editor = Notebook(self.paned)
-        self.paned.add(self.editor, minsize=500)
+        self.tabs = ttk.Notebook(self.paned)
+        self.paned.add(self.tabs, minsize=500)
+        self.documents = OrderedDict()  # tab frame name -> DocumentTab, least recently used first
+        self.tabs.bind('<<NotebookTabChanged>>', self.on_tab_changed)
+        self.tabs.bind('<Button-2>', self.on_tab_middle_click)
+        self.bind_all('<Control-w>', lambda e: self.close_tab())
+        self.bind_all('<F12>', lambda e: perf.toggle_overlay(self))
+        self.new_tab(sample=True)
+        self.protocol("WM_DELETE_WINDOW", self.on_close)
+
+    @property
+    def editor(self):
+        tab = self.current_tab()
+        return tab.editor if tab is not None else None
+
+    def current_tab(self):
+        return self.documents.get(str(self.tabs.select()))
+
+    def new_tab(self, sample=False):
+        tab = DocumentTab(tk.Frame(self.tabs))
+        self.documents[str(tab.frame)] = tab
+        self._start_editor(tab, sample)
+        self.tabs.add(tab.frame, text="untitled")
+        self.tabs.select(tab.frame)
+        return tab
+
+    def _start_editor(self, tab, sample=False):
+        tab.editor = Notebook(tab.frame, sample=sample)
+        tab.editor.on_path_change = lambda editor: self._set_tab_path(tab, editor.file_path)
+        tab.editor.pack(fill='both', expand=True)
+
+    def _set_tab_path(self, tab, path):
+        tab.path = path
+        self.tabs.tab(tab.frame, text=os.path.basename(path) if path else "untitled")
 
     def open_file_in_editor(self, file_path):
-        self.editor.open_file(file_path)
+        file_path = os.path.abspath(file_path)
+        for tab in self.documents.values():
+            if tab.path and os.path.abspath(tab.path) == file_path:
+                self.tabs.select(tab.frame)
+                return
+        tab = self.current_tab()
+        untouched = (tab is not None and tab.editor is not None and tab.path is None
+                     and tab.editor._load is None and not tab.editor.history.undo_stack)
+        if not untouched:
+            tab = self.new_tab()
+        self._set_tab_path(tab, file_path)
+        tab.editor.open_file(file_path)
+
+    def on_tab_changed(self, event=None):
+        tab = self.current_tab()
+        if tab is None:
+            return
+        self.documents.move_to_end(str(tab.frame))
+        if tab.editor is None:
+            self._start_editor(tab)
+            tab.editor.open_blob(tab.blob, tab.path, tab.view)
+            tab.blob = None
+        self.enforce_tab_cap()
+
+    def enforce_tab_cap(self):
+        """Evict least recently used tabs until the live ones fit the cap."""
+        current = self.current_tab()
+        live = [tab for tab in self.documents.values() if tab.editor is not None]
+        total = sum(tab.editor.footprint() for tab in live)
+        count = len(live)
+        for tab in live:
+            if total <= self.tab_memory_cap and count <= self.max_live_tabs:
+                break
+            if tab is current or tab.editor._load is not None:
+                continue
+            total -= tab.editor.footprint()
+            count -= 1
+            self.evict_tab(tab)
+
+    def evict_tab(self, tab):
+        editor = tab.editor
+        data = editor.note_data()
+        tab.blob = mkformat.encode(data)
+        tab.view = editor.view_state()
+        tab.path = editor.file_path
+        if editor.autosaver is not None and editor.autosaver.changes:
+            editor.autosaver.snapshot(data)
+        editor.close()
+        editor.destroy()
+        tab.editor = None
+
+    def on_tab_middle_click(self, event):
+        try:
+            index = self.tabs.index(f"@{event.x},{event.y}")
+        except tk.TclError:
+            return
+        self.close_tab(self.documents[self.tabs.tabs()[index]])
+
+    def close_tab(self, tab=None):
+        tab = tab or self.current_tab()
+        if tab is None:
+            return
+        editor = tab.editor
+        if editor is not None:
+            if tab.path is None and editor.history.undo_stack and not messagebox.askyesno(
+                    "Close", "This note was never saved, close it anyway?"):
+                return
+            if editor.autosaver is not None and editor.autosaver.changes:
+                editor.autosaver.snapshot(editor.note_data())
+            editor.close()
+        del self.documents[str(tab.frame)]
+        self.tabs.forget(tab.frame)
+        tab.frame.destroy()
+        if not self.documents:
+            self.new_tab()
+
+    def on_close(self):
+        for tab in self.documents.values():
+            if tab.editor is not None:
+                tab.editor.stop_autosave(wait=True)
+        autosave.finish_closing()  # tabs closed or evicted earlier
+        self.destroy()
 # let's start this thing up (not my fault if ur computer blows up)
 if __name__ == '__main__':
     app = Main()
@@ -0,0 +1,141 @@
+# hot path timings for the notebook and the USB reader.
+#
+# Decorate a method with @perf.timed("name") (or call perf.record directly for
+# things that finish later, like a background load). While timing is off a
+# timed method is the plain function, the class only gets the timing wrapper
+# once timing is switched on; a timed plain function costs one flag check. Turn
+# it on with NOTEBOOK_PERF=1, with perf.enable(), or by opening the overlay (F12
+# in either app, see perf_overlay).
+#
+# Each name keeps its last WINDOW samples, percentiles come from those.
+# export() appends one JSON line per name to a file (NOTEBOOK_PERF_LOG, or
+# perf.jsonl in the working directory).
+import functools
+import json
+import os
+import threading
+import time
+from collections import deque
+
+WINDOW = 1024
+
+
+class Stats:
+    __slots__ = ("samples", "count", "total", "worst")
+
+    def __init__(self):
+        self.samples = deque(maxlen=WINDOW)
+        self.count = 0
+        self.total = 0.0
+        self.worst = 0.0
+
+    def add(self, seconds):
+        self.samples.append(seconds)
+        self.count += 1
+        self.total += seconds
+        if seconds > self.worst:
+            self.worst = seconds
+
+    def summary(self):
+        ordered = sorted(self.samples)
+        if not ordered:
+            return {"count": 0}
+
+        def pct(p):
+            return ordered[min(len(ordered) - 1, int(p * len(ordered)))] * 1000
+        return {
+            "count": self.count,
+            "p50_ms": round(pct(0.50), 3),
+            "p95_ms": round(pct(0.95), 3),
+            "max_ms": round(self.worst * 1000, 3),
+            "mean_ms": round(self.total / self.count * 1000, 3),
+        }
+
+
+class _State:
+    enabled = os.environ.get("NOTEBOOK_PERF", "") not in ("", "0")
+
+
+state = _State()
+stats = {}
+_lock = threading.Lock()
+_depth = threading.local()
+_methods = []  # (class, attribute, plain function, timed function) for every timed method
+
+
+def enable(on=True):
+    state.enabled = on
+    for owner, attribute, func, wrapper in _methods:
+        setattr(owner, attribute, wrapper if on else func)
+
+
+def record(name, seconds):
+    if not state.enabled:
+        return
+    with _lock:
+        entry = stats.get(name)
+        if entry is None:
+            entry = stats[name] = Stats()
+        entry.add(seconds)
+
+
+class _TimedMethod:
+    # stands in for a timed method until the class is made, then puts in
+    # whichever of the two versions matches the switch
+    def __init__(self, func, wrapper):
+        self.func = func
+        self.wrapper = wrapper
+
+    def __set_name__(self, owner, attribute):
+        _methods.append((owner, attribute, self.func, self.wrapper))
+        setattr(owner, attribute, self.wrapper if state.enabled else self.func)
+
+
+def timed(name):
+    """Decorator timing every call as name. Recursive calls only count the outermost one."""
+    def wrap(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not state.enabled:
+                return func(*args, **kwargs)
+            depth = getattr(_depth, name, 0)
+            setattr(_depth, name, depth + 1)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                setattr(_depth, name, depth)
+                if depth == 0:
+                    record(name, time.perf_counter() - start)
+        owner = func.__qualname__.rpartition(".")[0]
+        if owner and not owner.endswith("<locals>"):
+            return _TimedMethod(func, wrapper)
+        return wrapper
+    return wrap
+
+
+def summaries():
+    with _lock:
+        return {name: entry.summary() for name, entry in sorted(stats.items())}
+
+
+def export(path=None):
+    """Append the current numbers to path as JSON lines, returns the path written."""
+    path = path or os.environ.get("NOTEBOOK_PERF_LOG") or "perf.jsonl"
+    now = time.time()
+    with open(path, "a") as f:
+        for name, summary in summaries().items():
+            f.write(json.dumps(dict(summary, name=name, time=now)) + "\n")
+    return path
+
+
+def toggle_overlay(master):
+    """Open the overlay (switching timing on) or close it again. Bind to a key."""
+    overlay = getattr(master, "_perf_overlay", None)
+    if overlay is not None and overlay.winfo_exists():
+        overlay.destroy()
+        master._perf_overlay = None
+        return
+    from perf_overlay import Overlay
+    enable()
+    master._perf_overlay = Overlay(master)
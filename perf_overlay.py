@@ -0,0 +1,52 @@
+# the performance overlay window (F12 in either app). Kept apart from perf so
+# the headless modules that time themselves don't pull in tkinter.
+import tkinter as tk
+
+from perf import export, stats, summaries, _lock
+
+
+class Overlay(tk.Toplevel):
+    """Small always-on-top window with the live numbers."""
+
+    refresh_ms = 500
+
+    def __init__(self, master):
+        super().__init__(master)
+        self.title("Performance")
+        self.attributes("-topmost", True)
+        self.label = tk.Label(self, font=("Courier", 9), justify='left', anchor='nw')
+        self.label.pack(fill='both', expand=True, padx=5, pady=5)
+        buttons = tk.Frame(self)
+        buttons.pack(fill='x')
+        tk.Button(buttons, text="Export", command=self.export).pack(side='left')
+        tk.Button(buttons, text="Reset", command=self.reset).pack(side='left')
+        self.status = tk.Label(buttons, anchor='w')
+        self.status.pack(side='left', padx=5)
+        self.protocol("WM_DELETE_WINDOW", self.destroy)
+        self._job = None
+        self.refresh()
+
+    def refresh(self):
+        rows = [f"{'name':<26}{'count':>7}{'p50':>9}{'p95':>9}{'max':>9}  (ms)"]
+        for name, summary in summaries().items():
+            if summary["count"]:
+                rows.append(f"{name:<26}{summary['count']:>7}{summary['p50_ms']:>9.2f}"
+                            f"{summary['p95_ms']:>9.2f}{summary['max_ms']:>9.2f}")
+        self.label.config(text="\n".join(rows))
+        self._job = self.after(self.refresh_ms, self.refresh)
+
+    def export(self):
+        try:
+            self.status.config(text=f"wrote {export()}")
+        except OSError as e:
+            self.status.config(text=f"export failed: {e}")
+
+    def reset(self):
+        with _lock:
+            stats.clear()
+
+    def destroy(self):
+        if self._job is not None:
+            self.after_cancel(self._job)
+            self._job = None
+        super().destroy()
@@ -0,0 +1,95 @@
+# python -m pytest tests
+import json
+import os
+
+import pytest
+
+import autosave
+import dirlist
+import mkformat
+
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path, monkeypatch):
+    # journals go to the cache dir, keep them out of the real one
+    monkeypatch.delenv("LOCALAPPDATA", raising=False)
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+
+
+def note(content):
+    return {"global": {"font_size": 12}, "content": content, "persistent_tags": []}
+
+
+def test_snapshot_then_close(tmp_path):
+    path = str(tmp_path / "note.mk")
+    saver = autosave.Autosaver(path)
+    saver.record({"op": "insert", "at": "1.0", "text": "a"})
+    saver.snapshot(note("hello"))
+    saver.close()
+    assert mkformat.load(path)["content"] == "hello"
+    assert not os.path.exists(autosave.journal_path(path))
+    assert saver.error is None
+
+
+def test_journal_survives_until_the_next_snapshot(tmp_path):
+    path = str(tmp_path / "note.mk")
+    mkformat.dump(note("base"), path)
+    saver = autosave.Autosaver(path)
+    change = {"op": "insert", "at": "1.4", "text": "!"}
+    saver.record(change)
+    saver.close()
+    assert autosave.read_journal(path) == [change]
+
+
+def test_close_without_waiting_finishes_before_the_next_saver(tmp_path):
+    # an evicted tab's saver is still writing when the tab comes back
+    path = str(tmp_path / "note.mk")
+    first = autosave.Autosaver(path)
+    first.snapshot(note("x" * 2_000_000))
+    first.close(wait=False)
+    second = autosave.Autosaver(path)
+    change = {"op": "insert", "at": "1.0", "text": "y"}
+    second.record(change)
+    second.close()
+    assert mkformat.load(path)["content"] == "x" * 2_000_000
+    # the first saver's snapshot went before the second journal started, so it's kept
+    assert autosave.read_journal(path) == [change]
+
+
+def test_nothing_but_the_note_in_its_folder(tmp_path):
+    # the explorers watch this folder, journals and half written saves stay out of it
+    notes = tmp_path / "notes"
+    notes.mkdir()
+    path = str(notes / "note.mk")
+    mkformat.dump(note("base"), path)
+    saver = autosave.Autosaver(path)
+    saver.record({"op": "insert", "at": "1.0", "text": "a"})
+    saver.close()
+    assert os.path.exists(autosave.journal_path(path))
+    assert os.listdir(notes) == ["note.mk"]
+    (notes / ".note.mk.x1y2.mk-saving").write_bytes(b"half")
+    assert dirlist.scan(str(notes)).names == ["note.mk"]
+
+
+def test_old_journal_next_to_the_note_is_still_read(tmp_path):
+    path = str(tmp_path / "note.mk")
+    mkformat.dump(note("base"), path)
+    stat = os.stat(path)
+    change = {"op": "insert", "at": "1.0", "text": "z"}
+    with open(path + ".journal", "w") as f:
+        f.write(json.dumps({"base": [stat.st_size, stat.st_mtime_ns]}) + "\n" + json.dumps(change) + "\n")
+    assert autosave.read_journal(path) == [change]
+    saver = autosave.Autosaver(path)
+    saver.snapshot(note("basez"))
+    saver.close()
+    assert not os.path.exists(path + ".journal")
+
+
+def test_finish_closing(tmp_path):
+    path = str(tmp_path / "note.mk")
+    saver = autosave.Autosaver(path)
+    saver.snapshot(note("bye"))
+    saver.close(wait=False)
+    autosave.finish_closing()
+    assert not saver._thread.is_alive()
+    assert mkformat.load(path)["content"] == "bye"
@@ -0,0 +1,67 @@
+# python -m pytest tests
+import os
+import time
+
+import dirlist
+from benchmarks.suite import ModelTree
+
+
+def wait(tree, lister, parent):
+    while lister.busy(parent):
+        tree.update()
+        time.sleep(0.001)
+
+
+def make_lister():
+    tree = ModelTree()
+
+    def insert(parent, entry, index="end"):
+        node = tree.insert(parent, index, text=entry[0], values=(entry[1],))
+        if entry[2]:
+            tree.insert(node, "end")  # expand placeholder
+        return node
+    return tree, dirlist.TreeFiller(tree, insert)
+
+
+def shown(tree, parent):
+    return [(tree.item(row, "text"), bool(tree.get_children(row))) for row in tree.get_children(parent)]
+
+
+def refresh(tree, lister, parent, folder):
+    dirlist.cache.forget(folder)  # the changes land inside the racy window
+    lister.refresh(parent, folder)
+    wait(tree, lister, parent)
+
+
+def test_refresh_keeps_untouched_rows(tmp_path):
+    folder = str(tmp_path)
+    for name in ("a.txt", "b.txt"):
+        open(os.path.join(folder, name), "w").close()
+    tree, lister = make_lister()
+    root = tree.insert("", "end", text=folder)
+    lister.fill(root, folder)
+    wait(tree, lister, root)
+    kept = tree.get_children(root)[0]
+    os.remove(os.path.join(folder, "b.txt"))
+    open(os.path.join(folder, "c.txt"), "w").close()
+    refresh(tree, lister, root, folder)
+    assert shown(tree, root) == [("a.txt", False), ("c.txt", False)]
+    assert tree.get_children(root)[0] == kept
+
+
+def test_refresh_redoes_a_row_that_changed_kind(tmp_path):
+    folder = str(tmp_path)
+    open(os.path.join(folder, "thing"), "w").close()
+    os.mkdir(os.path.join(folder, "other"))
+    tree, lister = make_lister()
+    root = tree.insert("", "end", text=folder)
+    lister.fill(root, folder)
+    wait(tree, lister, root)
+    assert shown(tree, root) == [("other", True), ("thing", False)]
+
+    os.remove(os.path.join(folder, "thing"))
+    os.mkdir(os.path.join(folder, "thing"))
+    os.rmdir(os.path.join(folder, "other"))
+    open(os.path.join(folder, "other"), "w").close()
+    refresh(tree, lister, root, folder)
+    assert shown(tree, root) == [("thing", True), ("other", False)]
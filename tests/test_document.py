@@ -0,0 +1,294 @@
+# python -m pytest tests
+import random
+
+import document
+from document import Document, FenceIndex, HeadingIndex, Rope, StyleSpans, TokenCache
+
+NOTE = "# Title\nsome **bold** text\n\n## Part\n`code` and *it*\n- item\n> quote\n"
+
+
+def lines_of(text, line):
+    return text.split("\n")[line - 1]
+
+
+# Rope
+
+def test_rope_empty():
+    rope = Rope()
+    assert len(rope) == 0 and rope.text() == "" and rope.line_count() == 1
+    assert rope.line_start(0) == rope.line_start(5) == 0
+    assert rope.line_of(0) == rope.line_of(10) == 0
+
+
+def test_rope_insert_start_middle_end():
+    rope = Rope("hello")
+    rope.insert(0, ">")
+    rope.insert(3, "--")
+    rope.insert(len(rope), "!")
+    rope.insert(99, "?")  # past the end goes on the end
+    assert rope.text() == ">he--llo!?"
+    rope.insert(2, "")
+    assert rope.text() == ">he--llo!?"
+
+
+def test_rope_delete_clamps_and_empties():
+    rope = Rope("abc\ndef")
+    rope.delete(5, 2)
+    assert rope.text() == "abc\ndef"
+    rope.delete(-3, 2)
+    assert rope.text() == "c\ndef"
+    rope.delete(0, 99)
+    assert rope.text() == "" and rope.line_count() == 1
+    rope.insert(0, "again")
+    assert rope.text() == "again"
+
+
+def test_rope_splits_into_leaves_and_levels():
+    text = "".join(f"line {i}\n" for i in range(20000))
+    rope = Rope(text)
+    assert rope.root.children[0].children is not None, "expected more than one level"
+    assert len(rope) == len(text) and rope.line_count() == text.count("\n") + 1
+    # one insert bigger than a leaf splits it
+    big = "y" * (3 * document.LEAF_MAX)
+    rope.insert(5, big)
+    text = text[:5] + big + text[5:]
+    assert rope.text() == text
+    # a delete spanning many leaves and branches
+    rope.delete(100, len(text) - 100)
+    text = text[:100] + text[len(text) - 100:]
+    assert rope.text() == text
+    assert rope.text(90, 110) == text[90:110]
+
+
+def test_rope_lines_against_str():
+    rng = random.Random(3)
+    text = "".join(rng.choice(["ab", "\n", "cde", "\n\n"]) for _ in range(5000))
+    rope = Rope(text)
+    starts = [0] + [i + 1 for i, ch in enumerate(text) if ch == "\n"]
+    for line in range(0, len(starts), 13):
+        assert rope.line_start(line) == starts[line]
+    assert rope.line_start(len(starts) + 10) == starts[-1]
+    for offset in range(0, len(text) + 1, 11):
+        assert rope.line_of(offset) == text.count("\n", 0, offset)
+
+
+# StyleSpans
+
+def test_spans_shift_and_grow_on_insert():
+    spans = StyleSpans()
+    spans.add(("size", 14), 10, 20)
+    spans.insert(5, 3)        # before: moves
+    assert spans.spans[("size", 14)] == [[13, 23]]
+    spans.insert(15, 2)       # inside: grows
+    assert spans.spans[("size", 14)] == [[13, 25]]
+    spans.insert(25, 4)       # right at the end: stays out
+    assert spans.spans[("size", 14)] == [[13, 25]]
+
+
+def test_spans_delete():
+    spans = StyleSpans()
+    spans.add(("font", "Mono"), 10, 20)
+    spans.add(("color", "red"), 30, 40)
+    spans.delete(5, 15)       # cuts the front of the first, moves the second
+    assert spans.spans == {("font", "Mono"): [[5, 10]], ("color", "red"): [[20, 30]]}
+    spans.delete(0, 12)       # swallows the first
+    assert spans.spans == {("color", "red"): [[8, 18]]}
+
+
+def test_spans_one_style_of_a_kind():
+    spans = StyleSpans()
+    spans.add(("size", 12), 0, 10)
+    spans.add(("size", 18), 4, 6)
+    assert spans.spans == {("size", 12): [[0, 4], [6, 10]], ("size", 18): [[4, 6]]}
+    spans.add(("size", 12), 3, 7)
+    assert spans.spans == {("size", 12): [[0, 10]]}
+
+
+def test_document_edits_move_spans():
+    doc = Document("0123456789")
+    doc.styles.add(("color", "blue"), 2, 5)
+    doc.insert(0, "ab")
+    doc.delete(len(doc) - 2, len(doc))
+    assert doc.styles.spans == {("color", "blue"): [[4, 7]]}
+
+
+# HeadingIndex
+
+def test_headings_scan():
+    index = HeadingIndex(NOTE)
+    assert index.lines == [1, 4] and index.levels == [1, 2] and index.titles == ["Title", "Part"]
+
+
+def test_headings_move_without_version_bump():
+    doc = Document(NOTE)
+    version, ids = doc.headings.version, list(doc.headings.ids)
+    doc.insert(0, "intro\n\n")
+    assert doc.headings.lines == [3, 6] and doc.headings.version == version
+    assert doc.headings.ids == ids
+
+
+def test_headings_added_retitled_removed():
+    doc = Document(NOTE)
+    version = doc.headings.version
+    doc.replace_lines(3, 3, "### New")
+    assert doc.headings.titles == ["Title", "New", "Part"] and doc.headings.version > version
+    version = doc.headings.version
+    doc.replace_lines(1, 1, "# Renamed")
+    assert doc.headings.titles[0] == "Renamed" and doc.headings.version > version
+    doc.delete(doc.line_start(3), doc.line_start(5))  # the new heading and the old one under it
+    assert doc.headings.titles == ["Renamed"]
+    assert doc.headings.position(doc.headings.ids[0]) == 0
+
+
+def test_headings_section_end():
+    index = HeadingIndex("# a\nx\n## b\ny\n# c\nz")
+    assert [index.section_end(i) for i in range(3)] == [4, 4, None]
+
+
+# FenceIndex
+
+def test_fences_scan():
+    fences = FenceIndex("```\ncode\n```\nx ``` y ``````\n")
+    assert fences.positions == [(1, 0), (3, 0), (4, 2), (4, 8), (4, 11)]
+    assert fences.after(3) == 1 and fences.after(4, 3) == 3 and fences.after(9) == 5
+
+
+def test_fences_follow_edits():
+    doc = Document("a\n```\ncode\n```\n")
+    doc.insert(0, "new\nlines\n")
+    assert doc.fences.positions == [(4, 0), (6, 0)]
+    doc.insert(doc.offset("1.3"), "``")      # "new``" isn't a fence yet
+    assert doc.fences.positions == [(4, 0), (6, 0)]
+    doc.insert(doc.offset("1.3"), "`")
+    assert doc.fences.positions == [(1, 3), (4, 0), (6, 0)]
+    doc.delete(doc.offset("4.0"), doc.offset("6.0"))
+    assert doc.fences.positions == [(1, 3), (4, 0)]
+    doc.replace_lines(4, 4, "no fence")
+    assert doc.fences.positions == [(1, 3)]
+
+
+# Document
+
+def test_empty_document():
+    doc = Document()
+    assert len(doc) == 0 and doc.line_count() == 1
+    assert doc.offset("1.0") == doc.offset("5.3") == doc.offset("0.0") == 0
+    assert doc.index(0) == "1.0"
+    assert doc.lines_text(1, 1) == ""
+    doc.replace_lines(1, 1, "first")
+    assert doc.text() == "first"
+
+
+def test_offset_and_index_clamp_like_tk():
+    doc = Document("ab\ncdef\n")
+    assert doc.offset("1.9") == 2          # past the end of a line: its end
+    assert doc.offset("2.2") == 5
+    assert doc.offset("9.0") == len(doc)   # past the last line: the end
+    assert doc.index(len(doc)) == "3.0"
+    for offset in range(len(doc) + 1):
+        assert doc.offset(doc.index(offset)) == offset
+
+
+def test_edits_at_the_end():
+    doc = Document("one\ntwo")
+    doc.insert(len(doc), "\nthree")
+    assert doc.line_count() == 3 and doc.lines_text(3, 3) == "three"
+    doc.replace_lines(3, 3, "three\n# four")
+    assert doc.text() == "one\ntwo\nthree\n# four" and doc.headings.lines == [4]
+    doc.delete(doc.line_end(2), len(doc))
+    assert doc.text() == "one\ntwo" and doc.headings.lines == []
+
+
+def test_multi_line_delete():
+    doc = Document(NOTE)
+    start, end = doc.line_start(2), doc.line_start(6)
+    doc.delete(start, end)
+    text = NOTE[:start] + NOTE[end:]
+    assert doc.text() == text and doc.line_count() == text.count("\n") + 1
+    assert doc.headings.lines == [1]
+    doc.replace_lines(1, 3, "")
+    assert doc.text() == "\n".join([""] + text.split("\n")[3:]) == "\n"
+
+
+def test_crlf_stays_in_the_text():
+    # \r is an ordinary char, only \n ends a line
+    doc = Document("a\r\nbb\r\n# c\r\n")
+    assert doc.line_count() == 4
+    assert doc.lines_text(1, 1) == "a\r" and doc.offset("2.0") == 3
+    assert doc.index(doc.offset("2.2")) == "2.2"
+    assert doc.headings.titles == ["c"]
+    doc.replace_lines(2, 2, "bx\r")
+    assert doc.text() == "a\r\nbx\r\n# c\r\n"
+
+
+def test_replace_lines_touches_only_the_difference():
+    doc = Document("keep this line")
+    doc.styles.add(("color", "red"), 0, 4)
+    doc.replace_lines(1, 1, "keep that line")
+    assert doc.text() == "keep that line"
+    assert doc.styles.spans == {("color", "red"): [[0, 4]]}
+
+
+def test_replace_lines_on_a_long_line():
+    line = "x" * 100_000
+    doc = Document(line)
+    for i in range(1, 4):
+        doc.replace_lines(1, 1, line[:50_000] + "y" * i + line[50_000:])
+    assert doc.text() == line[:50_000] + "yyy" + line[50_000:]
+    assert document.common_prefix("abcx", "abcy") == 3 and document.common_suffix("xab", "yab", 3) == 2
+
+
+def test_replace_ranges_both_ways():
+    for rebuild in (False, True):
+        doc = Document(NOTE)
+        doc.rebuilds = lambda count: rebuild
+        doc.replace_ranges([(0, 1, "##"), (len(NOTE) - 1, len(NOTE), "\n# end\n")])
+        text = "##" + NOTE[1:-1] + "\n# end\n"
+        assert doc.text() == text
+        assert doc.headings.lines == HeadingIndex(text).lines
+
+
+def test_against_str_model():
+    rng = random.Random(1)
+    text = NOTE * 20
+    doc = Document(text)
+    for _ in range(2000):
+        if rng.random() < 0.6 or not text:
+            at = rng.randint(0, len(text))
+            piece = rng.choice(["x", "\n", "**b** ", "line\nline\n", "```\n", "# h\n", "## ", "\r\n"])
+            text = text[:at] + piece + text[at:]
+            doc.insert(at, piece)
+        elif rng.random() < 0.3:
+            lines = text.split("\n")
+            first = rng.randint(1, len(lines))
+            last = min(len(lines), first + rng.randint(0, 3))
+            new = rng.choice(["# title", "plain\n### sub", "", "x\n\n#"])
+            text = "\n".join(lines[:first - 1] + [new] + lines[last:])
+            doc.replace_lines(first, last, new)
+        else:
+            start = rng.randint(0, len(text))
+            end = min(len(text), start + rng.randint(1, 80))
+            text = text[:start] + text[end:]
+            doc.delete(start, end)
+    assert doc.text() == text
+    assert doc.line_count() == text.count("\n") + 1
+    for line in range(1, doc.line_count() + 1, 7):
+        assert doc.lines_text(line, line) == lines_of(text, line)
+        assert doc.index(doc.line_start(line)) == f"{line}.0"
+    for offset in range(0, len(text), 37):
+        assert doc.offset(doc.index(offset)) == offset
+    fresh = HeadingIndex(text)
+    assert (doc.headings.lines, doc.headings.levels, doc.headings.titles) == \
+        (fresh.lines, fresh.levels, fresh.titles)
+    assert doc.fences.positions == FenceIndex(text).positions
+
+
+# TokenCache
+
+def test_token_cache():
+    cache = TokenCache(max_lines=2)
+    assert ("bold", 5, 13) in cache.line("some **bold** text")
+    cache.line("some **bold** text")
+    cache.line("a")
+    cache.line("b")
+    assert len(cache) == 2 and (cache.hits, cache.misses) == (1, 3)
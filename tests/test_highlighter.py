@@ -0,0 +1,44 @@
+# python -m pytest tests
+import pytest
+
+from highlighter import LineIndex, find_fences, pair_fences, tokenize
+
+
+@pytest.mark.parametrize("text, tags", [
+    ("**[Link](https://example.com)**", {"bold", "link"}),
+    ("`a **b** c`", {"inline_code", "bold"}),
+    ("~~**x**~~", {"strikethrough", "bold"}),
+    ("**bold *it* more**", {"bold", "italic"}),
+    ("- **b** > not a quote", {"bullet", "bold"}),
+    ("[Email](mailto:a@b.c)", {"email"}),
+])
+def test_nested_markup_keeps_both_tags(text, tags):
+    assert {tag for tag, ranges in tokenize(text).items() if ranges} == tags
+
+
+def test_bold_stars_are_not_italic():
+    assert tokenize("**bold**")["italic"] == []
+    assert tokenize("**bold *it* more**")["italic"] == [(7, 11)]
+
+
+def test_line_tags_run_to_the_end_of_the_line():
+    text = "# title\n- item\n> quote\n#nospace"
+    tokens = tokenize(text)
+    assert tokens["heading"] == [(0, 7)]
+    assert tokens["bullet"] == [(8, 14)]
+    assert tokens["quote"] == [(15, 22)]
+
+
+def test_code_fences_pair_in_order():
+    text = "```\ncode\n```\n```\nopen"  # the last one never closes
+    assert pair_fences(find_fences(text)) == [(0, 12)]
+    assert pair_fences([0, 3]) == []  # `````` holds nothing
+    assert tokenize(text)["code_block"] == [(0, 12)]
+
+
+def test_flatten_matches_index():
+    text = "ab\n\ncd **x**\nlast"
+    lines = LineIndex(text, first_line=3)
+    ranges = [(0, 2), (1, 5), (5, 10), (12, 17)]
+    assert lines.flatten(ranges) == [lines.index(offset) for pair in ranges for offset in pair]
+    assert lines.flatten([(0, 2)]) == ["3.0", "3.2"]
@@ -0,0 +1,121 @@
+# python -m pytest tests
+import json
+import os
+
+import pytest
+
+import mkformat
+from highlighter import LineIndex
+
+
+def note(content, ranges=()):
+    return {
+        "global": {"font_size": 14, "global_text_color": "black", "global_bg_color": "white"},
+        "content": content,
+        "persistent_tags": [
+            {"tag": "custom_text_color_0", "ranges": list(ranges), "config": {"foreground": "#ff0000"}},
+            {"tag": "sel_font_1", "ranges": list(ranges)[::2], "config": {"font": "Courier 16"}},
+        ],
+    }
+
+
+def normalized(data):
+    # JSON hands ranges back as lists
+    tags = [dict(tag, ranges=[tuple(r) for r in tag["ranges"]]) for tag in data["persistent_tags"]]
+    return dict(data, persistent_tags=tags)
+
+
+def big_note():
+    # several chunks, multi-byte chars and ranges that cross chunk and line ends
+    lines = [f"line {i} é中 **b**" for i in range(20000)]
+    ranges = [(f"{i}.0", f"{i}.4") for i in range(1, 20000, 3)] + [("5.2", "9.1"), ("19999.3", "20000.7")]
+    return note("\n".join(lines), ranges)
+
+
+def test_v2_round_trip(tmp_path):
+    data = big_note()
+    assert len(data["content"]) > 2 * mkformat.CHUNK_CHARS
+    path = str(tmp_path / "note.mk")
+    mkformat.dump(data, path)
+    assert mkformat.is_v2(path)
+    assert normalized(mkformat.load(path)) == data
+
+
+def test_v1_still_loads_and_saving_upgrades_it(tmp_path):
+    data = note("# old\nnote", [("1.0", "1.5")])
+    path = str(tmp_path / "old.mk")
+    with open(path, "w") as f:
+        json.dump(data, f)
+    assert not mkformat.is_v2(path)
+    assert normalized(mkformat.load(path)) == data
+    assert list(mkformat.iter_note(path))[-1] == ("tags", json.loads(json.dumps(data["persistent_tags"])))
+    mkformat.dump(mkformat.load(path), path)
+    assert mkformat.is_v2(path) and normalized(mkformat.load(path)) == data
+
+
+def test_empty_note(tmp_path):
+    path = str(tmp_path / "empty.mk")
+    mkformat.dump(note(""), path)
+    assert normalized(mkformat.load(path)) == note("")
+    assert [kind for kind, _ in mkformat.iter_note(path)] == ["global", "length", "tags"]
+
+
+def test_blob_matches_file(tmp_path):
+    # what an evicted tab gets restored from
+    data = big_note()
+    path = str(tmp_path / "note.mk")
+    mkformat.dump(data, path)
+    assert list(mkformat.iter_blob(mkformat.encode(data))) == list(mkformat.iter_note(path))
+
+
+def test_reader_partial_reads(tmp_path):
+    data = big_note()
+    content = data["content"]
+    path = str(tmp_path / "note.mk")
+    mkformat.dump(data, path)
+    edge = mkformat.CHUNK_CHARS
+    with mkformat.NoteReader(path) as reader:
+        assert reader.length == len(content)
+        assert reader.text(edge - 10, edge + 10) == content[edge - 10:edge + 10]
+        assert reader.text(0, 5) == content[:5] and reader.text(7, 7) == ""
+        offsets = reader.tag_offsets()
+    lines = LineIndex(content)
+    assert offsets[0] == (0, lines.offset("1.0"), lines.offset("1.4"))
+    assert len(offsets) == sum(len(tag["ranges"]) for tag in data["persistent_tags"])
+
+
+def test_out_of_range_indices_clamp(tmp_path):
+    # what Tk would have done with them
+    path = str(tmp_path / "note.mk")
+    mkformat.dump(note("ab\ncd", [("1.9", "5.0")]), path)
+    assert mkformat.load(path)["persistent_tags"][0]["ranges"] == [("1.2", "2.2")]
+
+
+def test_line_index_offsets():
+    lines = LineIndex("ab\ncdef\n")
+    indices = ["1.0", "1.9", "2.3", "3.0", "7.1"]
+    assert lines.offsets(indices) == [lines.offset(index) for index in indices] == [0, 2, 6, 8, 8]
+    grown = LineIndex("ab\n")
+    grown.append("cdef\n")
+    assert grown.starts == lines.starts and grown.length == lines.length
+
+
+def test_not_a_v2_note(tmp_path):
+    path = str(tmp_path / "plain.mk")
+    with open(path, "w") as f:
+        f.write("{}")
+    with pytest.raises(ValueError):
+        mkformat.NoteReader(path)
+
+
+@pytest.mark.skipif(os.name == "nt", reason="no unix modes")
+def test_permissions(tmp_path):
+    path = str(tmp_path / "note.mk")
+    mkformat.dump(note("x"), path)
+    umask = os.umask(0)
+    os.umask(umask)
+    assert os.stat(path).st_mode & 0o777 == 0o666 & ~umask
+    os.chmod(path, 0o640)
+    mkformat.dump(note("y"), path)
+    assert os.stat(path).st_mode & 0o777 == 0o640
+    assert os.listdir(tmp_path) == ["note.mk"]  # no temp file left behind
@@ -0,0 +1,86 @@
+# python -m pytest tests
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+import perf
+
+
+@pytest.fixture(autouse=True)
+def clean():
+    perf.enable(False)
+    perf.stats.clear()
+    yield
+    perf.enable(False)
+    perf.stats.clear()
+
+
+class Widget:
+    @perf.timed("test.method")
+    def method(self, x):
+        return x + 1
+
+    @perf.timed("test.recursive")
+    def recursive(self, n):
+        return 0 if n == 0 else 1 + self.recursive(n - 1)
+
+
+@perf.timed("test.function")
+def function(x):
+    return x + 1
+
+
+def test_methods_are_plain_while_timing_is_off():
+    plain = Widget.__dict__["method"]
+    assert not hasattr(plain, "__wrapped__")
+    perf.enable()
+    assert Widget.__dict__["method"].__wrapped__ is plain
+    perf.enable(False)
+    assert Widget.__dict__["method"] is plain
+
+
+def test_counts_only_while_enabled():
+    widget = Widget()
+    assert widget.method(1) == 2 and function(1) == 2
+    assert not perf.stats
+    perf.enable()
+    for i in range(5):
+        widget.method(i)
+        function(i)
+    assert perf.stats["test.method"].count == 5
+    assert perf.stats["test.function"].count == 5
+
+
+def test_recursion_counts_the_outer_call():
+    perf.enable()
+    assert Widget().recursive(50) == 50
+    assert perf.stats["test.recursive"].count == 1
+
+
+def test_percentiles():
+    perf.enable()
+    for ms in range(1, 101):
+        perf.record("test.known", ms / 1000)
+    summary = perf.summaries()["test.known"]
+    assert summary["count"] == 100 and summary["max_ms"] == 100
+    assert 50 <= summary["p50_ms"] <= 51 and 95 <= summary["p95_ms"] <= 96, summary
+
+
+def test_export_appends(tmp_path):
+    perf.enable()
+    perf.record("test.known", 0.001)
+    path = perf.export(str(tmp_path / "perf.jsonl"))
+    perf.export(path)
+    with open(path) as f:
+        lines = [json.loads(line) for line in f]
+    assert len(lines) == 2 and lines[0]["name"] == "test.known"
+
+
+def test_headless_modules_leave_tkinter_alone():
+    code = "import sys, perf, autosave, dirlist, folder_size; print('tkinter' in sys.modules)"
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True,
+                         cwd=os.path.dirname(os.path.abspath(perf.__file__)))
+    assert out.stdout.strip() == "False"